@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Compare two result files of benchmarks.hotpaths and report the regressions.
+
+All measured values are times, latencies or memory, so higher is worse.
+The exit status is 1 if a value grew by more than the threshold.
+
+Usage: python -m benchmarks.compare old.json new.json [--threshold 0.2]
+"""
+
+# Standard library
+import argparse
+import json
+import sys
+
+# Values which are counts and not measurements.
+IGNORED = ('actuators', 'notification_to_frame_count')
+
+def flatten(results, prefix=''):
+    """ Return the numeric values of nested dicts by their path, e.g. 'sizes/8/us_per_call/actions_input'. """
+    values = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, prefix + key + '/'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and key not in IGNORED:
+            values[prefix + key] = value
+    return values
+
+def compare(old, new, threshold):
+    """ Return [(path, old value, new value, ratio, regression)] of the values in both results. """
+    old_values = flatten(old.get('sizes', {}), 'sizes/')
+    new_values = flatten(new.get('sizes', {}), 'sizes/')
+    rows = []
+    for path in sorted(set(old_values) & set(new_values)):
+        before, after = old_values[path], new_values[path]
+        ratio = after / before if before else float('inf') if after else 1.0
+        rows.append((path, before, after, ratio, ratio > 1.0 + threshold))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files.')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative growth which counts as a regression (default: %(default)s)')
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    with open(args.old) as file:
+        old = json.load(file)
+    with open(args.new) as file:
+        new = json.load(file)
+    rows = compare(old, new, args.threshold)
+    width = max([len(row[0]) for row in rows] + [4])
+    print('%-*s %12s %12s %7s' % (width, 'path', 'old', 'new', 'ratio'))
+    for path, before, after, ratio, regression in rows:
+        print('%-*s %12.2f %12.2f %7.2f%s' % (width, path, before, after, ratio, '  REGRESSION' if regression else ''))
+    regressions = sum(row[4] for row in rows)
+    print('%d of %d values regressed by more than %d %%.' % (regressions, len(rows), args.threshold * 100))
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,41 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Measure the cost of one simulation step as the number of actuators grows.
+
+Usage: python -m benchmarks.engine [steps]
+"""
+
+# Standard library
+import sys
+import time
+# Additional imports
+import numpy as np
+# Local imports
+from engine import SimulationEngine
+from layout import generate_layout
+
+# Number of cylinders and motors (each).
+SIZES = (4, 10, 100, 1000, 10000)
+
+def measure(count, steps, dt=0.01):
+    """ Return the microseconds per step with count cylinders and count motors. """
+    engine = SimulationEngine(generate_layout(count, count))
+    # Command a random half of the actuators, so that some of them are moving.
+    random = np.random.default_rng(0)
+    engine.cylinders.to_plus[:] = random.random(count) < 0.5
+    engine.motors.start[:] = random.random(count) < 0.5
+    engine.apply_outputs()
+    start = time.perf_counter()
+    for _ in range(steps):
+        engine.step(dt)
+    return (time.perf_counter() - start) / steps * 1e6
+
+def main():
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print('actuators  us/step  ns/actuator')
+    for count in SIZES:
+        us = measure(count, steps)
+        print('%9d  %7.1f  %11.1f' % (2 * count, us, us * 1000 / (2 * count)))
+
+if __name__ == '__main__':
+    main()
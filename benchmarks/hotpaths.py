@@ -0,0 +1,237 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Measure the hot paths of the user interface as the number of actuators grows.
+
+The window runs on the offscreen Qt platform and is connected to the
+in-process mock PLC, so no display and no TwinCAT runtime are needed.
+Measured for every size:
+
+- microseconds per call of actions_input, set_input_values,
+  set_input_labels, set_motor_pixmaps, write_plc_inputs (which queues the
+  inputs for the I/O thread), actions_output and update_view
+- notification to animation latency: from the ADS callback of an output
+  change to the first frame which draws the moving actuator
+- memory per actuator: Python heap of the engine and the layout, and the
+  process memory of the window
+
+Usage: python -m benchmarks.hotpaths [--sizes 4 40 400] [--json results.json]
+Compare two result files with python -m benchmarks.compare.
+"""
+
+# Standard library
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+# Local imports
+import settings
+import transport
+from engine import SimulationEngine
+from layout import generate_layout
+
+# Number of cylinders and motors (each).
+SIZES = (4, 40, 400)
+# Travel and ramp times in the generated layouts, short so that the mock PLC changes outputs often.
+TRAVEL_TIME = 0.1
+
+def generate_layout_file(count, directory):
+    """ Write a layout of count cylinders and count motors, return its path. """
+    layout = generate_layout(count, count)
+    for cylinder in layout.cylinders:
+        cylinder['travel_time'] = TRAVEL_TIME
+    for motor in layout.motors:
+        motor['ramp_time'] = TRAVEL_TIME
+    path = os.path.join(directory, 'layout_%d.json' % count)
+    with open(path, 'w') as file:
+        json.dump({'cylinders': layout.cylinders, 'motors': layout.motors}, file)
+    return path
+
+def process_memory():
+    """ Return the resident memory of the process in bytes, None if it is not known. """
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+def time_calls(function, number, repeat):
+    """ Return the median microseconds per call of repeat runs of number calls. """
+    results = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        results.append((time.perf_counter() - start) / number * 1e6)
+    return statistics.median(results)
+
+def measure_engine_memory(count):
+    """ Return the Python heap (bytes) of a layout and an engine of count cylinders and count motors. """
+    tracemalloc.start()
+    engine = SimulationEngine(generate_layout(count, count))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del engine
+    return size
+
+def measure(app, count, directory, number, repeat, duration):
+    """ Return the results of one size. """
+    # Imported here, the window needs the QApplication.
+    import gui
+    from PyQt5 import QtCore, QtWidgets
+
+    class BenchmarkWindow(gui.UI_MainWindow):
+        """ The window, recording when delivered output changes are first drawn moving. """
+
+        def init_ui(self, MainWindow):
+            self.delivered = [] # receive times of changes not yet applied by a step
+            self.actuated = [] # receive times of changes applied, but not yet drawn
+            self.frame_latency = []
+            super().init_ui(MainWindow)
+
+        def actions_output(self, changes, received):
+            super().actions_output(changes, received)
+            self.delivered.append(received)
+
+        def actions_input(self):
+            super().actions_input()
+            self.actuated.extend(self.delivered)
+            self.delivered = []
+
+        def update_view(self):
+            super().update_view()
+            now = time.perf_counter()
+            self.frame_latency.extend(now - received for received in self.actuated)
+            self.actuated = []
+
+    settings.LAYOUT = generate_layout_file(count, directory)
+    transport.shutdown()
+    memory = process_memory()
+    main_window = QtWidgets.QMainWindow()
+    window = BenchmarkWindow()
+    window.init_ui(main_window)
+    window_memory = process_memory()
+    # Let the PLC and the window run, then measure the latencies.
+    QtCore.QTimer.singleShot(round(duration * 1000), app.quit)
+    app.exec_()
+    # Stop the simulation cycle and the PLC, the I/O thread keeps taking the queued inputs.
+    window.timer.stop()
+    window.frame_timer.stop()
+    transport.mock_plc().stop()
+    app.processEvents()
+    latency = window.latency.summary()['output_to_actuation']
+    frames = sorted(window.frame_latency)
+    result = {
+        'actuators': 2 * count,
+        'memory': {
+            'engine_bytes_per_actuator': measure_engine_memory(count) / (2 * count),
+            'window_bytes_per_actuator': (window_memory - memory) / (2 * count) if memory else None,
+        },
+        'latency_ms': {
+            'output_to_actuation_mean': latency['mean'] * 1000,
+            'output_to_actuation_p99': latency['p99'] * 1000,
+            'notification_to_frame_count': len(frames),
+            'notification_to_frame_mean': statistics.mean(frames) * 1000 if frames else None,
+            'notification_to_frame_max': frames[-1] * 1000 if frames else None,
+        },
+    }
+    # Time the hot paths without the cycle timer.
+    outputs = [name for name, _ in window.layout.output_signals()]
+    first_input = window.layout.inputs[0].symbol
+    toggle = {'value': False}
+
+    def write_changed_inputs():
+        toggle['value'] = not toggle['value']
+        window.inputs[first_input] = toggle['value']
+        window.write_plc_inputs(time.monotonic())
+
+    def actions_output():
+        toggle['value'] = not toggle['value']
+        window.actions_output({name: toggle['value'] for name in outputs}, time.perf_counter())
+
+    window.tabwidget.setCurrentIndex(0)
+    result['us_per_call'] = {
+        'actions_input': time_calls(window.actions_input, number, repeat),
+        'set_input_values': time_calls(window.set_input_values, number, repeat),
+        'set_input_labels': time_calls(window.set_input_labels, number, repeat),
+        'set_motor_pixmaps': time_calls(window.set_motor_pixmaps, number, repeat),
+        'write_plc_inputs_unchanged': time_calls(window.write_plc_inputs, number, repeat),
+        'write_plc_inputs_changed': time_calls(write_changed_inputs, number, repeat),
+        'actions_output': time_calls(actions_output, number, repeat),
+        'update_view': time_calls(window.update_view, number, repeat),
+    }
+    window.stop_threading()
+    main_window.deleteLater()
+    app.processEvents()
+    return result
+
+def warm_up(count, directory):
+    """ Create and delete a window once. """
+    import gui
+    from PyQt5 import QtWidgets
+    settings.LAYOUT = generate_layout_file(count, directory)
+    main_window = QtWidgets.QMainWindow()
+    window = gui.UI_MainWindow()
+    window.init_ui(main_window)
+    window.stop_threading()
+    transport.shutdown()
+    main_window.deleteLater()
+    QtWidgets.QApplication.processEvents()
+
+def metadata():
+    """ Return the environment of the run. """
+    import numpy
+    from PyQt5 import QtCore
+    return {
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': numpy.__version__,
+        'qt': QtCore.QT_VERSION_STR,
+    }
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of the user interface.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help='numbers of cylinders and motors (each) (default: %(default)s)')
+    parser.add_argument('--number', type=int, default=100, help='calls per timing run (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs, the median is reported (default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=3.0,
+                        help='seconds the window runs with the mock PLC for the latencies (default: %(default)s)')
+    parser.add_argument('--json', help='write the results to this file')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_arguments(sys.argv[1:] if argv is None else argv)
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5 import QtWidgets
+    settings.TRANSPORT = 'mock'
+    settings.CYCLE_TIME = 0.01
+    app = QtWidgets.QApplication(sys.argv[:1])
+    results = {'metadata': metadata(), 'sizes': {}}
+    with tempfile.TemporaryDirectory() as directory:
+        # Warm up, so that the one-off memory of Qt is not counted for the first size.
+        warm_up(min(args.sizes), directory)
+        for count in args.sizes:
+            result = measure(app, count, directory, args.number, args.repeat, args.duration)
+            results['sizes'][str(2 * count)] = result
+            calls = result['us_per_call']
+            print('%d actuators: actions_input %.1f us, actions_output %.1f us, update_view %.1f us, '
+                  'notification to frame %s ms, engine %.0f B/actuator' % (
+                      2 * count, calls['actions_input'], calls['actions_output'], calls['update_view'],
+                      '%.2f' % result['latency_ms']['notification_to_frame_mean']
+                      if result['latency_ms']['notification_to_frame_mean'] is not None else '-',
+                      result['memory']['engine_bytes_per_actuator']))
+    transport.shutdown()
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Measure the output notification throughput of both modes against a local test server.
+
+Every cycle toggles all outputs of the default layout, as a PLC would in
+one task cycle. 'image' receives them in one notification, 'symbol' in one
+notification per variable.
+
+Usage: python -m benchmarks.notifications [cycles]
+"""
+
+# Standard library
+import sys
+import tempfile
+import time
+# Additional imports
+import pyads
+from pyads.testserver import AdsTestServer, AdvancedHandler, PLCVariable
+# Local imports
+from layout import load_layout
+from process_image import ADSIGRP_IOIMAGE_RWOB, OutputSubscriber, ProcessImage
+from symbol_cache import ADSIGRP_SYM_TABLE, SymbolCache
+
+SERVER_NET_ID = '127.0.0.1.1.1'
+SERVER_IP = '127.0.0.1'
+
+OUTPUTS = load_layout().output_signals()
+
+def create_server():
+    """ Start a test server which knows the output variables and the output area. """
+    handler = AdvancedHandler()
+    image = ProcessImage(OUTPUTS)
+    handler.add_variable(PLCVariable('IOIMAGE_RWOB', bytes(len(image)), pyads.constants.ADST_UINT8,
+                                     'BYTE', index_group=ADSIGRP_IOIMAGE_RWOB, index_offset=image.offset))
+    for offset, (name, _) in enumerate(OUTPUTS):
+        handler.add_variable(PLCVariable(name, bytes(1), pyads.constants.ADST_BIT, 'BOOL',
+                                         index_group=ADSIGRP_SYM_TABLE, index_offset=offset))
+    server = AdsTestServer(handler=handler, logging=False)
+    server.start()
+    time.sleep(0.5) # give the server time to listen
+    return server
+
+def measure(connection, symbols, mode, cycles):
+    """ Toggle all outputs in every cycle, return the statistics of the subscriber. """
+    image = ProcessImage(OUTPUTS)
+    subscriber = OutputSubscriber(connection, image, lambda changes, received: None, mode, symbols)
+    subscriber.subscribe()
+    expected = 0
+    try:
+        for cycle in range(cycles):
+            value = cycle % 2 == 0
+            if mode == 'image':
+                data = [0xFF if value else 0] * len(image)
+                connection.write(ADSIGRP_IOIMAGE_RWOB, image.offset, data, pyads.PLCTYPE_BYTE * len(data))
+            else:
+                for name, _ in OUTPUTS:
+                    connection.write(*symbols.table[name], value, pyads.PLCTYPE_BOOL)
+            expected += len(OUTPUTS)
+        timeout = time.monotonic() + 5.0
+        while subscriber.changes < expected and time.monotonic() < timeout:
+            time.sleep(0.01)
+    finally:
+        subscriber.unsubscribe()
+    return subscriber.statistics()
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    server = create_server()
+    connection = pyads.Connection(SERVER_NET_ID, pyads.PORT_TC3PLC1, SERVER_IP)
+    connection.open()
+    # The symbol table of the test server is known, nothing has to be uploaded.
+    symbols = SymbolCache(connection, SERVER_NET_ID, pyads.PORT_TC3PLC1, tempfile.mkdtemp())
+    symbols.table = {name: (ADSIGRP_SYM_TABLE, offset) for offset, (name, _) in enumerate(OUTPUTS)}
+    symbols.stale = False
+    try:
+        print('mode    notifications  changes  changes/s received  changes/s handled')
+        for mode in OutputSubscriber.MODES:
+            statistics = measure(connection, symbols, mode, cycles)
+            print('%-7s %13d  %7d  %18.0f  %17.0f' % (
+                mode, statistics['notifications'], statistics['changes'],
+                statistics['changes_per_second'], statistics['capacity']))
+    finally:
+        connection.close()
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Count the ADS round trips per input write cycle against a local test server.
+
+Usage: python -m benchmarks.roundtrips [cycles]
+"""
+
+# Standard library
+import sys
+import time
+# Additional imports
+import pyads
+from pyads.testserver import AdsTestServer, AdvancedHandler, PLCVariable
+# Local imports
+from layout import load_layout
+from process_image import ProcessImage, ProcessImageWriter
+
+SERVER_NET_ID = '127.0.0.1.1.1'
+SERVER_IP = '127.0.0.1'
+
+INPUTS = load_layout().input_signals()
+
+class CountingHandler(AdvancedHandler):
+    """ Test server handler which counts the received ADS requests. """
+
+    def __init__(self):
+        super().__init__()
+        self.requests = 0
+
+    def handle_request(self, request):
+        self.requests += 1
+        return super().handle_request(request)
+
+def create_server():
+    """ Start a test server which knows the input variables and the input area. """
+    handler = CountingHandler()
+    image = ProcessImage(INPUTS)
+    handler.add_variable(PLCVariable('IOIMAGE_RWIB', bytes(len(image)), pyads.constants.ADST_UINT8,
+                                     'BYTE', index_group=0xF020, index_offset=image.offset))
+    for name, _ in INPUTS:
+        handler.add_variable(PLCVariable(name, bytes(1), pyads.constants.ADST_BIT, 'BOOL'))
+    server = AdsTestServer(handler=handler, logging=False)
+    server.start()
+    time.sleep(0.5) # give the server time to listen
+    return server, handler
+
+def measure(connection, handler, mode, cycles):
+    """ Return (round trips per cycle, milliseconds per cycle) for the write mode. """
+    image = ProcessImage(INPUTS)
+    writer = ProcessImageWriter(connection, image, mode)
+    writer.write() # warm up caches
+    handler.requests = 0
+    start = time.perf_counter()
+    for cycle in range(cycles):
+        image.set('MAIN.iCyl1minus', cycle % 2 == 0)
+        writer.write()
+    elapsed = time.perf_counter() - start
+    return handler.requests / cycles, elapsed / cycles * 1000
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    server, handler = create_server()
+    connection = pyads.Connection(SERVER_NET_ID, pyads.PORT_TC3PLC1, SERVER_IP)
+    connection.open()
+    try:
+        print('mode    round trips/cycle  ms/cycle')
+        for mode in ('symbol', 'sum', 'image'):
+            round_trips, ms = measure(connection, handler, mode, cycles)
+            print('%-7s %17.1f  %8.3f' % (mode, round_trips, ms))
+    finally:
+        connection.close()
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" One connection to the PLC which notices when it drops and opens it again.
+
+ConnectionManager creates the connection of the transport and the symbol
+cache once and keeps them for the lifetime of the simulator. check(),
+called periodically by the thread which owns the connection, reads the PLC
+state every check_interval seconds. When the read fails or the PLC has left
+run mode, the connection is closed and opened again after a backoff which
+doubles with every failed attempt, up to backoff_max seconds. The
+subscribers register their notifications exactly once per connection: when
+it has been opened, and again only after the PLC has been re-downloaded.
+PyQt5 is not imported.
+"""
+
+# Standard library
+import time
+# Additional imports
+import pyads
+# Local imports
+from symbol_cache import SymbolCache
+from transport import create_connection, symbol_cache_dir
+
+# Seconds between two checks of the PLC state.
+CHECK_INTERVAL = 1.0
+# Seconds before the first attempt to reconnect, doubled after every failed attempt up to BACKOFF_MAX.
+BACKOFF_MIN = 0.5
+BACKOFF_MAX = 30.0
+# ADS error codes after which the connection is lost without another request to check it:
+# target port not found, target machine not found, timeout elapsed.
+LOST_ERRORS = (6, 7, 1861)
+
+class ConnectionManager(object):
+    """ Open, check, reopen and close the connection to the PLC, and the notifications which depend on it.
+
+    subscribers are objects with subscribe() and unsubscribe(delete), e.g. an
+    OutputSubscriber, whose notifications are counted in handles.
+    The functions in reconnected are executed after the connection has been
+    opened again, e.g. to write all inputs.
+    """
+
+    def __init__(self, ams_net_id, ams_net_port, transport=None, check_interval=CHECK_INTERVAL,
+                 backoff_min=BACKOFF_MIN, backoff_max=BACKOFF_MAX):
+        self.ams_net_id = ams_net_id
+        self.ams_net_port = ams_net_port
+        self.check_interval = check_interval
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.connection = create_connection(ams_net_id, ams_net_port, transport)
+        self.symbols = SymbolCache(self.connection, ams_net_id, ams_net_port, symbol_cache_dir(transport))
+        self.symbols.invalidated.append(self.invalidated)
+        self.subscribers = []
+        self.reconnected = []
+        # 'closed', 'connected' or 'disconnected' (waiting to reconnect).
+        self.state = 'closed'
+        self.resubscribe = False
+        self.backoff = backoff_min
+        self.next_check = 0.0 # time.monotonic() of the next check of the PLC state
+        self.next_attempt = 0.0 # time.monotonic() of the next attempt to reconnect
+        # Counters.
+        self.connects = 0 # successful opens, the first one included
+        self.drops = 0 # connections lost
+        self.failed_attempts = 0 # attempts to reconnect which failed
+        self.subscriptions = 0 # registrations of the notifications of all subscribers
+        self.last_error = None
+
+    def open(self):
+        """ Open the connection, check that the PLC runs and register the notifications.
+
+        Raise ADSError or RuntimeError, the connection is closed again then.
+        """
+        self.connection.open()
+        try:
+            state = self.connection.read_state() # (adsState, deviceState)
+            if state[0] != pyads.ADSSTATE_RUN:
+                raise RuntimeError('The PLC is not in run mode.')
+            self.symbols.watch()
+            self.subscribe()
+        except (pyads.pyads_ex.ADSError, RuntimeError):
+            self.teardown()
+            raise
+        reconnect = self.state == 'disconnected'
+        self.state = 'connected'
+        self.connects += 1
+        self.backoff = self.backoff_min
+        self.next_check = time.monotonic() + self.check_interval
+        if reconnect:
+            for function in self.reconnected:
+                function()
+
+    def start(self):
+        """ Open the connection, after a failure check() keeps trying with the backoff. Return None or the error. """
+        try:
+            self.open()
+        except (pyads.pyads_ex.ADSError, RuntimeError) as error:
+            self.failed_attempts += 1
+            self.last_error = str(error)
+            self.state = 'disconnected'
+            self.next_attempt = time.monotonic() + self.backoff
+            return error
+        return None
+
+    def invalidated(self):
+        """ Executed in the ADS thread when the PLC has been re-downloaded. """
+        self.resubscribe = True
+
+    def subscribe(self):
+        """ Register the notifications of all subscribers, their previous ones are deleted. """
+        self.resubscribe = False
+        for subscriber in self.subscribers:
+            subscriber.subscribe()
+        self.subscriptions += 1
+
+    def check(self):
+        """ Check the PLC state when it is due, reconnect or resubscribe if needed. Return True while connected.
+
+        Executed periodically by the thread which owns the connection.
+        """
+        now = time.monotonic()
+        if self.state == 'disconnected':
+            if now >= self.next_attempt:
+                self.reconnect()
+            return self.state == 'connected'
+        if self.state != 'connected':
+            return False
+        try:
+            if self.resubscribe:
+                self.subscribe()
+            if now >= self.next_check:
+                self.next_check = now + self.check_interval
+                if self.connection.read_state()[0] != pyads.ADSSTATE_RUN:
+                    self.dropped('The PLC is not in run mode.')
+        except pyads.pyads_ex.ADSError as error:
+            self.dropped(error)
+        return self.state == 'connected'
+
+    def failed(self, error=None):
+        """ Executed after an ADS call failed, the PLC state is checked with the next check().
+
+        An error of LOST_ERRORS drops the connection at once, the next attempt to reconnect follows the backoff.
+        """
+        if self.state == 'connected' and getattr(error, 'err_code', None) in LOST_ERRORS:
+            self.dropped(error)
+            return
+        self.next_check = 0.0
+
+    def dropped(self, error):
+        """ Forget the notifications and handles of the lost connection and close it. """
+        self.drops += 1
+        self.last_error = str(error)
+        self.state = 'disconnected'
+        # Deleting them would wait for the ADS timeout of every single one, closing the port deletes them.
+        self.teardown(delete=False)
+        self.next_attempt = time.monotonic() + self.backoff
+
+    def reconnect(self):
+        """ Try to open the connection again, after a failure the backoff is doubled. """
+        try:
+            self.open()
+        except (pyads.pyads_ex.ADSError, RuntimeError) as error:
+            self.failed_attempts += 1
+            self.last_error = str(error)
+            self.backoff = min(self.backoff * 2, self.backoff_max)
+            self.next_attempt = time.monotonic() + self.backoff
+
+    def teardown(self, delete=True):
+        """ Delete the notifications (unless delete is False), release the handles and close the connection. """
+        for subscriber in self.subscribers:
+            subscriber.unsubscribe(delete)
+        self.symbols.release(delete)
+        self.connection.close()
+
+    def close(self):
+        """ Tear the connection down, it is not opened again. """
+        if self.state == 'connected':
+            self.teardown()
+        self.state = 'closed'
+
+    def handles(self):
+        """ Return the number of open symbol handles and device notifications. """
+        notifications = sum(len(subscriber.handles) for subscriber in self.subscribers)
+        if self.symbols.watch_handles is not None:
+            notifications += 1
+        return len(self.symbols.handles), notifications
+
+    def statistics(self):
+        """ Return the state, the counters and the open handles and notifications. """
+        handles, notifications = self.handles()
+        return {
+            'state': self.state,
+            'connects': self.connects,
+            'drops': self.drops,
+            'failed_attempts': self.failed_attempts,
+            'backoff': self.backoff,
+            'subscriptions': self.subscriptions,
+            'handles': handles,
+            'notifications': notifications,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,262 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" The simulation engine. It does not depend on Qt or ADS.
+
+The state of all actuators of a kind is held in NumPy arrays, so one step
+advances every cylinder and motor with a few vectorized operations.
+The sensors are discrete events: a commanded movement computes the exact
+simulated time at which the actuator arrives and puts it into a priority
+queue, and a step changes the sensors in time order at the arrival times
+within it, however long the step is. next_event() tells the caller when
+to step next, so that a sensor change can be written at the moment it
+happens instead of at the next cycle. Besides the position, the actuators
+have the analog values speed and load, which are derived from their motion.
+"""
+
+# Standard library
+import heapq
+import itertools
+import math
+# Additional imports
+import numpy as np
+# Local imports
+from layout import load_layout
+
+# Travel times of the actuators in seconds.
+CYLINDER_TRAVEL_TIME = 1.5 # from one end position to the other
+MOTOR_RAMP_TIME = 3.0 # to start or stop the motor
+
+# Load of a motor while it ramps up, in its rated load, which it has at full speed.
+MOTOR_STARTING_LOAD = 2.0
+
+# Positions closer than this to an end position are snapped to it.
+EPSILON = 1e-9
+# Sensor changes up to this many simulated seconds after the end of a step are taken into it.
+TIME_EPSILON = 1e-6
+
+def clamp(position):
+    """ Limit the positions to 0.0 - 1.0 in place, snapping them to the end positions. """
+    position[position < EPSILON] = 0.0
+    position[position > 1.0 - EPSILON] = 1.0
+    return position
+
+class Cylinders(object):
+    """ Cylinders which move between the minus and plus position. """
+
+    def __init__(self, count, travel_time=CYLINDER_TRAVEL_TIME):
+        self.count = count
+        self.travel_time = np.broadcast_to(np.asarray(travel_time, dtype=float), (count,)).copy()
+        self.position = np.zeros(count) # 0.0 = minus position, 1.0 = plus position
+        self.velocity = np.zeros(count) # positions per second
+        # Simulated time at which a moving cylinder reaches the end position, inf while it stands.
+        self.arrival = np.full(count, math.inf)
+        # PLC outputs.
+        self.to_minus = np.zeros(count, dtype=bool)
+        self.to_plus = np.zeros(count, dtype=bool)
+        # PLC inputs (sensors).
+        self.minus = np.ones(count, dtype=bool)
+        self.plus = np.zeros(count, dtype=bool)
+        self.changes = 0 # sensor changes
+
+    def __len__(self):
+        return self.count
+
+    def command(self, index, now):
+        """ Start the cylinder if it is commanded away from its end position. Return the arrival time or None. """
+        if self.plus[index] and self.to_minus[index]:
+            self.velocity[index] = -1.0 / self.travel_time[index]
+            self.plus[index] = False
+        elif self.minus[index] and self.to_plus[index]:
+            self.velocity[index] = 1.0 / self.travel_time[index]
+            self.minus[index] = False
+        else:
+            return None
+        # The sensor of the end position it leaves is off at once.
+        self.changes += 1
+        self.arrival[index] = now + self.travel_time[index]
+        return float(self.arrival[index])
+
+    def arrive(self, index):
+        """ Stop the cylinder at the end position it has reached and switch its sensor on. """
+        plus = self.velocity[index] > 0.0
+        self.position[index] = 1.0 if plus else 0.0
+        self.velocity[index] = 0.0
+        self.arrival[index] = math.inf
+        self.plus[index] = plus
+        self.minus[index] = not plus
+        self.changes += 1
+
+    @property
+    def speed(self):
+        """ The speeds in strokes per second, negative towards the minus position. """
+        return self.velocity
+
+    @property
+    def load(self):
+        """ The loads: 1.0 while a cylinder moves, 0.0 while it stands. """
+        return (self.velocity != 0.0).astype(float)
+
+    def step(self, dt):
+        """ Advance all cylinders by dt seconds, the sensors are changed by arrive(). """
+        self.position += self.velocity * dt
+        clamp(self.position)
+
+class Motors(object):
+    """ Motors which ramp up when started and down when stopped. """
+
+    def __init__(self, count, ramp_time=MOTOR_RAMP_TIME):
+        self.count = count
+        self.ramp_time = np.broadcast_to(np.asarray(ramp_time, dtype=float), (count,)).copy()
+        self.position = np.zeros(count) # 0.0 = stopped, 1.0 = full speed
+        self.velocity = np.zeros(count) # positions per second
+        # Simulated time at which a ramping motor reaches full speed or standstill, inf while it does not ramp.
+        self.arrival = np.full(count, math.inf)
+        # PLC output.
+        self.start = np.zeros(count, dtype=bool)
+        # PLC input (sensor).
+        self.running = np.zeros(count, dtype=bool)
+        self.changes = 0 # sensor changes
+
+    def __len__(self):
+        return self.count
+
+    def command(self, index, now):
+        """ Ramp the motor towards its commanded state. Return the time it gets there, None if it is there. """
+        target = 1.0 if self.start[index] else 0.0
+        distance = target - self.position[index]
+        if distance == 0.0:
+            self.velocity[index] = 0.0
+            self.arrival[index] = math.inf
+            return None
+        # Also when the motor is ramping the other way.
+        self.velocity[index] = math.copysign(1.0 / self.ramp_time[index], distance)
+        self.arrival[index] = now + abs(distance) * self.ramp_time[index]
+        return float(self.arrival[index])
+
+    def arrive(self, index):
+        """ Stop the ramp at full speed or standstill and set the running sensor. """
+        running = self.velocity[index] > 0.0
+        self.position[index] = 1.0 if running else 0.0
+        self.velocity[index] = 0.0
+        self.arrival[index] = math.inf
+        if self.running[index] != running:
+            self.running[index] = running
+            self.changes += 1
+
+    @property
+    def speed(self):
+        """ The speeds, 1.0 = full speed. """
+        return self.position
+
+    @property
+    def load(self):
+        """ The loads in rated loads: MOTOR_STARTING_LOAD while a motor ramps up, none while it ramps down,
+        its speed otherwise.
+        """
+        return np.where(self.velocity > 0.0, MOTOR_STARTING_LOAD, np.where(self.velocity < 0.0, 0.0, self.position))
+
+    def step(self, dt):
+        """ Advance all motors by dt seconds, the sensors are changed by arrive(). """
+        self.position += self.velocity * dt
+        clamp(self.position)
+
+class SimulationEngine(object):
+    """ Owns the actuator state and advances it on its own clock. """
+
+    def __init__(self, layout=None):
+        self.layout = load_layout() if layout is None else layout
+        self.time = 0.0 # simulated seconds
+        self.cylinders = Cylinders(len(self.layout.cylinders),
+                                   [cylinder.get('travel_time', CYLINDER_TRAVEL_TIME)
+                                    for cylinder in self.layout.cylinders])
+        self.motors = Motors(len(self.layout.motors),
+                             [motor.get('ramp_time', MOTOR_RAMP_TIME) for motor in self.layout.motors])
+        # PLC output symbol -> (actuator arrays, command array, index).
+        self.outputs = {}
+        for signal in self.layout.outputs:
+            actuators = getattr(self, signal.kind)
+            self.outputs[signal.symbol] = (actuators, getattr(actuators, signal.field), signal.index)
+        # PLC input symbol -> (sensor array, index).
+        self.sensors = {}
+        for signal in self.layout.inputs:
+            actuators = getattr(self, signal.kind)
+            self.sensors[signal.symbol] = (getattr(actuators, signal.field), signal.index)
+        # Priority queue of the arrivals: (simulated time, sequence, actuators, index). An entry
+        # whose time is no longer the arrival time of the actuator has been superseded.
+        self.events = []
+        self.sequence = itertools.count()
+        # Simulated time of the last sensor change, None before the first one.
+        self.last_change = None
+
+    @property
+    def changes(self):
+        """ The number of sensor changes so far. """
+        return self.cylinders.changes + self.motors.changes
+
+    def command(self, actuators, index, now):
+        """ Start the movement commanded by the outputs of an actuator at the simulated time now. """
+        changes = actuators.changes
+        arrival = actuators.command(index, now)
+        if arrival is not None:
+            heapq.heappush(self.events, (arrival, next(self.sequence), actuators, index))
+        if actuators.changes != changes:
+            self.last_change = now
+
+    def set_output(self, name, value):
+        """ Apply a PLC output to the actuator, at the current simulated time. """
+        actuators, commands, index = self.outputs[name]
+        commands[index] = bool(value)
+        self.command(actuators, index, self.time)
+
+    def get_output(self, name):
+        """ Return the PLC output applied to the actuator. """
+        _, commands, index = self.outputs[name]
+        return bool(commands[index])
+
+    def apply_outputs(self):
+        """ Start the movements commanded by the output arrays, e.g. after they were set directly. """
+        for actuators in (self.cylinders, self.motors):
+            for index in range(len(actuators)):
+                self.command(actuators, index, self.time)
+
+    def next_event(self):
+        """ Return the simulated time of the next sensor change, None if no actuator is moving. """
+        events = self.events
+        while events and events[0][2].arrival[events[0][3]] != events[0][0]:
+            heapq.heappop(events)
+        return events[0][0] if events else None
+
+    def step(self, dt):
+        """ Advance the simulation by dt simulated seconds, changing the sensors at the exact arrival times. """
+        start = self.time
+        end = start + dt
+        events = self.events
+        while events and events[0][0] <= end + TIME_EPSILON:
+            arrival, _, actuators, index = heapq.heappop(events)
+            if actuators.arrival[index] != arrival:
+                continue # superseded
+            changes = actuators.changes
+            actuators.arrive(index)
+            if actuators.changes != changes:
+                self.last_change = arrival
+            # Commanded away again: it starts back at the time of the arrival.
+            self.command(actuators, index, arrival)
+            # The step below moves it by dt, of which only end - arrival is after the restart.
+            actuators.position[index] -= actuators.velocity[index] * (arrival - start)
+        self.time = end
+        self.cylinders.step(dt)
+        self.motors.step(dt)
+
+    def advance_to(self, time):
+        """ Advance the simulation up to the simulated time, which may not lie in the past. """
+        self.step(max(0.0, time - self.time))
+
+    def run(self, duration, dt):
+        """ Advance the simulation by duration seconds in steps of dt, as fast as possible. """
+        end = self.time + duration
+        while self.time < end:
+            self.step(min(dt, end - self.time))
+
+    def inputs(self):
+        """ Return the PLC inputs (sensors) by name. """
+        return {name: bool(sensors[index]) for name, (sensors, index) in self.sensors.items()}
@@ -0,0 +1,604 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Standard library
+import math
+import sys
+import time
+# Additional imports
+from PyQt5 import QtCore, QtGui, QtWidgets
+# Local imports
+import settings
+from engine import SimulationEngine
+from io_monitor import IOTableModel, IOTableView
+from io_worker import IOWorker
+from latency import LatencyMonitor, MetricsServer
+from layout import load_layout
+from process_image import AnalogImage
+from profiler import SamplingProfiler, SlotMonitor, install_signal_handler
+from recording import Recorder
+from scene import PlantScene, PlantView
+from scheduler import CycleScheduler
+from shared_image import SharedImageWriter
+from trend import TrendRecorder
+from trend_view import TrendView
+
+# Seconds between two redraws of the Trend tab.
+TREND_INTERVAL = 0.2
+
+class ReadTimer(QtCore.QThread):
+    """ Trigger the simulation cycle at absolute deadlines. """
+    # Signal must be defined at the same level as the methods.
+    timer_signal = QtCore.pyqtSignal(str)
+
+    def __init__(self, cycle_time, parent=None):
+        super().__init__(parent=parent)
+        self.scheduler = CycleScheduler(cycle_time, self.tick)
+        # True while a cycle waits for the GUI thread, further cycles are skipped meanwhile.
+        self.pending = False
+        self.skipped = 0
+
+    def run(self):
+        """ Executed automatically when the thread starts. """
+        self.scheduler.stop_event.clear()
+        self.scheduler.run()
+
+    def tick(self):
+        """ Executed by the scheduler every cycle. """
+        if self.pending:
+            self.skipped += 1
+            return
+        self.pending = True
+        self.timer_signal.emit('') # send a signal
+
+    def stop(self):
+        """ Stop the thread after the current cycle. """
+        self.scheduler.stop()
+        self.wait()
+
+class IOThread(QtCore.QThread):
+    """ Run the IOWorker, which owns the connection to the PLC, and signal its results to the GUI thread. """
+    # A signal which is sent with the thread and None or the error when the connection has been checked.
+    connection_signal = QtCore.pyqtSignal('PyQt_PyObject', 'PyQt_PyObject')
+    # A signal which is sent with the changed outputs {name: value} and the time.perf_counter() of the callback.
+    notification_signal = QtCore.pyqtSignal('PyQt_PyObject', float)
+
+    def __init__(self, layout, latency=None, recorder=None, slots=None, parent=None):
+        super().__init__(parent=parent)
+        self.worker = IOWorker(layout, self.notification_signal.emit, settings.AMS_NET_ID, settings.AMS_NET_PORT,
+                               settings.KEEP_ALIVE, settings.NOTIFICATION_MODE, latency, recorder)
+        self.worker.connected = self.connected
+        if slots is not None:
+            # The ADS calls block this thread, not the event loop, they are timed to tell the two apart.
+            self.worker.call = slots.timed('ads_call', self.worker.call)
+
+    def connected(self, error):
+        """ Executed by the worker when the connection has been checked. """
+        self.connection_signal.emit(self, error)
+
+    def run(self):
+        """ Executed automatically when the thread starts. """
+        self.worker.run()
+
+    def stop(self, wait=True):
+        """ Stop the thread after the current ADS call. """
+        self.worker.stop(wait=False)
+        if wait:
+            self.wait()
+
+class UI_MainWindow(object):
+    """ The user interface of the main window. """
+  
+    def init_ui(self, MainWindow):
+        """ Initialize the user interface. """
+        # Set the appearance of the window.
+        MainWindow.setGeometry(QtCore.QRect(100, 100, 500, 640))
+        MainWindow.setWindowIcon(QtGui.QIcon('icon.png'))
+        MainWindow.setWindowTitle('Simulator')
+        # Set font.
+        self.font_arial = QtGui.QFont('Arial', 10)
+        self.font_arial.setBold(True)
+        # Pixmaps.
+        self.cylinder = QtGui.QPixmap('cylinder.png')
+        self.motor_off = QtGui.QPixmap('motor_off.png') # red
+        self.motor_on = QtGui.QPixmap('motor_on.png') # green
+        self.motor_ts = QtGui.QPixmap('motor_ts.png') # yellow (transition state)
+        # The plant layout and the simulation engine, which owns the state of the cylinders and motors.
+        self.layout = load_layout(settings.LAYOUT)
+        self.engine = SimulationEngine(self.layout)
+        self.inputs = self.engine.inputs()
+        # Packs the analog values for the I/O thread, which writes them as one struct.
+        self.analog_image = AnalogImage(self.layout.analog) if self.layout.analog else None
+        # Publishes the state of the simulation for other local processes.
+        self.shared_image = SharedImageWriter(settings.SHARED_IMAGE, self.layout) if settings.SHARED_IMAGE else None
+        # The history of the I/O and of the positions for the Trend tab, redrawn at most every TREND_INTERVAL.
+        self.trend = TrendRecorder(self.layout, settings.TREND_MEMORY)
+        self.last_trend = 0.0
+        # Latency histograms of the PLC <-> simulator loop.
+        self.latency = LatencyMonitor()
+        # Durations of the slots and the event loop lag, and the sampling profiler which runs on demand.
+        self.slots = SlotMonitor()
+        self.profiler = SamplingProfiler()
+        if settings.PROFILE:
+            self.profiler.start()
+        # Create a centralwidget object.
+        self.centralwidget = QtWidgets.QWidget(MainWindow)
+        # Tabwidget configuration.
+        self.tabwidget = QtWidgets.QTabWidget(self.centralwidget)
+        self.tabwidget.setGeometry(QtCore.QRect(0, 0, 500, 620))
+        # Setup the user interface of the tabs.
+        self.setup_tab_1_ui()
+        self.setup_tab_2_ui()
+        self.setup_tab_3_ui()
+        self.setup_tab_4_ui()
+        self.setup_tab_5_ui()
+        # Display copyright information at the bottom of the window.
+        self.lbl_footer = QtWidgets.QLabel(self.centralwidget)
+        self.lbl_footer.setGeometry(QtCore.QRect(80, 620, 400, 20))
+        self.lbl_footer.setText('Copyright (C) 2019 Seinäjoki University of Applied Sciences')
+        # Set centralwidget.
+        MainWindow.setCentralWidget(self.centralwidget)
+        # Tab configuration.
+        self.tabwidget.setCurrentIndex(0)
+        self.tabwidget.setTabText(self.tabwidget.indexOf(self.tab_1), 'Simulation')
+        self.tabwidget.setTabText(self.tabwidget.indexOf(self.tab_2), 'Settings')
+        self.tabwidget.setTabText(self.tabwidget.indexOf(self.tab_3), 'Diagnostics')
+        self.tabwidget.setTabText(self.tabwidget.indexOf(self.tab_4), 'I/O monitor')
+        self.tabwidget.setTabText(self.tabwidget.indexOf(self.tab_5), 'Trend')
+        # The heartbeat of the event loop, which measures how late it runs.
+        self.heartbeat_timer = QtCore.QTimer(self.centralwidget)
+        self.heartbeat_timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.heartbeat_timer.timeout.connect(self.slots.beat)
+        self.heartbeat_timer.start(round(self.slots.interval * 1000))
+        # Make sure that there is a working connection with the TwinCAT.
+        self.check_connection_with_twincat()
+
+    def check_connection_with_twincat(self):
+        """ Connect to the TwinCAT in the I/O thread, the result arrives in connection_checked. """
+        self.stop_threading(wait=False)
+        # Record the PLC outputs for an offline replay.
+        self.recorder = None
+        if settings.RECORD:
+            self.recorder = Recorder(settings.RECORD, [name for name, _ in self.layout.output_signals()])
+        # Start a thread, which owns the connection: it writes the inputs and sends a signal when outputs change.
+        self.io = IOThread(self.layout, self.latency, self.recorder, self.slots)
+        self.io.connection_signal.connect(self.connection_checked)
+        self.io.notification_signal.connect(self.slots.timed('actions_output', self.actions_output))
+        self.io_model.attach(self.io.worker.input_image)
+        self.io_model.attach(self.io.worker.output_image)
+        self.io.start()
+
+    def connection_checked(self, io, error):
+        """ Executed when the I/O thread has checked the connection. """
+        if io is not getattr(self, 'io', None):
+            return # the thread has been stopped meanwhile
+        if error is None:
+            # Successfull connection.
+            self.open_messagebox_information()
+            self.start_threading()
+        else:
+            self.open_messagebox_critical(error) # open a popup window
+
+    def open_messagebox_critical(self, error):
+        """ Open a popup window which displays an error message, without blocking the event loop. """
+        title = 'ADS Connection Error'
+        message = str(error) + '\nPlease, check AMS Net ID and AMS Net Port, the connection is retried meanwhile.'
+        self.messagebox = QtWidgets.QMessageBox(QtWidgets.QMessageBox.Critical, title, message,
+                                                QtWidgets.QMessageBox.Ok, self.centralwidget)
+        self.messagebox.open()
+        # Open the 'Settings' tab.
+        self.tabwidget.setCurrentIndex(1)
+
+    def open_messagebox_information(self):
+        """ Open a popup window, which displays an information message, without blocking the event loop. """
+        title = 'Information'
+        message = 'Connected with the TwinCAT!'
+        self.messagebox = QtWidgets.QMessageBox(QtWidgets.QMessageBox.Information, title, message,
+                                                QtWidgets.QMessageBox.Ok, self.centralwidget)
+        self.messagebox.open()
+        # Open the 'Simulation' tab.
+        self.tabwidget.setCurrentIndex(0)
+
+    def start_threading(self):
+        """ Start the threads. """
+        # Start a thread, which sends a signal periodically.
+        self.timer = ReadTimer(settings.CYCLE_TIME) # create an instance of the class
+        actions_input = self.slots.timed('actions_input', self.actions_input)
+        self.timer.timer_signal.connect(lambda text: actions_input()) # connect the signal to the timed method
+        self.timer.start() # start the thread
+        # The inputs and analog values as last queued for the I/O thread.
+        self.submitted_inputs = None
+        self.submitted_analog = None
+        # Draw the simulation independently of the cycle time, at most settings.FRAME_RATE times per second.
+        self.last_step = time.monotonic()
+        self.frame_timer = QtCore.QTimer(self.centralwidget)
+        self.frame_timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.frame_timer.timeout.connect(self.slots.timed('update_view', self.update_view))
+        self.frame_timer.start(round(1000 / settings.FRAME_RATE))
+        # Step the simulation at its sensor changes, so that they are written at the moment they happen.
+        self.event_timer = QtCore.QTimer(self.centralwidget)
+        self.event_timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.event_timer.setSingleShot(True)
+        self.event_timer.timeout.connect(self.slots.timed('update_inputs', self.update_inputs))
+        # Export the latency histograms.
+        if settings.METRICS_FILE:
+            self.metrics_timer = QtCore.QTimer(self.centralwidget)
+            self.metrics_timer.timeout.connect(self.export_metrics)
+            self.metrics_timer.start(round(settings.METRICS_INTERVAL * 1000))
+        if settings.METRICS_PORT:
+            self.metrics_server = MetricsServer(self.latency, settings.METRICS_PORT)
+            self.metrics_server.start()
+
+    def stop_threading(self, wait=True):
+        """ Stop the threads, with wait=False a stalled I/O thread finishes on its own. """
+        if hasattr(self, 'frame_timer'):
+            self.frame_timer.stop()
+            del self.frame_timer
+        if hasattr(self, 'event_timer'):
+            self.event_timer.stop()
+            del self.event_timer
+        if hasattr(self, 'timer'):
+            self.timer.stop()
+            del self.timer
+        if hasattr(self, 'metrics_timer'):
+            self.metrics_timer.stop()
+            del self.metrics_timer
+            self.export_metrics()
+        if hasattr(self, 'metrics_server'):
+            self.metrics_server.stop()
+            del self.metrics_server
+        if hasattr(self, 'io'):
+            self.io.stop(wait)
+            if not wait:
+                # Keep the thread objects alive until their threads have finished.
+                self.stopped_io = [io for io in getattr(self, 'stopped_io', []) if io.isRunning()] + [self.io]
+            del self.io
+        if getattr(self, 'recorder', None) is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def button_clicked(self):
+        """ Update ADS configuration. """
+        if self.textbox_id.text():
+            settings.AMS_NET_ID = self.textbox_id.text() # read new Id from the textbox
+            self.lbl_config_id.setText('AMS Net Id = ' + settings.AMS_NET_ID) # update label text
+        if self.textbox_port.text():
+            settings.AMS_NET_PORT = int(self.textbox_port.text())
+            self.lbl_config_port.setText('AMS Net Port = ' + str(settings.AMS_NET_PORT))
+        if self.textbox_cycle.text():
+            self.update_cycle_time()
+        if self.textbox_id.text() or self.textbox_port.text():
+            # Clear the textboxes.
+            self.textbox_id.setText('')
+            self.textbox_port.setText('')
+            # Retry the connection with new value(s).
+            self.check_connection_with_twincat()
+
+    def update_cycle_time(self):
+        """ Change the cycle time, also while the simulation is running. """
+        try:
+            cycle_time = float(self.textbox_cycle.text()) / 1000
+            CycleScheduler.check_cycle_time(cycle_time)
+        except ValueError as error:
+            QtWidgets.QMessageBox.warning(self.centralwidget, 'Cycle time', str(error))
+            return
+        settings.CYCLE_TIME = cycle_time
+        if hasattr(self, 'timer'):
+            self.timer.scheduler.set_cycle_time(cycle_time)
+        self.lbl_config_cycle.setText('Cycle time = %g ms' % (cycle_time * 1000))
+        self.textbox_cycle.setText('')
+
+    #-------------------------------------------------------------------------
+    def setup_tab_1_ui(self):
+        """ Setup the user interface on the first tab from the plant layout. """
+        self.tab_1 = QtWidgets.QWidget()
+        # The actuators and signals are items of one scene, which shares the pixmaps.
+        self.scene = PlantScene(self.layout, self.cylinder, (self.motor_off, self.motor_on, self.motor_ts),
+                                self.font_arial, self.tab_1)
+        self.view = PlantView(self.scene, self.tab_1)
+        box = QtWidgets.QVBoxLayout(self.tab_1)
+        box.setContentsMargins(0, 0, 0, 0)
+        box.addWidget(self.view)
+
+        self.tabwidget.addTab(self.tab_1, '')
+
+    #-------------------------------------------------------------------------
+    def setup_tab_2_ui(self):
+        """ Setup the user interface on the second tab. """
+        self.tab_2 = QtWidgets.QWidget()
+
+        self.lbl_info = QtWidgets.QLabel(self.tab_2)
+        self.lbl_info.setGeometry(QtCore.QRect(20, 20, 150, 30))
+        self.lbl_info.setText('Current configuration:')
+        # Label showing the AMS Net Id currently in use.
+        self.lbl_config_id = QtWidgets.QLabel(self.tab_2)
+        self.lbl_config_id.setGeometry(QtCore.QRect(200, 20, 200, 30))
+        self.lbl_config_id.setText('AMS Net Id = ' + settings.AMS_NET_ID)
+        # Label showing the AMS Net Port currently in use.
+        self.lbl_config_port = QtWidgets.QLabel(self.tab_2)
+        self.lbl_config_port.setGeometry(QtCore.QRect(200, 50, 200, 30))
+        self.lbl_config_port.setText('AMS Net Port = ' + str(settings.AMS_NET_PORT))
+        # Label showing the cycle time currently in use.
+        self.lbl_config_cycle = QtWidgets.QLabel(self.tab_2)
+        self.lbl_config_cycle.setGeometry(QtCore.QRect(200, 80, 200, 30))
+        self.lbl_config_cycle.setText('Cycle time = %g ms' % (settings.CYCLE_TIME * 1000))
+
+        self.lbl_update = QtWidgets.QLabel(self.tab_2)
+        self.lbl_update.setGeometry(QtCore.QRect(20, 70, 150, 30))
+        self.lbl_update.setText('Update values:')
+        self.lbl_net_id = QtWidgets.QLabel(self.tab_2)
+        self.lbl_net_id.setGeometry(QtCore.QRect(20, 110, 80, 30))
+        self.lbl_net_id.setText('AMS Net Id')
+        self.lbl_net_port = QtWidgets.QLabel(self.tab_2)
+        self.lbl_net_port.setGeometry(QtCore.QRect(20, 150, 80, 30))
+        self.lbl_net_port.setText('AMS Net Port')
+        self.lbl_cycle = QtWidgets.QLabel(self.tab_2)
+        self.lbl_cycle.setGeometry(QtCore.QRect(20, 190, 100, 30))
+        self.lbl_cycle.setText('Cycle time (ms)')
+
+        # Text input field for typing the AMS Net Id.
+        self.textbox_id = QtWidgets.QLineEdit(self.tab_2)
+        self.textbox_id.setGeometry(QtCore.QRect(120, 110, 150, 30))
+        # Text input field for typing the AMS Net Port.
+        self.textbox_port = QtWidgets.QLineEdit(self.tab_2)
+        self.textbox_port.setGeometry(QtCore.QRect(120, 150, 150, 30))
+        # Text input field for typing the cycle time.
+        self.textbox_cycle = QtWidgets.QLineEdit(self.tab_2)
+        self.textbox_cycle.setGeometry(QtCore.QRect(120, 190, 150, 30))
+        # Update Id/port/cycle time when the button is clicked.
+        self.button = QtWidgets.QPushButton(self.tab_2)
+        self.button.clicked.connect(self.button_clicked)
+        self.button.setGeometry(QtCore.QRect(20, 240, 100, 30))
+        self.button.setText('Update values')
+        # Start or stop the sampling profiler when the button is clicked.
+        self.button_profiler = QtWidgets.QPushButton(self.tab_2)
+        self.button_profiler.clicked.connect(self.toggle_profiler)
+        self.button_profiler.setGeometry(QtCore.QRect(140, 240, 110, 30))
+        self.button_profiler.setText('Stop profiler' if self.profiler.running else 'Start profiler')
+        self.lbl_profiler = QtWidgets.QLabel(self.tab_2)
+        self.lbl_profiler.setGeometry(QtCore.QRect(270, 240, 210, 30))
+        # Label showing the cycle statistics.
+        self.lbl_cycle_stats = QtWidgets.QLabel(self.tab_2)
+        self.lbl_cycle_stats.setGeometry(QtCore.QRect(20, 290, 460, 150))
+        
+        self.tabwidget.addTab(self.tab_2, '')
+
+    #-------------------------------------------------------------------------
+    def setup_tab_3_ui(self):
+        """ Setup the user interface on the third tab. """
+        self.tab_3 = QtWidgets.QWidget()
+
+        self.lbl_latency_info = QtWidgets.QLabel(self.tab_3)
+        self.lbl_latency_info.setGeometry(QtCore.QRect(20, 20, 460, 30))
+        self.lbl_latency_info.setText('Latency of the PLC <-> simulator loop (ms):')
+        # Label showing the latency table.
+        self.lbl_latency = QtWidgets.QLabel(self.tab_3)
+        self.lbl_latency.setGeometry(QtCore.QRect(20, 60, 460, 120))
+        font_fixed = QtGui.QFont('Monospace', 8)
+        font_fixed.setStyleHint(QtGui.QFont.TypeWriter)
+        self.lbl_latency.setFont(font_fixed)
+        self.lbl_latency.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop)
+        # Export the histograms when the button is clicked.
+        self.button_export = QtWidgets.QPushButton(self.tab_3)
+        self.button_export.clicked.connect(self.export_metrics)
+        self.button_export.setGeometry(QtCore.QRect(20, 200, 130, 30))
+        self.button_export.setText('Export metrics')
+        self.lbl_export = QtWidgets.QLabel(self.tab_3)
+        self.lbl_export.setGeometry(QtCore.QRect(170, 200, 310, 30))
+        self.lbl_slots_info = QtWidgets.QLabel(self.tab_3)
+        self.lbl_slots_info.setGeometry(QtCore.QRect(20, 250, 460, 30))
+        self.lbl_slots_info.setText('Duration of the slots and lag of the event loop (ms):')
+        # Label showing the slot table.
+        self.lbl_slots = QtWidgets.QLabel(self.tab_3)
+        self.lbl_slots.setGeometry(QtCore.QRect(20, 290, 460, 120))
+        self.lbl_slots.setFont(font_fixed)
+        self.lbl_slots.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop)
+
+        self.tabwidget.addTab(self.tab_3, '')
+
+    def set_latency_label(self):
+        """ Show the latency histograms and the slot durations as tables. """
+        self.lbl_latency.setText(self.format_summary('stage', self.latency.summary()))
+        self.lbl_slots.setText(self.format_summary('slot', self.slots.summary()))
+
+    @staticmethod
+    def format_summary(title, summaries):
+        """ Return the summaries of histograms by name as a table in milliseconds. """
+        lines = ['%-20s %7s %8s %8s %8s %8s' % (title, 'count', 'mean', 'p50', 'p99', 'max')]
+        for name, summary in summaries.items():
+            lines.append('%-20s %7d %8.2f %8.2f %8.2f %8.2f' % (
+                name, summary['count'], summary['mean'] * 1000, summary['p50'] * 1000,
+                summary['p99'] * 1000, summary['max'] * 1000))
+        return '\n'.join(lines)
+
+    def toggle_profiler(self):
+        """ Start the sampling profiler, or stop it and write its samples. """
+        try:
+            path = self.profiler.toggle(settings.PROFILE)
+        except OSError as error:
+            self.lbl_profiler.setText(str(error))
+            path = ''
+        if path is None:
+            self.lbl_profiler.setText('Profiling...')
+        elif path:
+            self.lbl_profiler.setText('Written to ' + path)
+        self.button_profiler.setText('Stop profiler' if self.profiler.running else 'Start profiler')
+
+    def export_metrics(self):
+        """ Write the histograms in Prometheus text format to the metrics file. """
+        path = settings.METRICS_FILE or 'latency.prom'
+        try:
+            self.latency.write_prometheus(path)
+        except OSError as error:
+            self.lbl_export.setText(str(error))
+        else:
+            self.lbl_export.setText('Written to ' + path)
+
+    #-------------------------------------------------------------------------
+    def setup_tab_4_ui(self):
+        """ Setup the I/O monitor on the fourth tab. """
+        self.tab_4 = QtWidgets.QWidget()
+        # The values are taken from the input and output image when they are attached.
+        self.io_model = IOTableModel(self.layout.input_signals() + self.layout.output_signals())
+        self.io_view = IOTableView(self.io_model, self.tab_4)
+        self.io_view.setGeometry(QtCore.QRect(20, 20, 460, 560))
+
+        self.tabwidget.addTab(self.tab_4, '')
+
+    #-------------------------------------------------------------------------
+    def setup_tab_5_ui(self):
+        """ Setup the trend of the I/O and of the positions on the fifth tab. """
+        self.tab_5 = QtWidgets.QWidget()
+        self.trend_view = TrendView(self.trend, self.tab_5)
+        self.trend_view.setGeometry(QtCore.QRect(20, 20, 460, 560))
+
+        self.tabwidget.addTab(self.tab_5, '')
+
+    #-------------------------------------------------------------------------
+    def actions_input(self):
+        """ Executed every cycle: advance the simulation and write the changed inputs. """
+        self.update_inputs()
+        self.timer.pending = False
+
+    def advance_simulation(self):
+        """ Advance the simulation up to now, return time.monotonic(). """
+        now = time.monotonic()
+        self.engine.step(now - self.last_step)
+        self.last_step = now
+        return now
+
+    def update_inputs(self):
+        """ Advance the simulation, write the changed inputs and wait for the next sensor change. """
+        now = self.advance_simulation()
+        self.latency.actuated()
+        self.set_input_values()
+        self.trend.record(self.engine)
+        if self.shared_image is not None:
+            self.shared_image.publish(self.engine)
+        changed_at = now
+        if self.engine.last_change is not None:
+            # The simulated time follows time.monotonic(), the change may lie a little before now.
+            changed_at -= self.engine.time - self.engine.last_change
+        self.write_plc_inputs(changed_at)
+        self.schedule_sensor_event()
+
+    def schedule_sensor_event(self):
+        """ Execute update_inputs at the next sensor change of the simulation. """
+        event = self.engine.next_event()
+        if event is None:
+            self.event_timer.stop()
+        else:
+            # Rounded up, a timer which fires before the change would have to be started again.
+            self.event_timer.start(math.ceil((event - self.engine.time) * 1000))
+
+    def set_input_values(self):
+        """ Set the inputs based on the actuators' state. """
+        self.inputs = self.engine.inputs()
+
+    def set_input_labels(self):
+        """ Set the texts of the PLC inputs, the changed ones are drawn with the next frame. """
+        self.scene.set_signal_values(self.inputs)
+
+    def set_motor_pixmaps(self):
+        """ Set the pixmap of the motors whose state changed: off (red), on (green) or transition state (yellow). """
+        self.scene.set_motor_states(self.engine.motors.position)
+
+    def write_plc_inputs(self, changed_at=None):
+        """ Queue the inputs for the I/O thread when they have changed, the keep-alive is its business. """
+        analog = self.analog_image.pack(self.engine) if self.analog_image is not None else None
+        if analog == self.submitted_analog:
+            analog = None
+        if ((self.inputs != self.submitted_inputs or analog is not None)
+                and self.io.worker.submit(self.inputs, changed_at, analog)):
+            self.submitted_inputs = self.inputs
+            if analog is not None:
+                self.submitted_analog = analog
+
+    #-------------------------------------------------------------------------
+    def actions_output(self, changes, received):
+        """ Executed when the signal is received from the thread. """
+        self.latency.delivered(received)
+        # The first outputs arrive before the threads are started.
+        started = hasattr(self, 'event_timer')
+        if started:
+            # The outputs take effect now, not with the next cycle.
+            self.advance_simulation()
+        self.set_output_values(changes)
+        self.set_output_labels(changes)
+        if started:
+            self.update_inputs()
+
+    def set_output_values(self, changes):
+        """ Apply the changed PLC outputs {name: value} to the simulation. """
+        for name, value in changes.items():
+            if name in self.engine.outputs:
+                self.engine.set_output(name, value)
+
+    def set_output_labels(self, changes):
+        """ Set the texts of the changed PLC outputs, they are drawn with the next frame. """
+        self.scene.set_signal_values({name: self.engine.get_output(name)
+                                      for name in changes if name in self.engine.outputs})
+
+    #-------------------------------------------------------------------------
+    def update_view(self):
+        """ Draw the current state of the simulation. """
+        # Also while the monitor is hidden, so that it knows when the signals changed.
+        self.io_model.refresh()
+        if self.tabwidget.currentIndex() == 0:
+            # The scene compares against what it drew last, so frames skipped while hidden are caught up.
+            self.move_elements()
+            self.set_input_labels()
+            self.set_motor_pixmaps()
+            self.scene.update_signals()
+        elif self.tabwidget.currentIndex() == 1:
+            self.set_cycle_statistics_label()
+        elif self.tabwidget.currentIndex() == 2:
+            self.set_latency_label()
+        elif self.tabwidget.currentIndex() == 4 and time.monotonic() - self.last_trend >= TREND_INTERVAL:
+            self.last_trend = time.monotonic()
+            self.trend_view.refresh()
+
+    def set_cycle_statistics_label(self):
+        """ Show the cycle counters, jitter statistics and output notification throughput. """
+        statistics = self.timer.scheduler.statistics()
+        text = ('Cycles: %d, overruns: %d, skipped: %d\n'
+                'Jitter (ms): min %.3f, mean %.3f, p99 %.3f, max %.3f' % (
+                    statistics['cycles'], statistics['overruns'], self.timer.skipped,
+                    statistics['jitter_min'] * 1000, statistics['jitter_mean'] * 1000,
+                    statistics['jitter_p99'] * 1000, statistics['jitter_max'] * 1000))
+        io = self.io.worker.statistics()
+        text += ('\nI/O (%s): queue %d (max %d), dropped %d, batches %d\n'
+                 'ADS call blocked (ms): now %.1f, last %.1f, max %.1f, errors %d' % (
+                     io['state'], io['queue_depth'], io['queue_max'], io['dropped'], io['batches'],
+                     io['stall_current'] * 1000, io['stall_last'] * 1000, io['stall_max'] * 1000, io['errors']))
+        connection = io['connection']
+        if connection is not None:
+            text += '\nConnection: %d drops, %d failed reconnects, open handles %d, notifications %d' % (
+                connection['drops'], connection['failed_attempts'], connection['handles'],
+                connection['notifications'])
+        subscriber = self.io.worker.output_subscriber
+        if subscriber is not None:
+            statistics = subscriber.statistics()
+            text += '\nOutputs (%s): %d notifications, %d changes, %.0f changes/s handled' % (
+                subscriber.mode, statistics['notifications'], statistics['changes'], statistics['capacity'])
+        self.lbl_cycle_stats.setText(text)
+
+    def move_elements(self):
+        """ Move the cylinders and motors whose position changed. """
+        self.scene.move_actuators(self.engine.cylinders.position, self.engine.motors.position)
+
+def main(args):
+    """ Entry point of 'simulator.py'. """
+    app = QtWidgets.QApplication(sys.argv[:1])
+    main_window = QtWidgets.QMainWindow()
+    window = UI_MainWindow()
+    window.init_ui(main_window)
+    app.aboutToQuit.connect(window.stop_threading)
+    install_signal_handler(window.toggle_profiler)
+    main_window.show()
+    status = app.exec_()
+    if window.profiler.running:
+        window.toggle_profiler()
+    if window.shared_image is not None:
+        window.shared_image.close()
+    return status
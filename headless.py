@@ -0,0 +1,265 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Run the simulation without a user interface. PyQt5 is not imported. """
+
+# Standard library
+import queue
+import time
+# Additional imports
+import pyads
+# Local imports
+import settings
+from connection import ConnectionManager
+from engine import TIME_EPSILON, SimulationEngine
+from latency import LatencyMonitor, MetricsServer
+from layout import NotificationConfig, load_layout
+from lockstep import Lockstep
+from process_image import AnalogImage, AnalogWriter, InputPublisher, OutputSubscriber, ProcessImage, ProcessImageWriter
+from profiler import SamplingProfiler, install_signal_handler
+from recording import Recorder
+from scheduler import CycleScheduler
+from shared_image import SharedImageWriter
+
+class HeadlessSimulator(object):
+    """ Connect the simulation engine to the PLC without a user interface. """
+
+    def __init__(self, ams_net_id, ams_net_port, layout, cycle_time=settings.CYCLE_TIME, time_scale=1.0,
+                 keep_alive=settings.KEEP_ALIVE, notification_mode=settings.NOTIFICATION_MODE,
+                 metrics_file=settings.METRICS_FILE, record=settings.RECORD, notification=None,
+                 shared_image=settings.SHARED_IMAGE):
+        self.ams_net_id = ams_net_id
+        self.ams_net_port = ams_net_port
+        self.layout = layout
+        self.engine = SimulationEngine(layout)
+        # Simulated seconds per cycle.
+        self.cycle_time = cycle_time
+        # Simulated seconds per wall-clock second, 0 runs as fast as possible.
+        self.time_scale = time_scale
+        self.keep_alive = keep_alive
+        self.notification_mode = notification_mode
+        # Default NotificationConfig of the outputs, the layout can override it.
+        self.notification = notification or NotificationConfig(
+            settings.NOTIFICATION_TRANSMISSION, settings.NOTIFICATION_MAX_DELAY, settings.NOTIFICATION_CYCLE_TIME)
+        self.cycles = 0 # steps, in real time also those at sensor changes and received outputs
+        # PLC output change-sets and their receive times, received in the ADS thread and
+        # applied in the simulation loop.
+        self.changes = queue.Queue()
+        self.latency = LatencyMonitor()
+        # The histograms are written to the file every settings.METRICS_INTERVAL seconds.
+        self.metrics_file = metrics_file
+        self.last_export = time.monotonic()
+        # Path of the log file to which the PLC outputs are recorded.
+        self.record = record
+        self.recorder = None
+        # Publishes the state after every step for other local processes.
+        self.shared_image = SharedImageWriter(shared_image, layout) if shared_image else None
+        self.manager = None
+        self.scheduler = None
+        # Set by a Lockstep, which reads the outputs every PLC cycle instead of the notifications.
+        self.lockstep = None
+        # Set by stop(), e.g. from another thread, ends run() after the current cycle.
+        self.stopping = False
+
+    def connect(self, retry=False):
+        """ Open the connection and register the notifications. Raise ADSError or RuntimeError.
+
+        With retry=True a failure is returned instead, and step() keeps trying to connect with the backoff.
+        """
+        self.manager = ConnectionManager(self.ams_net_id, self.ams_net_port)
+        self.connection = self.manager.connection
+        self.symbols = self.manager.symbols
+        self.input_image = ProcessImage(self.layout.input_signals())
+        self.input_writer = ProcessImageWriter(self.connection, self.input_image,
+                                               symbols=self.symbols)
+        # The analog values of the layout, written as one struct.
+        self.analog_image = None
+        analog_writer = None
+        if self.layout.analog:
+            self.analog_image = AnalogImage(self.layout.analog)
+            analog_writer = AnalogWriter(self.connection, self.analog_image, self.layout.analog_symbol, self.symbols)
+        self.input_publisher = InputPublisher(self.input_writer, self.keep_alive, self.latency, analog_writer)
+        self.output_image = ProcessImage(self.layout.output_signals())
+        if self.record:
+            self.recorder = Recorder(self.record, [name for name, _ in self.layout.output_signals()])
+        config, configs = self.layout.notification_configs(self.notification)
+        self.output_subscriber = OutputSubscriber(self.connection, self.output_image, self.received,
+                                                  self.notification_mode, self.symbols, self.latency,
+                                                  self.recorder, config, configs)
+        self.manager.subscribers.append(self.output_subscriber if self.lockstep is None else self.lockstep)
+        self.manager.reconnected.append(self.reconnected)
+        if retry:
+            return self.manager.start()
+        self.manager.open()
+        return None
+
+    def received(self, changes, received):
+        """ Executed in the ADS thread with the changed PLC outputs. """
+        self.changes.put((changes, received))
+        scheduler = self.scheduler
+        if scheduler is not None:
+            # Applied at once, not with the next cycle.
+            scheduler.wake()
+
+    def reconnected(self):
+        """ Executed by the manager after a reconnect: write the whole input image, the PLC may have lost it. """
+        self.input_publisher.published = None
+        self.input_publisher.analog_published = None
+        self.input_publisher.publish({})
+
+    def step(self, dt=None):
+        """ Advance the simulation by dt simulated seconds (default: one cycle), apply the outputs, write the inputs. """
+        # Detects a lost connection, reconnects when the backoff has elapsed and resubscribes after a re-download.
+        connected = self.manager.check()
+        self.engine.step(self.cycle_time if dt is None else dt)
+        while True:
+            try:
+                changes, received = self.changes.get_nowait()
+            except queue.Empty:
+                break
+            self.latency.delivered(received)
+            for name, value in changes.items():
+                self.engine.set_output(name, value)
+        self.latency.actuated()
+        analog = self.analog_image.pack(self.engine) if self.analog_image is not None else None
+        if not connected:
+            # Kept in the images, the reconnect writes them.
+            self.input_image.update(self.engine.inputs())
+            if analog is not None:
+                self.analog_image.data[:] = analog
+        else:
+            changed_at = time.monotonic()
+            if self.time_scale and self.engine.last_change is not None:
+                # The sensor changed at its simulated time, which may lie a little before the step.
+                changed_at -= (self.engine.time - self.engine.last_change) / self.time_scale
+            # Write only the changed inputs, or all of them when the keep-alive period has elapsed.
+            try:
+                if not self.input_publisher.publish(self.engine.inputs(), changed_at, analog):
+                    self.input_publisher.refresh()
+            except pyads.pyads_ex.ADSError:
+                self.manager.failed()
+        if self.shared_image is not None:
+            self.shared_image.publish(self.engine)
+        self.cycles += 1
+        if self.metrics_file and time.monotonic() - self.last_export >= settings.METRICS_INTERVAL:
+            self.latency.write_prometheus(self.metrics_file)
+            self.last_export = time.monotonic()
+
+    def run(self, duration=None):
+        """ Run for duration simulated seconds, or until interrupted. """
+        end = None if duration is None else self.engine.time + duration
+        if not self.time_scale:
+            # As fast as possible, the last step ends at the end.
+            while (end is None or self.engine.time < end - TIME_EPSILON) and not self.stopping:
+                self.step(self.cycle_time if end is None else min(self.cycle_time, end - self.engine.time))
+            return
+        # time.perf_counter() of the simulated time 0, the simulation follows the wall clock.
+        origin = time.perf_counter() - self.engine.time / self.time_scale
+        def cycle():
+            now = (time.perf_counter() - origin) * self.time_scale
+            if end is not None:
+                now = min(now, end)
+            self.step(max(0.0, now - self.engine.time))
+            if (end is not None and self.engine.time >= end - TIME_EPSILON) or self.stopping:
+                self.scheduler.stop()
+        def next_event():
+            # The next sensor change, so that it is written at the moment it happens.
+            event = self.engine.next_event()
+            return None if event is None else origin + event / self.time_scale
+        # One cycle_time of simulated time takes cycle_time / time_scale seconds.
+        self.scheduler = CycleScheduler(self.cycle_time / self.time_scale, cycle, next_event=next_event)
+        self.scheduler.run()
+
+    def stop(self):
+        """ End run() after the current cycle. """
+        self.stopping = True
+
+    def statistics(self):
+        """ Return the cycle, input, output and latency statistics. """
+        return {
+            'time': self.engine.time,
+            'cycles': self.cycles,
+            'cycle': self.scheduler.statistics() if self.scheduler is not None else None,
+            'inputs': self.input_publisher.statistics(),
+            'outputs': self.output_subscriber.statistics(),
+            'latency': self.latency.summary(),
+            'connection': self.manager.statistics(),
+        }
+
+    def close(self):
+        """ Delete the notifications and close the connection. """
+        self.manager.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.shared_image is not None:
+            self.shared_image.close()
+
+def main(args):
+    """ Entry point of 'simulator.py --headless'. """
+    layout = load_layout(args.layout)
+    time_scale = 1.0 if args.time_scale is None else args.time_scale
+    simulator = HeadlessSimulator(args.ams_net_id, args.ams_net_port, layout,
+                                  args.cycle_time, time_scale, args.keep_alive, args.notification_mode,
+                                  args.metrics_file, args.record, shared_image=args.shared_image)
+    lockstep = Lockstep(simulator, args.lockstep, args.lockstep_task) if args.lockstep else None
+    error = simulator.connect(retry=True)
+    if error is not None:
+        print('Could not connect to the PLC (%s), retrying in the background.' % error)
+    profiler = SamplingProfiler()
+    def toggle_profiler():
+        path = profiler.toggle(args.profile)
+        print('Profiler started.' if path is None else 'Profile written to %s.' % path)
+    install_signal_handler(toggle_profiler)
+    if args.profile:
+        profiler.start()
+    metrics_server = None
+    if args.metrics_port:
+        metrics_server = MetricsServer(simulator.latency, args.metrics_port)
+        metrics_server.start()
+    start = time.monotonic()
+    try:
+        if lockstep is not None:
+            lockstep.run(args.duration)
+        else:
+            simulator.run(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.close()
+        if metrics_server is not None:
+            metrics_server.stop()
+        if args.metrics_file:
+            simulator.latency.write_prometheus(args.metrics_file)
+        if profiler.running:
+            toggle_profiler()
+    elapsed = time.monotonic() - start
+    print('Simulated %.1f s in %.1f s (%d cycles).' % (simulator.engine.time, elapsed, simulator.cycles))
+    if lockstep is not None:
+        statistics = lockstep.statistics()
+        print('Lockstep (%s): %d PLC cycles of %.3f ms, %d skipped, %d waits without a PLC cycle.' % (
+            statistics['mode'], statistics['cycles'], (statistics['task_cycle_time'] or 0.0) * 1000,
+            statistics['skipped'], statistics['timeouts']))
+    elif simulator.time_scale:
+        statistics = simulator.scheduler.statistics()
+        print('Cycle time %.3f ms: %d overruns, jitter min %.3f / mean %.3f / p99 %.3f / max %.3f ms.' % (
+            statistics['cycle_time'] * 1000, statistics['overruns'],
+            statistics['jitter_min'] * 1000, statistics['jitter_mean'] * 1000,
+            statistics['jitter_p99'] * 1000, statistics['jitter_max'] * 1000))
+        print('Steps between the cycles at sensor changes and received outputs: %d.' % statistics['events'])
+    statistics = simulator.input_publisher.statistics()
+    print('Input writes: %d changed, %d analog, %d keep-alive, %d avoided.' % (
+        statistics['writes'], statistics['analog_writes'], statistics['refreshes'], statistics['writes_avoided']))
+    print('Sensor change to PLC latency: mean %.3f ms, max %.3f ms.' % (
+        statistics['latency_mean'] * 1000, statistics['latency_max'] * 1000))
+    statistics = simulator.output_subscriber.statistics()
+    print('Output notifications (%s, %s): %d, %d changes, %.0f changes/s received, %.0f changes/s handled.' % (
+        simulator.notification_mode, simulator.notification.transmission, statistics['notifications'],
+        statistics['changes'],
+        statistics['changes_per_second'], statistics['capacity']))
+    statistics = simulator.manager.statistics()
+    print('Connection: %d drops, %d failed reconnects; left open after closing: %d handles, %d notifications.' % (
+        statistics['drops'], statistics['failed_attempts'], statistics['handles'], statistics['notifications']))
+    print('%-20s %7s %8s %8s %8s %8s' % ('latency (ms)', 'count', 'mean', 'p50', 'p99', 'max'))
+    for stage, summary in simulator.latency.summary().items():
+        print('%-20s %7d %8.2f %8.2f %8.2f %8.2f' % (
+            stage, summary['count'], summary['mean'] * 1000, summary['p50'] * 1000,
+            summary['p99'] * 1000, summary['max'] * 1000))
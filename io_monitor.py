@@ -0,0 +1,152 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" A table of all PLC inputs and outputs: symbol, address, value and time of the last change.
+
+IOTableModel reads the values straight from the process images which the
+simulator keeps anyway (the input image written to the PLC and the output
+image received from it). refresh() compares every image with the bytes it
+showed last and emits dataChanged only for the rows of the bits which
+flipped, so an unchanged image costs one comparison of bytes. The view only
+renders its visible rows, and a QSortFilterProxyModel sorts and filters.
+"""
+
+# Standard library
+import math
+import time
+# Additional imports
+import numpy as np
+from PyQt5 import QtCore, QtWidgets
+# Local imports
+from layout import parse_address
+
+# Role returning a value which sorts in the natural order of the column.
+SORT_ROLE = QtCore.Qt.UserRole
+
+class IOTableModel(QtCore.QAbstractTableModel):
+    """ One row per PLC signal (name, address), the values come from attached ProcessImages. """
+    SYMBOL, ADDRESS, VALUE, CHANGED = range(4)
+    HEADERS = ('Symbol', 'Address', 'Value', 'Last change')
+
+    def __init__(self, signals, parent=None):
+        super().__init__(parent)
+        self.symbols = [name for name, _ in signals]
+        self.addresses = [address for _, address in signals]
+        self.rows = {name: row for row, name in enumerate(self.symbols)}
+        # Addresses as numbers, %I before %Q, then by byte and bit.
+        self.address_keys = []
+        for address in self.addresses:
+            area, byte, bit = parse_address(address)
+            self.address_keys.append((area == 'Q') << 32 | byte << 3 | bit)
+        self.values = np.zeros(len(signals), dtype=bool)
+        self.changed_at = np.full(len(signals), math.nan) # time.time(), NaN = never changed
+        # Attached images by area: [image, bytes shown, row of every bit (-1 = no signal)].
+        self.images = {}
+
+    def attach(self, image):
+        """ Show the values of a ProcessImage, it replaces an image of the same area. """
+        rows = np.full(len(image) * 8, -1)
+        for name, (index, mask) in image.bits.items():
+            if name in self.rows:
+                rows[index * 8 + mask.bit_length() - 1] = self.rows[name]
+        # Compared against all bits cleared, the signals which are set are shown by the next refresh.
+        self.images[image.area] = [image, bytes(len(image)), rows]
+
+    def refresh(self):
+        """ Take over the bits which flipped since the last refresh and emit dataChanged for their rows. """
+        now = None
+        for entry in self.images.values():
+            image, shown, rows = entry
+            data = bytes(image.data)
+            if data == shown:
+                continue
+            bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder='little')
+            flipped = np.flatnonzero(bits != np.unpackbits(np.frombuffer(shown, dtype=np.uint8), bitorder='little'))
+            flipped = flipped[rows[flipped] >= 0]
+            entry[1] = data
+            if not len(flipped):
+                continue
+            if now is None:
+                now = time.time()
+            changed = rows[flipped]
+            self.values[changed] = bits[flipped]
+            self.changed_at[changed] = now
+            self.emit_changed(np.sort(changed))
+
+    def emit_changed(self, rows):
+        """ Emit dataChanged for the value and time columns, one signal per run of consecutive rows. """
+        ends = np.flatnonzero(np.diff(rows) != 1)
+        starts = np.concatenate(([0], ends + 1))
+        for start, end in zip(rows[starts].tolist(), rows[np.append(ends, len(rows) - 1)].tolist()):
+            self.dataChanged.emit(self.index(start, self.VALUE), self.index(end, self.CHANGED))
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.symbols)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        row, column = index.row(), index.column()
+        if role == QtCore.Qt.DisplayRole:
+            if column == self.SYMBOL:
+                return self.symbols[row]
+            if column == self.ADDRESS:
+                return self.addresses[row]
+            if column == self.VALUE:
+                return str(bool(self.values[row]))
+            changed_at = self.changed_at[row]
+            if math.isnan(changed_at):
+                return ''
+            return time.strftime('%H:%M:%S', time.localtime(changed_at)) + '.%03d' % (changed_at % 1 * 1000)
+        if role == SORT_ROLE:
+            if column == self.SYMBOL:
+                return self.symbols[row]
+            if column == self.ADDRESS:
+                return self.address_keys[row]
+            if column == self.VALUE:
+                return int(self.values[row])
+            changed_at = self.changed_at[row]
+            return -1.0 if math.isnan(changed_at) else float(changed_at)
+        if role == QtCore.Qt.TextAlignmentRole and column != self.SYMBOL:
+            return QtCore.Qt.AlignCenter
+        return None
+
+class IOTableView(QtWidgets.QWidget):
+    """ A filter text box above a sortable table of an IOTableModel. """
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.model = model
+        self.proxy = QtCore.QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(model)
+        self.proxy.setSortRole(SORT_ROLE)
+        self.proxy.setFilterCaseSensitivity(QtCore.Qt.CaseInsensitive)
+        self.proxy.setFilterKeyColumn(-1) # all columns, e.g. 'Q1.' or 'True'
+        self.filter = QtWidgets.QLineEdit(self)
+        self.filter.setPlaceholderText('Filter')
+        self.filter.textChanged.connect(self.proxy.setFilterFixedString)
+        self.table = QtWidgets.QTableView(self)
+        self.table.setModel(self.proxy)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(IOTableModel.ADDRESS, QtCore.Qt.AscendingOrder)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.setAlternatingRowColors(True)
+        self.table.setWordWrap(False)
+        # Fixed row heights and column widths, so that no row outside the viewport is ever measured.
+        self.table.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(20)
+        self.table.verticalHeader().hide()
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(QtWidgets.QHeaderView.Interactive)
+        header.setStretchLastSection(True)
+        for column, width in ((IOTableModel.SYMBOL, 190), (IOTableModel.ADDRESS, 75), (IOTableModel.VALUE, 55)):
+            self.table.setColumnWidth(column, width)
+        box = QtWidgets.QVBoxLayout(self)
+        box.setContentsMargins(0, 0, 0, 0)
+        box.addWidget(self.filter)
+        box.addWidget(self.table)
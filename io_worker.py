@@ -0,0 +1,222 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" All ADS I/O of the user interface in a thread of its own.
+
+IOWorker owns the connection: it connects, writes the inputs which the
+simulation submits through a bounded queue and delivers the PLC outputs to
+a callback. The GUI thread only ever puts snapshots of the inputs into the
+queue, so a slow or unreachable PLC stalls the worker, not the window.
+Snapshots which are queued while a write is in progress are merged and
+written in one go, as are the analog values of the layout, which are a
+struct of their own. A ConnectionManager checks the connection between the
+writes and reopens it when it drops; the inputs submitted meanwhile are
+written as a whole after the reconnect. The worker keeps running while the
+PLC cannot be reached, also when the first attempt to connect fails, and
+makes no further ADS request until the manager has the connection back.
+PyQt5 is not imported.
+"""
+
+# Standard library
+import queue
+import threading
+import time
+# Additional imports
+import pyads
+# Local imports
+import settings
+from connection import ConnectionManager
+from layout import NotificationConfig
+from process_image import AnalogImage, AnalogWriter, InputPublisher, OutputSubscriber, ProcessImage, ProcessImageWriter
+
+# Input snapshots which can wait for the worker, further ones are dropped until it catches up.
+QUEUE_SIZE = 64
+# Seconds the worker waits for inputs before it checks the keep-alive period and the connection.
+IDLE_TIMEOUT = 0.1
+
+class IOWorker(object):
+    """ Write the inputs to and receive the outputs from the PLC without blocking the caller.
+
+    output_callback is executed in the ADS thread with the changed outputs
+    {name: value} and the time.perf_counter() of the notification.
+    notification is the default NotificationConfig of the outputs, which the
+    layout can override (default: from the settings).
+    connected, if set, is executed in the worker thread with the error when
+    the first attempt to connect fails, and with None once the connection has
+    been opened (the first time only, later reconnects are not reported).
+    """
+
+    def __init__(self, layout, output_callback, ams_net_id=None, ams_net_port=None,
+                 keep_alive=settings.KEEP_ALIVE, notification_mode=settings.NOTIFICATION_MODE,
+                 latency=None, recorder=None, queue_size=QUEUE_SIZE, notification=None):
+        self.layout = layout
+        self.output_callback = output_callback
+        self.ams_net_id = ams_net_id or settings.AMS_NET_ID
+        self.ams_net_port = ams_net_port or settings.AMS_NET_PORT
+        self.keep_alive = keep_alive
+        self.notification_mode = notification_mode
+        self.notification = notification or NotificationConfig(
+            settings.NOTIFICATION_TRANSMISSION, settings.NOTIFICATION_MAX_DELAY, settings.NOTIFICATION_CYCLE_TIME)
+        self.latency = latency
+        self.recorder = recorder
+        self.connected = None
+        # The images exist before the connection, so that they can already be shown.
+        self.input_image = ProcessImage(layout.input_signals())
+        self.output_image = ProcessImage(layout.output_signals())
+        self.analog_image = AnalogImage(layout.analog) if layout.analog else None
+        self.queue = queue.Queue(queue_size)
+        self.manager = None
+        self.input_publisher = None
+        self.output_subscriber = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.state = 'connecting'
+        # Counters.
+        self.submitted = 0 # snapshots queued
+        self.dropped = 0 # snapshots rejected because the queue was full
+        self.queue_max = 0 # highest queue depth seen
+        self.batches = 0 # writes of one or more merged snapshots
+        self.stall_last = 0.0 # seconds the last ADS call blocked the worker
+        self.stall_max = 0.0
+        self.call_started = None # time.perf_counter() of the ADS call in progress
+        self.errors = 0
+        self.last_error = None
+
+    def submit(self, values, changed_at=None, analog=None):
+        """ Queue a snapshot of the inputs {name: value}, never blocks. Return False if the queue is full.
+
+        changed_at is the time.monotonic() of the sensor change, it is used
+        for the latency statistics. analog are the bytes of the analog struct
+        (see AnalogImage.pack), None if they are unchanged.
+        """
+        try:
+            self.queue.put_nowait((dict(values), changed_at, analog))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        self.queue_max = max(self.queue_max, self.queue.qsize())
+        return True
+
+    def connect(self):
+        """ Open the connection, check the PLC state and register the notifications. Return None or the error. """
+        self.manager = ConnectionManager(self.ams_net_id, self.ams_net_port)
+        connection, symbols = self.manager.connection, self.manager.symbols
+        writer = ProcessImageWriter(connection, self.input_image, symbols=symbols)
+        analog_writer = None
+        if self.analog_image is not None:
+            analog_writer = AnalogWriter(connection, self.analog_image, self.layout.analog_symbol, symbols)
+        self.input_publisher = InputPublisher(writer, self.keep_alive, self.latency, analog_writer)
+        config, configs = self.layout.notification_configs(self.notification)
+        self.output_subscriber = OutputSubscriber(connection, self.output_image, self.output_callback,
+                                                  self.notification_mode, symbols, self.latency, self.recorder,
+                                                  config, configs)
+        self.manager.subscribers.append(self.output_subscriber)
+        self.manager.reconnected.append(self.reconnected)
+        # After a failure the manager keeps trying with its backoff.
+        return self.manager.start()
+
+    def reconnected(self):
+        """ Executed by the manager after a reconnect: write the whole input image, the PLC may have lost it. """
+        self.input_publisher.published = None
+        self.input_publisher.analog_published = None
+        self.input_publisher.publish({})
+
+    def call(self, function, *args):
+        """ Execute an ADS call, measuring how long it blocks. Return its result, None after an error. """
+        start = self.call_started = time.perf_counter()
+        try:
+            return function(*args)
+        except pyads.pyads_ex.ADSError as error:
+            self.errors += 1
+            self.last_error = str(error)
+            self.manager.failed(error)
+            return None
+        finally:
+            self.call_started = None
+            self.stall_last = time.perf_counter() - start
+            self.stall_max = max(self.stall_max, self.stall_last)
+
+    def start(self):
+        """ Run the worker in a thread of its own. """
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='IOWorker', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """ Connect, then write the submitted inputs until stop() is called, reconnecting when needed. """
+        error = self.connect()
+        self.state = 'running'
+        reported = error is None
+        if self.connected is not None:
+            self.connected(error)
+        while not self.stop_event.is_set():
+            try:
+                values, changed_at, analog = self.queue.get(timeout=IDLE_TIMEOUT)
+            except queue.Empty:
+                values = None
+            if self.stop_event.is_set():
+                break
+            connected = self.call(self.manager.check)
+            if connected and not reported:
+                reported = True
+                if self.connected is not None:
+                    self.connected(None)
+            if values is None:
+                if connected:
+                    self.call(self.input_publisher.refresh)
+                continue
+            # Merge the snapshots queued meanwhile, the latest values win.
+            while True:
+                try:
+                    later, later_changed_at, later_analog = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                values.update(later)
+                if changed_at is None:
+                    changed_at = later_changed_at
+                if later_analog is not None:
+                    analog = later_analog
+            if not connected:
+                # Kept in the images, the reconnect writes them.
+                self.input_image.update(values)
+                if analog is not None:
+                    self.analog_image.data[:] = analog
+                continue
+            self.batches += 1
+            # None after an error: no refresh on the same connection, the manager checks it first.
+            if self.call(self.input_publisher.publish, values, changed_at, analog) is False:
+                self.call(self.input_publisher.refresh)
+        self.close()
+
+    def close(self):
+        """ Delete the notifications and close the connection. """
+        self.call(self.manager.close)
+        self.state = 'closed'
+
+    def stop(self, wait=True):
+        """ Stop the worker after the current ADS call, and wait for it unless wait is False. """
+        self.stop_event.set()
+        if wait and self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def statistics(self):
+        """ Return the queue and stall counters, stall_current is how long the ADS call in progress blocks.
+
+        connection holds the statistics of the ConnectionManager, None before the first connect.
+        """
+        started = self.call_started
+        manager = self.manager
+        return {
+            'state': manager.state if manager is not None and self.state == 'running' else self.state,
+            'queue_depth': self.queue.qsize(),
+            'queue_max': self.queue_max,
+            'submitted': self.submitted,
+            'dropped': self.dropped,
+            'batches': self.batches,
+            'stall_current': time.perf_counter() - started if started is not None else 0.0,
+            'stall_last': self.stall_last,
+            'stall_max': self.stall_max,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'connection': manager.statistics() if manager is not None else None,
+        }
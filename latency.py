@@ -0,0 +1,179 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Latency histograms of the PLC <-> simulator loop and their Prometheus export.
+
+PLC output -> actuator:
+    plc_to_callback     PLC timestamp of the notification -> ADS callback
+                        (compares the PLC clock with the PC clock)
+    callback_to_signal  ADS callback -> Qt slot (or the headless simulation loop)
+    signal_to_actuation Qt slot -> first simulation step which moves the actuator
+    output_to_actuation ADS callback -> first simulation step which moves the actuator
+
+Sensor -> PLC input:
+    sensor_to_write     sensor change -> input write completed
+"""
+
+# Standard library
+import bisect
+import http.server
+import os
+import threading
+import time
+
+STAGES = ('plc_to_callback', 'callback_to_signal', 'signal_to_actuation', 'output_to_actuation',
+          'sensor_to_write')
+
+# Upper bounds (in seconds) of the histogram buckets, from 10 us to 10 s.
+BUCKETS = tuple(mantissa * 10.0 ** exponent for exponent in range(-5, 1)
+                for mantissa in (1.0, 2.5, 5.0)) + (10.0,)
+
+# Seconds between the Windows FILETIME epoch (1601) and the Unix epoch (1970).
+FILETIME_EPOCH = 11644473600
+
+def filetime_to_seconds(filetime):
+    """ Convert a FILETIME (100 ns ticks since 1601) to seconds since the Unix epoch. """
+    return filetime / 1e7 - FILETIME_EPOCH
+
+class Histogram(object):
+    """ Latencies counted into fixed buckets, the memory does not grow with the samples. """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # the last one counts values above all bounds
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds):
+        """ Add a latency. Negative values (clock differences) count as 0. """
+        seconds = max(seconds, 0.0)
+        # The first bucket whose upper bound is not below the value.
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """ Return the upper bound of the bucket which contains the quantile q. """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        """ Return count, mean, p50, p99 and max in seconds. """
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'max': self.max or 0.0,
+        }
+
+class LatencyMonitor(object):
+    """ One histogram per stage of the PLC <-> simulator loop. """
+
+    def __init__(self):
+        self.histograms = {stage: Histogram() for stage in STAGES}
+        # Output change-sets delivered to the simulation, but not yet applied by a step:
+        # [(received, delivered), ...] as time.perf_counter().
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        """ Add a latency to the histogram of the stage. """
+        with self.lock:
+            self.histograms[stage].add(seconds)
+
+    def received(self, plc_time):
+        """ Executed in the ADS callback with the PLC timestamp (seconds since the epoch). """
+        self.add('plc_to_callback', time.time() - plc_time)
+
+    def delivered(self, received):
+        """ Executed when a change-set received at time.perf_counter() reaches the simulation. """
+        now = time.perf_counter()
+        self.add('callback_to_signal', now - received)
+        self.pending.append((received, now))
+
+    def actuated(self):
+        """ Executed after every simulation step, the delivered changes have now been applied. """
+        if not self.pending:
+            return
+        now = time.perf_counter()
+        for received, delivered in self.pending:
+            self.add('signal_to_actuation', now - delivered)
+            self.add('output_to_actuation', now - received)
+        self.pending = []
+
+    def summary(self):
+        """ Return the summaries of all stages. """
+        with self.lock:
+            return {stage: self.histograms[stage].summary() for stage in STAGES}
+
+    def to_prometheus(self):
+        """ Return the histograms in the Prometheus text exposition format. """
+        lines = ['# HELP simulator_latency_seconds Latency of the stages of the PLC <-> simulator loop.',
+                 '# TYPE simulator_latency_seconds histogram']
+        with self.lock:
+            for stage in STAGES:
+                histogram = self.histograms[stage]
+                total = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    total += count
+                    lines.append('simulator_latency_seconds_bucket{stage="%s",le="%g"} %d' % (stage, bound, total))
+                lines.append('simulator_latency_seconds_bucket{stage="%s",le="+Inf"} %d' % (stage, histogram.count))
+                lines.append('simulator_latency_seconds_sum{stage="%s"} %.9f' % (stage, histogram.sum))
+                lines.append('simulator_latency_seconds_count{stage="%s"} %d' % (stage, histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """ Write the histograms to a file, e.g. for the textfile collector of node_exporter. """
+        # Write a temporary file first, so that a reader never sees a partial file.
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as file:
+            file.write(self.to_prometheus())
+        os.replace(temporary, path)
+
+class MetricsServer(object):
+    """ Serve the histograms of a LatencyMonitor at http://host:port/metrics. """
+
+    def __init__(self, monitor, port, host='127.0.0.1'):
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = monitor.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # no logging of every scrape
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        """ Serve in a thread of its own. """
+        self.thread = threading.Thread(target=self.server.serve_forever, name='MetricsServer', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,183 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" The plant layout: actuators, their PLC symbols, bit addresses and screen coordinates.
+
+The layout is read from a JSON file (see layouts/default.json) and compiled
+into dispatch tables, so finding the actuator of a PLC signal takes constant
+time whatever the plant size. Analog values of the actuators (see
+layouts/analog.json) are members of one PLC struct, in the order of its
+channels.
+"""
+
+# Standard library
+import collections
+import json
+import os
+import re
+
+# The layout which is used when no other layout is given.
+DEFAULT_LAYOUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layouts', 'default.json')
+
+# PLC inputs and outputs of each kind of actuator.
+ACTUATOR_SIGNALS = {
+    'cylinders': {'inputs': ('minus', 'plus'), 'outputs': ('to_minus', 'to_plus')},
+    'motors': {'inputs': ('running',), 'outputs': ('start',)},
+}
+
+# Analog values of each kind of actuator, see engine.py.
+ANALOG_VALUES = {
+    'cylinders': ('position', 'speed', 'load'),
+    'motors': ('speed', 'load'),
+}
+# PLC data types of the analog values.
+ANALOG_TYPES = ('INT', 'DINT', 'REAL')
+
+ADDRESS_PATTERN = re.compile(r'^%([IQ])X(\d+)\.([0-7])$')
+
+# A PLC signal of an actuator: e.g. ('MAIN.iCyl1minus', '%IX0.0', 'cylinders', 'minus', 0).
+Signal = collections.namedtuple('Signal', 'symbol address kind field index')
+# A member of the analog struct: e.g. ('iCyl1position', 'cylinders', 'position', 0, 'INT', 150.0),
+# the PLC value is the value of the engine times scale.
+AnalogChannel = collections.namedtuple('AnalogChannel', 'member kind field index type scale')
+
+# How the PLC notifies a change of its outputs: transmission 'on_change' (checked every cycle_time
+# seconds, 0 = every PLC cycle) or 'cyclic' (sent every cycle_time seconds), and the seconds the PLC
+# may collect the notifications before it sends them (max_delay).
+NotificationConfig = collections.namedtuple('NotificationConfig', 'transmission max_delay cycle_time')
+TRANSMISSIONS = ('on_change', 'cyclic')
+DEFAULT_NOTIFICATION = NotificationConfig('on_change', 0.0, 0.0)
+
+def notification_config(entry, default=DEFAULT_NOTIFICATION):
+    """ Return the NotificationConfig of 'notification' settings of a layout, missing ones are taken from default. """
+    if not entry:
+        return default
+    unknown = set(entry) - set(NotificationConfig._fields)
+    if unknown:
+        raise ValueError('Unknown notification settings: ' + ', '.join(sorted(unknown)))
+    config = default._replace(**entry)
+    if config.transmission not in TRANSMISSIONS:
+        raise ValueError('Unknown notification transmission: ' + str(config.transmission))
+    if config.max_delay < 0 or config.cycle_time < 0:
+        raise ValueError('The notification max_delay and cycle_time must not be negative.')
+    return config
+
+def parse_address(address):
+    """ Split a bit address such as '%IX1.3' into (area, byte, bit). """
+    match = ADDRESS_PATTERN.match(address.strip().upper())
+    if match is None:
+        raise ValueError('Invalid bit address: ' + address)
+    return match.group(1), int(match.group(2)), int(match.group(3))
+
+class Layout(object):
+    """ A plant layout compiled into dispatch tables. """
+
+    def __init__(self, data):
+        self.cylinders = list(data.get('cylinders', []))
+        self.motors = list(data.get('motors', []))
+        # Notification settings of the output image and of single outputs (by symbol), as in the file.
+        self.notification = data.get('notification')
+        self.output_notifications = {}
+        notification_config(self.notification)
+        # Signals in the order of the layout.
+        self.inputs = []
+        self.outputs = []
+        # Dispatch tables: symbol -> Signal and (byte, bit) -> Signal.
+        self.input_by_symbol = {}
+        self.output_by_symbol = {}
+        self.input_by_bit = {}
+        self.output_by_bit = {}
+        for kind, fields in ACTUATOR_SIGNALS.items():
+            for index, actuator in enumerate(getattr(self, kind)):
+                for field in fields['inputs']:
+                    self.add_signal(kind, field, index, actuator['inputs'][field], 'I',
+                                    self.inputs, self.input_by_symbol, self.input_by_bit)
+                for field in fields['outputs']:
+                    self.add_signal(kind, field, index, actuator['outputs'][field], 'Q',
+                                    self.outputs, self.output_by_symbol, self.output_by_bit)
+        # Symbol of the PLC struct of the analog values and its members in order, None and [] without one.
+        analog = data.get('analog') or {}
+        self.analog_symbol = analog.get('symbol')
+        self.analog = [self.analog_channel(entry) for entry in analog.get('channels', [])]
+        if self.analog and not self.analog_symbol:
+            raise ValueError('The analog channels need the symbol of their struct.')
+        members = [channel.member for channel in self.analog]
+        if len(set(members)) != len(members):
+            raise ValueError('Duplicate analog members: ' + ', '.join(sorted(set(
+                member for member in members if members.count(member) > 1))))
+
+    def add_signal(self, kind, field, index, entry, area, signals, by_symbol, by_bit):
+        """ Add a signal to the dispatch tables, checking for duplicates. """
+        signal = Signal(entry['symbol'], entry['address'], kind, field, index)
+        signal_area, byte, bit = parse_address(signal.address)
+        if signal_area != area:
+            raise ValueError('%s must be in the %%%s area: %s' % (signal.symbol, area, signal.address))
+        if signal.symbol in by_symbol:
+            raise ValueError('Duplicate symbol: ' + signal.symbol)
+        if (byte, bit) in by_bit:
+            raise ValueError('Duplicate address: ' + signal.address)
+        signals.append(signal)
+        by_symbol[signal.symbol] = signal
+        by_bit[(byte, bit)] = signal
+        if area == 'Q' and 'notification' in entry:
+            notification_config(entry['notification'])
+            self.output_notifications[signal.symbol] = entry['notification']
+
+    def analog_channel(self, entry):
+        """ Return the AnalogChannel of an entry of the analog channels, whose actuator is given by its name. """
+        matches = [(kind, index) for kind in ANALOG_VALUES for index, actuator in enumerate(getattr(self, kind))
+                   if actuator.get('name') == entry['actuator']]
+        if len(matches) != 1:
+            raise ValueError('%s actuator of the analog channel %s: %s' % (
+                'Ambiguous' if matches else 'Unknown', entry['member'], entry['actuator']))
+        kind, index = matches[0]
+        if entry['value'] not in ANALOG_VALUES[kind]:
+            raise ValueError('The %s have no analog value %s.' % (kind, entry['value']))
+        channel_type = entry.get('type', 'REAL')
+        if channel_type not in ANALOG_TYPES:
+            raise ValueError('Unknown type of the analog channel %s: %s' % (entry['member'], channel_type))
+        return AnalogChannel(entry['member'], kind, entry['value'], index, channel_type,
+                             float(entry.get('scale', 1.0)))
+
+    def input_signals(self):
+        """ Return the (symbol, address) pairs of the PLC inputs. """
+        return [(signal.symbol, signal.address) for signal in self.inputs]
+
+    def output_signals(self):
+        """ Return the (symbol, address) pairs of the PLC outputs. """
+        return [(signal.symbol, signal.address) for signal in self.outputs]
+
+    def notification_configs(self, default=DEFAULT_NOTIFICATION):
+        """ Return the NotificationConfig of the output image and those of the outputs which have settings of
+        their own {symbol: NotificationConfig}: the settings of the layout over default.
+        """
+        image = notification_config(self.notification, default)
+        return image, {symbol: notification_config(entry, image) for symbol, entry in self.output_notifications.items()}
+
+def load_layout(path=None):
+    """ Load and compile a layout file, by default layouts/default.json. """
+    with open(path or DEFAULT_LAYOUT) as file:
+        return Layout(json.load(file))
+
+def generate_layout(cylinders, motors):
+    """ Generate a layout of any size, the signals are packed bit by bit. """
+    data = {'cylinders': [], 'motors': []}
+    bits = {'I': 0, 'Q': 0}
+    def entry(area, symbol):
+        address = '%%%sX%d.%d' % (area, bits[area] // 8, bits[area] % 8)
+        bits[area] += 1
+        return {'symbol': symbol, 'address': address}
+    for number in range(1, cylinders + 1):
+        data['cylinders'].append({
+            'name': 'Cylinder %d' % number,
+            'inputs': {'minus': entry('I', 'MAIN.iCyl%dminus' % number),
+                       'plus': entry('I', 'MAIN.iCyl%dplus' % number)},
+            'outputs': {'to_minus': entry('Q', 'MAIN.qCyl%dtoMinus' % number),
+                        'to_plus': entry('Q', 'MAIN.qCyl%dtoPlus' % number)},
+        })
+    for number in range(1, motors + 1):
+        data['motors'].append({
+            'name': 'Motor %d' % number,
+            'inputs': {'running': entry('I', 'MAIN.iMot%drunning' % number)},
+            'outputs': {'start': entry('Q', 'MAIN.qMot%dstart' % number)},
+        })
+    return Layout(data)
@@ -0,0 +1,192 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Advance the simulation in lockstep with the PLC task, exactly one PLC cycle per step.
+
+Lockstep drives a HeadlessSimulator by a cycle counter (UDINT) of the PLC
+instead of the wall clock. Whenever the counter has advanced, it reads the
+output image, applies the outputs at the start of the PLC cycle, advances
+the simulation to its end by the cycle time of the task and writes the
+inputs, which the PLC reads in its next cycle. The simulated time is the
+number of PLC cycles times the cycle time, so the sensors change in the
+same PLC cycle in every run, however loaded the machine is. The counter
+is read whenever its notification arrives, and every POLL_INTERVAL seconds
+in case one is lost.
+
+In 'handshake' mode the PLC waits for the simulation: the simulator writes
+the counter which it has caught up with into the acknowledge symbol, and
+the PLC runs its logic only while both are equal:
+
+    VAR_GLOBAL
+        nPlcCycle : UDINT; // cycles whose logic has run, read by the simulator
+        nSimCycle : UDINT; // cycles which the simulation has caught up with, written by the simulator
+    END_VAR
+
+    IF nSimCycle = nPlcCycle THEN
+        Logic();
+        nPlcCycle := nPlcCycle + 1;
+    END_IF
+
+Both sides then run as fast as they can compute, a mock PLC (mock_plc.py)
+starts its next cycle as soon as the simulator has acknowledged one. In
+'follow' mode the simulator follows the cycle counter of the task (the
+PLC needs no changes and does not wait): when it falls behind, the outputs
+of the last PLC cycle are applied at its start and the cycles in between
+are skipped. PyQt5 is not imported.
+"""
+
+# Standard library
+import threading
+import time
+# Additional imports
+import pyads
+# Local imports
+import settings
+from engine import TIME_EPSILON
+from process_image import ADSIGRP_IOIMAGE_RWOB
+
+MODES = ('handshake', 'follow')
+# Task information of TwinCAT by task number, e.g. TASK_INFO % 1 + '.CycleCount'. CycleTime is in 100 ns units.
+TASK_INFO = 'TwinCAT_SystemInfoVarList._TaskInfo[%d]'
+# Seconds between two reads of the counter while no notification arrives.
+POLL_INTERVAL = 0.01
+# Seconds step() waits for the next PLC cycle, e.g. while the PLC is stopped at a breakpoint.
+WAIT_TIMEOUT = 1.0
+# The counters are UDINTs.
+COUNTER_RANGE = 1 << 32
+
+class Lockstep(object):
+    """ Step a HeadlessSimulator once per cycle of a PLC task, see the module docstring.
+
+    It is a subscriber of the simulator's ConnectionManager, which replaces
+    the output notifications: create it before simulator.connect().
+    """
+
+    def __init__(self, simulator, mode='handshake', task=settings.LOCKSTEP_TASK,
+                 counter=settings.LOCKSTEP_COUNTER, acknowledge=settings.LOCKSTEP_ACK):
+        if mode not in MODES:
+            raise ValueError('Unknown lockstep mode: %s' % mode)
+        self.simulator = simulator
+        self.mode = mode
+        if mode == 'handshake':
+            self.counter_symbol = counter
+            self.acknowledge_symbol = acknowledge
+        else:
+            self.counter_symbol = TASK_INFO % task + '.CycleCount'
+            self.acknowledge_symbol = None
+        self.cycle_time_symbol = TASK_INFO % task + '.CycleTime'
+        self.task_cycle_time = None # seconds, read from the PLC when subscribing
+        self.counter = None # counter of the PLC cycle which the simulation has caught up with
+        self.notified = threading.Event()
+        self.handles = []
+        # Counters.
+        self.cycles = 0 # PLC cycles simulated
+        self.skipped = 0 # PLC cycles which ran while the simulation was behind (follow mode)
+        self.timeouts = 0 # waits of WAIT_TIMEOUT in which the PLC did not run a cycle
+        simulator.lockstep = self
+
+    def subscribe(self):
+        """ Read the cycle time of the task and register the notification of the counter.
+
+        The next step starts from the counter which the PLC has then, e.g. again after a reconnect.
+        """
+        self.unsubscribe()
+        symbols = self.simulator.symbols
+        self.task_cycle_time = symbols.read(self.cycle_time_symbol, pyads.PLCTYPE_UDINT) * 1e-7
+        if self.task_cycle_time <= 0.0:
+            raise RuntimeError('The cycle time of the task is 0: ' + self.cycle_time_symbol)
+        self.counter = None
+
+        @self.simulator.connection.notification(pyads.PLCTYPE_UDINT)
+        def callback(handle, name, timestamp, value):
+            """ Executed when the PLC has run a cycle. """
+            self.notified.set()
+
+        # Checked at the end of every PLC cycle and sent at once.
+        attr = pyads.NotificationAttrib(4, max_delay=0.0, cycle_time=0.0)
+        self.handles = [symbols.add_notification(self.counter_symbol, attr, callback)]
+
+    def unsubscribe(self, delete=True):
+        """ Delete the notification, with delete=False it is only forgotten (the connection is lost). """
+        for handles in self.handles if delete else ():
+            self.simulator.symbols.del_notification(handles)
+        self.handles = []
+
+    def wait(self, timeout=WAIT_TIMEOUT):
+        """ Return the counter of the PLC once it differs from the one simulated, None after timeout seconds. """
+        simulator = self.simulator
+        deadline = time.monotonic() + timeout
+        while not simulator.stopping:
+            # Cleared before the read, so that a notification which arrives after it is not missed.
+            self.notified.clear()
+            if simulator.manager.check():
+                try:
+                    counter = simulator.symbols.read(self.counter_symbol, pyads.PLCTYPE_UDINT)
+                    if counter != self.counter:
+                        return counter
+                except pyads.pyads_ex.ADSError:
+                    simulator.manager.failed()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0.0:
+                break
+            self.notified.wait(min(POLL_INTERVAL, remaining))
+        return None
+
+    def step(self, timeout=WAIT_TIMEOUT):
+        """ Wait for the next PLC cycle and simulate it. Return False if the PLC has not run one within timeout. """
+        counter = self.wait(timeout)
+        if counter is None:
+            self.timeouts += 1
+            return False
+        simulator = self.simulator
+        if self.counter is None:
+            # The first cycle seen since subscribing, the simulation continues from it with its inputs written.
+            simulator.step(0.0)
+            self.counter = counter
+            self.acknowledge()
+            return True
+        cycles = (counter - self.counter) % COUNTER_RANGE
+        start = (self.cycles + cycles - 1) * self.task_cycle_time
+        if cycles > 1:
+            # The PLC has run several cycles meanwhile, the simulation catches up to the start of the last one.
+            simulator.step(max(0.0, start - simulator.engine.time))
+            self.skipped += cycles - 1
+        try:
+            data = simulator.connection.read(ADSIGRP_IOIMAGE_RWOB, simulator.output_image.offset,
+                                             pyads.PLCTYPE_BYTE * len(simulator.output_image))
+        except pyads.pyads_ex.ADSError:
+            simulator.manager.failed()
+            return False
+        simulator.output_subscriber.receive_image(bytes(data))
+        # The outputs take effect at the start of the PLC cycle, the inputs are those at its end.
+        simulator.step(0.0)
+        self.cycles += cycles
+        simulator.step(max(0.0, self.cycles * self.task_cycle_time - simulator.engine.time))
+        self.counter = counter
+        self.acknowledge()
+        return True
+
+    def acknowledge(self):
+        """ Let the PLC run its next cycle (handshake mode). """
+        if self.acknowledge_symbol is None:
+            return
+        try:
+            self.simulator.symbols.write(self.acknowledge_symbol, self.counter, pyads.PLCTYPE_UDINT)
+        except pyads.pyads_ex.ADSError:
+            self.simulator.manager.failed()
+
+    def run(self, duration=None):
+        """ Run for duration simulated seconds, or until interrupted or stopped. """
+        engine = self.simulator.engine
+        end = None if duration is None else engine.time + duration
+        while (end is None or engine.time < end - TIME_EPSILON) and not self.simulator.stopping:
+            self.step()
+
+    def statistics(self):
+        """ Return the mode, the cycle time of the task and the counters. """
+        return {
+            'mode': self.mode,
+            'task_cycle_time': self.task_cycle_time,
+            'cycles': self.cycles,
+            'skipped': self.skipped,
+            'timeouts': self.timeouts,
+        }
@@ -0,0 +1,447 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" An in-process PLC for running and measuring the simulator without TwinCAT.
+
+MockPLC holds the input and output image of a layout and runs a logic
+function in its own task cycle. MockConnection offers the part of
+pyads.Connection which the simulator uses, so it can be used wherever a
+pyads connection is expected. Like TwinCAT, the PLC checks a
+notification at the end of a task cycle, every cycle time of the
+notification: with the on-change transmission it is sampled if it has
+changed (several changes between two checks are coalesced into one), with
+the cyclic transmission always. The samples are collected for max delay
+seconds and then handed to the router, a thread which executes the
+callbacks. Its queue is bounded like the one of the ADS router, the samples
+which do not fit are dropped. The PLC has the task information of TwinCAT
+and the handshake of lockstep.py: once the simulator has acknowledged a
+cycle, the logic runs only in the cycles in which the acknowledge equals
+the counter, and the task runs its next cycle as soon as the simulator has
+acknowledged one, without waiting for its cycle time.
+"""
+
+# Standard library
+import collections
+import ctypes
+import importlib
+import itertools
+import queue
+import struct
+import threading
+import time
+# Additional imports
+import pyads
+from pyads.structs import SAdsNotificationHeader
+# Local imports
+import settings
+from latency import FILETIME_EPOCH
+from layout import load_layout, parse_address
+from lockstep import COUNTER_RANGE, TASK_INFO
+from process_image import ADSIGRP_IOIMAGE_RWIB, ADSIGRP_IOIMAGE_RWOB, AnalogImage
+from symbol_cache import ADSIGRP_SYM_TABLE, ADSIGRP_SYM_VALBYHND, Symbol
+
+# Default task cycle of the mock PLC in seconds.
+TASK_CYCLE_TIME = 0.01
+# Samples which wait for the router to execute their callbacks, further ones are dropped.
+ROUTER_QUEUE_SIZE = 1000
+
+# A registered notification, max_delay and cycle_time in seconds.
+Notification = collections.namedtuple('Notification',
+                                      'index_group index_offset length callback data trans_mode max_delay cycle_time')
+
+def default_logic(plc):
+    """ Move every cylinder back and forth between its end positions and start the
+    motor of the same row whenever the cylinder is in the plus position. """
+    for cylinder, motor in itertools.zip_longest(plc.layout.cylinders, plc.layout.motors):
+        if cylinder is None:
+            continue
+        inputs, outputs = cylinder['inputs'], cylinder['outputs']
+        if plc.get(inputs['minus']['symbol']):
+            plc.set(outputs['to_minus']['symbol'], False)
+            plc.set(outputs['to_plus']['symbol'], True)
+        elif plc.get(inputs['plus']['symbol']):
+            plc.set(outputs['to_plus']['symbol'], False)
+            plc.set(outputs['to_minus']['symbol'], True)
+        if motor is not None:
+            plc.set(motor['outputs']['start']['symbol'], plc.get(inputs['plus']['symbol']))
+
+def load_logic(spec):
+    """ Return the logic function of a 'module:function' spec, None for the default logic. """
+    if not spec:
+        return default_logic
+    module, _, function = spec.partition(':')
+    return getattr(importlib.import_module(module), function or 'logic')
+
+class MockPLC(object):
+    """ The process image of a layout and a task which runs the logic every cycle_time seconds.
+
+    The logic is a function which receives the MockPLC and uses get() and
+    set() to read the inputs and write the outputs, and get_analog() to read
+    the members of the analog struct of the layout.
+    """
+
+    def __init__(self, layout=None, logic=default_logic, cycle_time=TASK_CYCLE_TIME,
+                 counter=settings.LOCKSTEP_COUNTER, acknowledge=settings.LOCKSTEP_ACK):
+        self.layout = load_layout() if layout is None else layout
+        self.logic = logic
+        self.cycle_time = cycle_time
+        # Process images by index group, each covers the bytes 0 to the highest address.
+        self.areas = {}
+        # Symbol -> (index group, byte, mask).
+        self.bits = {}
+        for index_group, signals in ((ADSIGRP_IOIMAGE_RWIB, self.layout.input_signals()),
+                                     (ADSIGRP_IOIMAGE_RWOB, self.layout.output_signals())):
+            size = 0
+            for name, address in signals:
+                _, byte, bit = parse_address(address)
+                self.bits[name] = (index_group, byte, 1 << bit)
+                size = max(size, byte + 1)
+            self.areas[index_group] = bytearray(size)
+        # Every symbol also has an address of its own in the symbol table.
+        self.symbols = [Symbol(name, ADSIGRP_SYM_TABLE, offset) for offset, name in enumerate(self.bits)]
+        self.symbol_by_offset = {symbol.index_offset: symbol.name for symbol in self.symbols}
+        # So do the variables which are not BOOL signals: offset in the symbol table -> bytes.
+        self.variables = {}
+        # The struct of the analog values, if the layout has one.
+        self.analog = AnalogImage(self.layout.analog) if self.layout.analog else None
+        if self.analog is not None:
+            self.add_variable(self.layout.analog_symbol, self.analog.data)
+        # The task information and the handshake counters, UDINTs.
+        self.cycle_count = self.add_variable(TASK_INFO % 1 + '.CycleCount', bytearray(4))
+        cycle_time_variable = self.add_variable(TASK_INFO % 1 + '.CycleTime', bytearray(4))
+        struct.pack_into('<I', cycle_time_variable, 0, int(round(cycle_time * 1e7)))
+        self.plc_cycle = self.add_variable(counter, bytearray(4))
+        self.sim_cycle = self.add_variable(acknowledge, bytearray(4))
+        # True once the simulator has acknowledged a cycle, set() when it does.
+        self.handshake = False
+        self.acknowledged = threading.Event()
+        self.symbol_by_name = {symbol.name: symbol for symbol in self.symbols}
+        self.notifications = {}
+        self.sent = {} # notification handle -> data last sampled
+        self.next_sample = {} # notification handle -> time.monotonic() of the next check
+        self.batches = {} # notification handle -> (time.monotonic() when due, [(timestamp, data)])
+        self.handles = itertools.count(1)
+        self.lock = threading.RLock()
+        self.cycles = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.router = queue.Queue(ROUTER_QUEUE_SIZE)
+        self.router_thread = None
+        # Counters.
+        self.output_changes = 0 # changes of output bits made by the logic
+        self.samples = 0 # notification samples taken
+        self.sampled_changes = 0 # changed bits in the samples, those of the first sample of a notification excluded
+        self.dropped = 0 # samples dropped because the router queue was full
+        self.delivered = 0 # samples whose callback has been executed
+
+    def get(self, name):
+        """ Return the value of a BOOL symbol. """
+        index_group, byte, mask = self.bits[name]
+        return bool(self.areas[index_group][byte] & mask)
+
+    def set(self, name, value):
+        """ Set the value of a BOOL symbol. """
+        index_group, byte, mask = self.bits[name]
+        area = self.areas[index_group]
+        if index_group == ADSIGRP_IOIMAGE_RWOB and bool(area[byte] & mask) != bool(value):
+            self.output_changes += 1
+        if value:
+            area[byte] |= mask
+        else:
+            area[byte] &= ~mask
+
+    def add_variable(self, name, data):
+        """ Add a symbol whose value is the bytearray data, return data. """
+        offset = len(self.symbols)
+        self.symbols.append(Symbol(name, ADSIGRP_SYM_TABLE, offset))
+        self.variables[offset] = data
+        return data
+
+    def variable(self, index_group, index_offset, length):
+        """ Return the bytes of the variable at the address, None if there is none of at least length bytes. """
+        if index_group != ADSIGRP_SYM_TABLE:
+            return None
+        data = self.variables.get(index_offset)
+        return data if data is not None and length <= len(data) else None
+
+    def get_analog(self, member):
+        """ Return the value of a member of the analog struct. """
+        return self.analog.to_dict()[member]
+
+    def read(self, index_group, index_offset, length):
+        """ Return length bytes at the address. """
+        with self.lock:
+            if index_group == ADSIGRP_SYM_TABLE and index_offset in self.symbol_by_offset:
+                return bytes([self.get(self.symbol_by_offset[index_offset])])
+            variable = self.variable(index_group, index_offset, length)
+            if variable is not None:
+                return bytes(variable[:length])
+            if index_group in self.areas and index_offset + length <= len(self.areas[index_group]):
+                return bytes(self.areas[index_group][index_offset:index_offset + length])
+        raise pyads.pyads_ex.ADSError(text='Invalid address: 0x%X/%d' % (index_group, index_offset))
+
+    def write(self, index_group, index_offset, data):
+        """ Write the bytes to the address. """
+        with self.lock:
+            if index_group == ADSIGRP_SYM_TABLE and index_offset in self.symbol_by_offset:
+                self.set(self.symbol_by_offset[index_offset], data[0])
+                return
+            variable = self.variable(index_group, index_offset, len(data))
+            if variable is not None:
+                variable[:len(data)] = data
+                if variable is self.sim_cycle:
+                    self.acknowledge()
+                return
+            if index_group in self.areas and index_offset + len(data) <= len(self.areas[index_group]):
+                self.areas[index_group][index_offset:index_offset + len(data)] = data
+                return
+        raise pyads.pyads_ex.ADSError(text='Invalid address: 0x%X/%d' % (index_group, index_offset))
+
+    def add_notification(self, index_group, index_offset, length, callback, data,
+                         trans_mode=pyads.ADSTRANS_SERVERONCHA, max_delay=0.0, cycle_time=0.0):
+        """ Register a notification, the callback receives (pointer to the header, data). """
+        with self.lock:
+            handle = next(self.handles)
+            self.notifications[handle] = Notification(index_group, index_offset, length, callback, data,
+                                                      trans_mode, max_delay, cycle_time)
+        return handle
+
+    def del_notification(self, handle):
+        with self.lock:
+            self.notifications.pop(handle, None)
+            self.sent.pop(handle, None)
+            self.next_sample.pop(handle, None)
+            self.batches.pop(handle, None)
+
+    def notify(self, now=None):
+        """ Sample the notifications which are due and send the samples whose max delay has elapsed.
+
+        now is the time.monotonic() of the check, or a simulated time when
+        the caller runs the task cycles itself.
+        """
+        now = time.monotonic() if now is None else now
+        timestamp = int((time.time() + FILETIME_EPOCH) * 10000000)
+        with self.lock:
+            pending = []
+            for handle, notification in self.notifications.items():
+                if now >= self.next_sample.get(handle, 0.0):
+                    self.sample(handle, notification, now, timestamp)
+                due, samples = self.batches.get(handle, (None, None))
+                if samples and now >= due:
+                    del self.batches[handle]
+                    pending.extend((handle, sample_timestamp, data) for sample_timestamp, data in samples)
+        for sample in pending:
+            self.route(sample)
+
+    def sample(self, handle, notification, now, timestamp):
+        """ Sample a notification if its transmission asks for it, the sample is added to its batch. """
+        # On the grid of the cycle time, a late check does not delay the following ones.
+        self.next_sample[handle] = max(self.next_sample.get(handle, now) + notification.cycle_time, now)
+        try:
+            data = self.read(notification.index_group, notification.index_offset, notification.length)
+        except pyads.pyads_ex.ADSError:
+            return # e.g. the symbol version, which the mock PLC does not have
+        previous = self.sent.get(handle)
+        if previous == data and notification.trans_mode != pyads.ADSTRANS_SERVERCYCLE:
+            return
+        if previous is not None:
+            self.sampled_changes += sum(bin(old ^ new).count('1') for old, new in zip(previous, data))
+        self.sent[handle] = data
+        self.samples += 1
+        due, samples = self.batches.setdefault(handle, (now + notification.max_delay, []))
+        samples.append((timestamp, data))
+
+    def route(self, sample):
+        """ Queue a (handle, timestamp, data) sample for the router, which is bypassed while the task is stopped. """
+        if self.router_thread is None:
+            self.deliver(*sample)
+            return
+        try:
+            self.router.put_nowait(sample)
+        except queue.Full:
+            self.dropped += 1
+
+    def deliver(self, handle, timestamp, data):
+        """ Execute the callback of a sample, unless its notification has been deleted meanwhile. """
+        with self.lock:
+            notification = self.notifications.get(handle)
+        if notification is None:
+            return
+        # The callback is executed without the lock, it may access the PLC.
+        notification.callback(notification_header(handle, timestamp, data), notification.data)
+        self.delivered += 1
+
+    def run_router(self):
+        """ Execute the callbacks of the queued samples until None is queued. """
+        while True:
+            sample = self.router.get()
+            if sample is None:
+                return
+            self.deliver(*sample)
+
+    def statistics(self):
+        """ Return the counters of the output changes and of the notification samples. """
+        return {
+            'output_changes': self.output_changes,
+            'samples': self.samples,
+            'sampled_changes': self.sampled_changes,
+            'dropped': self.dropped,
+            'delivered': self.delivered,
+            'router_depth': self.router.qsize(),
+        }
+
+    def acknowledge(self):
+        """ Executed when the simulator has written the acknowledge counter. """
+        if not self.handshake:
+            # The first acknowledge starts the handshake, as if the PLC had waited for it.
+            self.handshake = True
+            self.plc_cycle[:] = self.sim_cycle
+        self.acknowledged.set()
+
+    def cycle(self, now=None):
+        """ Run the logic once (unless it waits for the handshake) and send the notifications, see notify() for now. """
+        with self.lock:
+            if not self.handshake or self.plc_cycle == self.sim_cycle:
+                self.logic(self)
+                counter = struct.unpack_from('<I', self.plc_cycle)[0]
+                struct.pack_into('<I', self.plc_cycle, 0, (counter + 1) % COUNTER_RANGE)
+            self.cycles += 1
+            struct.pack_into('<I', self.cycle_count, 0, self.cycles % COUNTER_RANGE)
+        self.notify(now)
+
+    def start(self):
+        """ Run the task in a thread of its own. """
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.router_thread = threading.Thread(target=self.run_router, name='MockRouter', daemon=True)
+        self.router_thread.start()
+        self.thread = threading.Thread(target=self.run, name='MockPLC', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        deadline = time.perf_counter()
+        while not self.stop_event.is_set():
+            self.acknowledged.clear()
+            self.cycle()
+            if self.handshake:
+                # The next cycle runs as soon as the simulator has acknowledged this one.
+                self.acknowledged.wait(self.cycle_time)
+                deadline = time.perf_counter()
+                continue
+            deadline += self.cycle_time
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                self.stop_event.wait(delay)
+            else:
+                deadline = time.perf_counter()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.router_thread is not None:
+            # The samples in the queue are delivered first.
+            self.router.put(None)
+            self.router_thread.join()
+            self.router_thread = None
+
+def notification_header(handle, timestamp, data):
+    """ Return a pointer to a notification header followed by the data, as pyads passes it to callbacks. """
+    size = max(ctypes.sizeof(SAdsNotificationHeader), SAdsNotificationHeader.data.offset + len(data))
+    # The header refers to the buffer and the pointer to the header, so the buffer lives as long as the pointer.
+    header = SAdsNotificationHeader.from_buffer(ctypes.create_string_buffer(size))
+    header.hNotification = handle
+    header.nTimeStamp = timestamp
+    header.cbSampleSize = len(data)
+    ctypes.memmove(ctypes.addressof(header) + SAdsNotificationHeader.data.offset, data, len(data))
+    return ctypes.pointer(header)
+
+class MockConnection(object):
+    """ A connection to a MockPLC with the interface of pyads.Connection. """
+    # The decorator and the parser of pyads only use the notification itself.
+    notification = pyads.Connection.notification
+    parse_notification = pyads.Connection.parse_notification
+
+    def __init__(self, plc):
+        self.plc = plc
+        self.is_open = False
+        self.handles = {} # handle -> name
+        self.notifications = set() # notification handles of this connection
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        # Like closing the ADS port, which deletes the notifications of the port.
+        for handle in self.notifications:
+            self.plc.del_notification(handle)
+        self.notifications = set()
+        self.is_open = False
+
+    def read_state(self):
+        return pyads.ADSSTATE_RUN, 0
+
+    def address(self, name):
+        """ Return the (index group, index offset) of a symbol name. """
+        if name not in self.plc.symbol_by_name:
+            raise pyads.pyads_ex.ADSError(text='Symbol not found: ' + name)
+        symbol = self.plc.symbol_by_name[name]
+        return symbol.index_group, symbol.index_offset
+
+    def get_all_symbols(self):
+        return list(self.plc.symbols)
+
+    def get_handle(self, name):
+        # The handle is the offset of the symbol in the symbol table.
+        return self.address(name)[1]
+
+    def release_handle(self, handle):
+        pass
+
+    def read(self, index_group, index_offset, plc_datatype):
+        if index_group == ADSIGRP_SYM_VALBYHND:
+            index_group = ADSIGRP_SYM_TABLE
+        data = self.plc.read(index_group, index_offset, ctypes.sizeof(plc_datatype))
+        value = plc_datatype.from_buffer_copy(data)
+        return list(value) if isinstance(value, ctypes.Array) else value.value
+
+    def write(self, index_group, index_offset, value, plc_datatype):
+        if index_group == ADSIGRP_SYM_VALBYHND:
+            index_group = ADSIGRP_SYM_TABLE
+        if issubclass(plc_datatype, ctypes.Array):
+            data = bytes(plc_datatype(*value))
+        else:
+            data = bytes(plc_datatype(value))
+        self.plc.write(index_group, index_offset, data)
+
+    def read_by_name(self, name, plc_datatype):
+        return self.read(*self.address(name), plc_datatype)
+
+    def write_by_name(self, name, value, plc_datatype):
+        self.write(*self.address(name), value, plc_datatype)
+
+    def write_list_by_name(self, values):
+        with self.plc.lock:
+            for name, value in values.items():
+                self.plc.set(name, value)
+        return {name: 'no error' for name in values}
+
+    def add_device_notification(self, data, attr, callback, user_handle=None):
+        """ Register a notification on a symbol name or an (index group, index offset). """
+        if isinstance(data, str):
+            index_group, index_offset = self.address(data)
+            user_handle = index_offset
+        else:
+            index_group, index_offset = data
+            if index_group == ADSIGRP_SYM_VALBYHND:
+                index_group = ADSIGRP_SYM_TABLE
+        # NotificationAttrib holds the times in 100 ns units.
+        handle = self.plc.add_notification(index_group, index_offset, attr.length, callback, data,
+                                           attr.trans_mode, attr.max_delay * 1e-7, attr.cycle_time * 1e-7)
+        self.notifications.add(handle)
+        return handle, user_handle
+
+    def del_device_notification(self, notification_handle, user_handle):
+        self.notifications.discard(notification_handle)
+        self.plc.del_notification(notification_handle)
@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" A window which shows the cycle and latency statistics of all stations of a stations file. """
+
+# Standard library
+import sys
+# Additional imports
+from PyQt5 import QtCore, QtGui, QtWidgets
+# Local imports
+from stations import COLUMNS, REPORT_INTERVAL, StationPool, load_stations
+
+class OverviewWindow(QtWidgets.QMainWindow):
+    """ One row per station, updated whenever reports arrive. """
+
+    def __init__(self, pool):
+        super().__init__()
+        self.pool = pool
+        self.setWindowIcon(QtGui.QIcon('icon.png'))
+        self.setWindowTitle('Simulator - %d stations' % len(pool.stations))
+        self.table = QtWidgets.QTableWidget(len(pool.stations), len(COLUMNS), self)
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.verticalHeader().hide()
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.setCentralWidget(self.table)
+        self.update_table()
+        self.table.resizeColumnsToContents()
+        self.resize(min(self.table.horizontalHeader().length() + 20, 1200),
+                    min(self.table.verticalHeader().length() + 60, 800))
+        # The reports are taken without blocking the event loop.
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.update_table)
+        self.timer.start(round(REPORT_INTERVAL * 1000 / 2))
+
+    def update_table(self):
+        """ Show the latest report of every station. """
+        self.pool.poll()
+        for row, cells in enumerate(self.pool.rows()):
+            for column, text in enumerate(cells):
+                item = self.table.item(row, column)
+                if item is None:
+                    item = QtWidgets.QTableWidgetItem()
+                    if column >= 3:
+                        item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+                    self.table.setItem(row, column, item)
+                if item.text() != text:
+                    item.setText(text)
+
+def main(args):
+    """ Entry point of 'simulator.py --stations FILE'. """
+    stations = load_stations(args.stations, args)
+    time_scale = 1.0 if args.time_scale is None else args.time_scale
+    pool = StationPool(stations, args.duration, time_scale)
+    pool.start()
+    app = QtWidgets.QApplication(sys.argv[:1])
+    window = OverviewWindow(pool)
+    app.aboutToQuit.connect(pool.stop)
+    window.show()
+    return app.exec_()
@@ -0,0 +1,462 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Standard library
+import collections
+import time
+# Additional imports
+import numpy as np
+import pyads
+# Local imports
+from latency import filetime_to_seconds
+from layout import DEFAULT_NOTIFICATION, parse_address
+
+# ADS index groups of the PLC process image.
+ADSIGRP_IOIMAGE_RWIB = 0xF020 # input area (%I), offset means byte offset
+ADSIGRP_IOIMAGE_RWOB = 0xF030 # output area (%Q), offset means byte offset
+
+# pyads type, NumPy type and range of the PLC data types of the analog channels.
+ANALOG_TYPES = {
+    'INT': (pyads.PLCTYPE_INT, '<i2', -2 ** 15, 2 ** 15 - 1),
+    'DINT': (pyads.PLCTYPE_DINT, '<i4', -2 ** 31, 2 ** 31 - 1),
+    'REAL': (pyads.PLCTYPE_REAL, '<f4', -np.inf, np.inf),
+}
+
+# ADS transmission modes of the NotificationConfig transmissions.
+TRANSMISSION_MODES = {'on_change': pyads.ADSTRANS_SERVERONCHA, 'cyclic': pyads.ADSTRANS_SERVERCYCLE}
+
+def notification_attrib(length, config):
+    """ Return the pyads NotificationAttrib of a NotificationConfig, pyads takes the times in milliseconds. """
+    return pyads.NotificationAttrib(length, TRANSMISSION_MODES[config.transmission],
+                                    config.max_delay * 1000, config.cycle_time * 1000)
+
+class ProcessImage(object):
+    """ BOOL variables packed into their %IX/%QX byte and bit layout. """
+
+    def __init__(self, signals):
+        # Signals are (name, address) pairs which must share the same area.
+        addresses = [(name, parse_address(address)) for name, address in signals]
+        areas = set(area for _, (area, _, _) in addresses)
+        if len(areas) != 1:
+            raise ValueError('All signals must be in the same area.')
+        self.area = areas.pop()
+        # The image covers the bytes from the lowest to the highest address.
+        self.offset = min(byte for _, (_, byte, _) in addresses)
+        size = max(byte for _, (_, byte, _) in addresses) - self.offset + 1
+        self.data = bytearray(size)
+        # Byte index (relative to the offset) and bit mask of each signal.
+        self.bits = {}
+        # Signals of each byte: [(name, mask), ...].
+        self.signals_by_byte = [[] for _ in range(size)]
+        # Bits of each byte which belong to a signal, the others may be mapped by another program.
+        self.mask = bytearray(size)
+        for name, (_, byte, bit) in addresses:
+            self.bits[name] = (byte - self.offset, 1 << bit)
+            self.signals_by_byte[byte - self.offset].append((name, 1 << bit))
+            self.mask[byte - self.offset] |= 1 << bit
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, name):
+        """ Return the value of the signal. """
+        index, mask = self.bits[name]
+        return bool(self.data[index] & mask)
+
+    def set(self, name, value):
+        """ Set the value of the signal. """
+        index, mask = self.bits[name]
+        if value:
+            self.data[index] |= mask
+        else:
+            self.data[index] &= ~mask
+
+    def update(self, values):
+        """ Set the values of several signals at once. """
+        for name, value in values.items():
+            self.set(name, value)
+
+    def merge(self, data, start=0):
+        """ Take the bits which belong to no signal from data, e.g. the bytes read from the PLC, from byte start on. """
+        for index, (mask, byte) in enumerate(zip(self.mask[start:], data), start):
+            self.data[index] = (self.data[index] & mask) | (byte & ~mask & 0xFF)
+
+    def changed(self, previous):
+        """ Return the names of the signals which differ from the previous image. """
+        names = []
+        for index, (byte, previous_byte) in enumerate(zip(self.data, previous)):
+            flipped = byte ^ previous_byte
+            if flipped:
+                names.extend(name for name, mask in self.signals_by_byte[index] if flipped & mask)
+        return names
+
+    def to_dict(self):
+        """ Return the values of all signals by name. """
+        return {name: self.get(name) for name in self.bits}
+
+class AnalogImage(object):
+    """ The analog channels of a layout packed into the bytes of their PLC struct.
+
+    The members follow each other without padding, as pyads packs structures,
+    so the struct needs {attribute 'pack_mode' := '1'} in the PLC.
+    """
+
+    def __init__(self, channels):
+        self.channels = list(channels)
+        self.dtype = np.dtype([(channel.member, ANALOG_TYPES[channel.type][1]) for channel in self.channels])
+        self.data = bytearray(self.dtype.itemsize)
+        self.scale = np.array([channel.scale for channel in self.channels])
+        self.low = np.array([ANALOG_TYPES[channel.type][2] for channel in self.channels], dtype=float)
+        self.high = np.array([ANALOG_TYPES[channel.type][3] for channel in self.channels], dtype=float)
+        self.integer = np.array([channel.type != 'REAL' for channel in self.channels])
+        # The values are gathered from the engine's arrays by (kind, field): [(kind, field, indices, members)].
+        groups = collections.OrderedDict()
+        for member, channel in enumerate(self.channels):
+            groups.setdefault((channel.kind, channel.field), []).append((channel.index, member))
+        self.groups = [(kind, field, np.array([index for index, _ in group], dtype=np.intp),
+                        np.array([member for _, member in group], dtype=np.intp))
+                       for (kind, field), group in groups.items()]
+
+    def __len__(self):
+        return len(self.data)
+
+    def structure_def(self):
+        """ Return the pyads structure definition of the struct, e.g. for read_structure_by_name. """
+        return tuple((channel.member, ANALOG_TYPES[channel.type][0], 1) for channel in self.channels)
+
+    def pack(self, engine):
+        """ Return the struct bytes of the analog values of a SimulationEngine, scaled and limited to their types. """
+        values = np.empty(len(self.channels))
+        for kind, field, indices, members in self.groups:
+            values[members] = getattr(getattr(engine, kind), field)[indices]
+        values = np.clip(values * self.scale, self.low, self.high)
+        values[self.integer] = np.round(values[self.integer])
+        return np.array(tuple(values.tolist()), dtype=self.dtype).tobytes()
+
+    def to_dict(self, data=None):
+        """ Return the members of the struct bytes (default: the image) by name. """
+        record = np.frombuffer(self.data if data is None else data, dtype=self.dtype)[0]
+        return {name: record[name].item() for name in self.dtype.names}
+
+class ProcessImageWriter(object):
+    """ Write the whole process image to the PLC in one ADS request. """
+    # 'image' writes the raw bytes to the I/O area, 'sum' uses an ADS
+    # sum-write and 'symbol' writes every variable by name (one by one).
+    # 'image' writes whole bytes: the bits of the written bytes which belong
+    # to no signal are read from the PLC right before every write (one more
+    # request, only if the written bytes have such bits) and written back as read.
+    MODES = ('image', 'sum', 'symbol')
+
+    def __init__(self, connection, image, mode='image', symbols=None):
+        if mode not in self.MODES:
+            raise ValueError('Unknown write mode: ' + mode)
+        self.connection = connection
+        self.image = image
+        self.mode = mode
+        # Optional SymbolCache used by the 'symbol' mode.
+        self.symbols = symbols
+        self.index_group = ADSIGRP_IOIMAGE_RWIB if image.area == 'I' else ADSIGRP_IOIMAGE_RWOB
+        # Number of write calls issued to the connection.
+        self.writes = 0
+
+    def write(self, names=None):
+        """ Write the current image to the PLC, or only the bytes/variables of the named signals. """
+        if self.mode == 'image':
+            start, end = 0, len(self.image)
+            if names:
+                indexes = [self.image.bits[name][0] for name in names]
+                start, end = min(indexes), max(indexes) + 1
+            if any(mask != 0xFF for mask in self.image.mask[start:end]):
+                # Other programs may map the remaining bits of these bytes, they are written as the PLC has them.
+                current = self.connection.read(self.index_group, self.image.offset + start,
+                                               pyads.PLCTYPE_BYTE * (end - start))
+                self.image.merge(current, start)
+            data = list(self.image.data[start:end])
+            self.connection.write(self.index_group, self.image.offset + start,
+                                  data, pyads.PLCTYPE_BYTE * len(data))
+            self.writes += 1
+            return
+        values = self.image.to_dict()
+        if names:
+            values = {name: values[name] for name in names}
+        if self.mode == 'sum':
+            self.connection.write_list_by_name(values)
+            self.writes += 1
+        else:
+            for name, value in values.items():
+                if self.symbols is not None:
+                    self.symbols.write(name, value, pyads.PLCTYPE_BOOL)
+                else:
+                    self.connection.write_by_name(name, value, pyads.PLCTYPE_BOOL)
+                self.writes += 1
+
+class AnalogWriter(object):
+    """ Write the struct of an AnalogImage to the PLC in one ADS request.
+
+    The struct is written by its address in the symbol table, like
+    write_structure_by_name with a handle, but the handle is not needed.
+    """
+
+    def __init__(self, connection, image, symbol, symbols=None):
+        self.connection = connection
+        self.image = image
+        self.symbol = symbol
+        # Optional SymbolCache which resolves the symbol once.
+        self.symbols = symbols
+        self.writes = 0
+
+    def write(self):
+        """ Write the current image to the PLC. """
+        data = list(self.image.data)
+        plc_datatype = pyads.PLCTYPE_BYTE * len(data)
+        if self.symbols is not None:
+            self.symbols.write(self.symbol, data, plc_datatype)
+        else:
+            self.connection.write_by_name(self.symbol, data, plc_datatype)
+        self.writes += 1
+
+class InputPublisher(object):
+    """ Write the inputs to the PLC only when they change, at the moment they change.
+
+    An unchanged image is written again after keep_alive seconds (0 disables
+    the refresh), e.g. in case the PLC has been restarted in the meantime.
+    The optional AnalogWriter writes the struct of the analog values in the
+    same way, so a publish() takes at most one request for the bits and one
+    for the analog values, however many channels there are.
+    """
+
+    def __init__(self, writer, keep_alive=0.0, latency=None, analog_writer=None):
+        self.writer = writer
+        self.image = writer.image
+        self.keep_alive = keep_alive
+        # Optional LatencyMonitor which receives the sensor to write latencies.
+        self.latency = latency
+        self.analog_writer = analog_writer
+        # The images as last written to the PLC, None before the first write.
+        self.published = None
+        self.analog_published = None
+        self.last_write = 0.0
+        # Counters.
+        self.writes = 0 # writes of changed bits
+        self.analog_writes = 0 # writes of changed analog values
+        self.refreshes = 0 # keep-alive writes
+        self.writes_avoided = 0 # cycles in which nothing had to be written
+        self.latency_count = 0
+        self.latency_total = 0.0 # seconds from the sensor change to the completed write
+        self.latency_max = 0.0
+
+    def publish(self, values, changed_at=None, analog=None):
+        """ Update the image and write the changed bits. Return True if something was written.
+
+        changed_at is the time.monotonic() of the sensor change, it is used
+        for the latency statistics. analog are the bytes of the analog
+        struct, which is written if they have changed.
+        """
+        self.image.update(values)
+        analog_changed = False
+        if self.analog_writer is not None:
+            if analog is not None:
+                self.analog_writer.image.data[:] = analog
+            analog_changed = self.analog_writer.image.data != self.analog_published
+        if self.published is not None and self.image.data == self.published:
+            if analog_changed:
+                self.write_analog()
+            return analog_changed
+        names = None if self.published is None else self.image.changed(self.published)
+        self.writer.write(names)
+        self.last_write = time.monotonic()
+        self.published = bytes(self.image.data)
+        self.writes += 1
+        if changed_at is not None:
+            latency = self.last_write - changed_at
+            self.latency_count += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            if self.latency is not None:
+                self.latency.add('sensor_to_write', latency)
+        if analog_changed:
+            self.write_analog()
+        return True
+
+    def write_analog(self):
+        """ Write the analog struct. """
+        self.analog_writer.write()
+        self.last_write = time.monotonic()
+        self.analog_published = bytes(self.analog_writer.image.data)
+        self.analog_writes += 1
+
+    def refresh(self):
+        """ Called once per cycle: write the whole image again if the keep-alive period has elapsed. """
+        if self.published is None:
+            return False
+        if self.keep_alive and time.monotonic() - self.last_write >= self.keep_alive:
+            self.writer.write()
+            # The write may have taken bits of other programs from the PLC, they are no change of the inputs.
+            self.published = bytes(self.image.data)
+            if self.analog_writer is not None:
+                self.analog_writer.write()
+            self.last_write = time.monotonic()
+            self.refreshes += 1
+            return True
+        self.writes_avoided += 1
+        return False
+
+    def statistics(self):
+        """ Return the counters. """
+        mean = self.latency_total / self.latency_count if self.latency_count else 0.0
+        return {
+            'writes': self.writes,
+            'analog_writes': self.analog_writes,
+            'refreshes': self.refreshes,
+            'writes_avoided': self.writes_avoided,
+            'latency_mean': mean,
+            'latency_max': self.latency_max,
+        }
+
+class OutputSubscriber(object):
+    """ Receive the PLC outputs as change-sets {name: value}.
+
+    The callback is executed in the ADS thread with the change-set and the
+    time.perf_counter() at which the notification was received.
+
+    'image' registers a single notification on the byte range of the output
+    image. The PLC checks it once per PLC cycle, so all outputs which changed
+    in the same cycle arrive in one notification and are decoded in one go.
+    'symbol' registers one notification per variable, every change arrives
+    on its own.
+
+    config is the NotificationConfig (transmission, max delay and cycle
+    time) of the notifications, configs {name: NotificationConfig} those of
+    single variables in 'symbol' mode. The 'image' notification covers all
+    outputs, so it only uses config. Unchanged values, which the 'cyclic'
+    transmission sends every cycle time, are not dispatched.
+    """
+    MODES = ('image', 'symbol')
+
+    def __init__(self, connection, image, callback, mode='image', symbols=None, latency=None, recorder=None,
+                 config=DEFAULT_NOTIFICATION, configs=None):
+        if mode not in self.MODES:
+            raise ValueError('Unknown notification mode: ' + mode)
+        self.connection = connection
+        self.image = image
+        self.callback = callback
+        self.mode = mode
+        # Optional SymbolCache used by the 'symbol' mode.
+        self.symbols = symbols
+        # Optional LatencyMonitor which receives the PLC timestamps.
+        self.latency = latency
+        # Optional Recorder which appends the change-sets to a log file.
+        self.recorder = recorder
+        self.config = config
+        self.configs = configs or {}
+        self.index_group = ADSIGRP_IOIMAGE_RWIB if image.area == 'I' else ADSIGRP_IOIMAGE_RWOB
+        self.handles = []
+        # The image as last received, None before the first notification.
+        self.received = None
+        # The variables with the 'cyclic' transmission and those of them received at least once, in 'symbol' mode.
+        self.cyclic = set()
+        self.known = set()
+        # Counters.
+        self.notifications = 0
+        self.changes = 0
+        self.busy = 0.0 # seconds spent decoding and dispatching
+        self.first = None # time.perf_counter() of the first and the last notification
+        self.last = None
+
+    def subscribe(self):
+        """ Register the notifications, deleting those of a previous call. """
+        self.unsubscribe()
+        self.received = None
+        self.known = set()
+        self.cyclic = {name for name in self.image.bits if self.configs.get(name, self.config).transmission == 'cyclic'}
+        if self.mode == 'image':
+            @self.connection.notification(timestamp_as_filetime=True)
+            def callback(handle, name, timestamp, value):
+                """ Executed when at least one output has changed in the PLC cycle. """
+                self.receive_image(value, timestamp)
+
+            attr = notification_attrib(len(self.image), self.config)
+            self.handles = [self.connection.add_device_notification(
+                (self.index_group, self.image.offset), attr, callback)]
+        else:
+            @self.connection.notification(pyads.PLCTYPE_BOOL, timestamp_as_filetime=True)
+            def callback(handle, name, timestamp, value):
+                """ Executed when the variable changes its state. """
+                self.receive_signal(name, value, timestamp)
+
+            add_notification = self.connection.add_device_notification
+            if self.symbols is not None:
+                add_notification = self.symbols.add_notification
+            self.handles = [add_notification(name, notification_attrib(1, self.configs.get(name, self.config)),
+                                             callback) for name in self.image.bits]
+
+    def unsubscribe(self, delete=True):
+        """ Delete the notifications, with delete=False they are only forgotten (the connection is lost). """
+        for handles in self.handles if delete else ():
+            if self.mode == 'symbol' and self.symbols is not None:
+                self.symbols.del_notification(handles)
+                continue
+            try:
+                self.connection.del_device_notification(*handles)
+            except pyads.pyads_ex.ADSError:
+                pass # already gone, e.g. after a re-download
+        self.handles = []
+
+    def receive_image(self, data, timestamp=None):
+        """ Decode all bits of the received image and dispatch the changed ones.
+
+        timestamp is the PLC time of the notification as FILETIME.
+        """
+        start = time.perf_counter()
+        if self.latency is not None and timestamp is not None:
+            self.latency.received(filetime_to_seconds(timestamp))
+        self.image.data[:] = data[:len(self.image)]
+        if self.received is None:
+            names = list(self.image.bits)
+        else:
+            names = self.image.changed(self.received)
+        self.received = bytes(self.image.data)
+        changes = {name: self.image.get(name) for name in names}
+        if changes:
+            if self.recorder is not None:
+                self.recorder.record(changes, timestamp)
+            self.callback(changes, start)
+        self.count(start, len(changes))
+
+    def receive_signal(self, name, value, timestamp=None):
+        """ Dispatch the change of a single variable. """
+        start = time.perf_counter()
+        if self.latency is not None and timestamp is not None:
+            self.latency.received(filetime_to_seconds(timestamp))
+        if name in self.cyclic:
+            if name in self.known and self.image.get(name) == bool(value):
+                self.count(start, 0)
+                return
+            self.known.add(name)
+        self.image.set(name, value)
+        if self.recorder is not None:
+            self.recorder.record({name: value}, timestamp)
+        self.callback({name: value}, start)
+        self.count(start, 1)
+
+    def count(self, start, changes):
+        """ Update the counters after a notification received at start. """
+        now = time.perf_counter()
+        if self.first is None:
+            self.first = start
+        self.last = now
+        self.notifications += 1
+        self.changes += changes
+        self.busy += now - start
+
+    def statistics(self):
+        """ Return the counters, changes per second (received and handled). """
+        elapsed = self.last - self.first if self.notifications else 0.0
+        return {
+            'notifications': self.notifications,
+            'changes': self.changes,
+            # Changes received per wall-clock second.
+            'changes_per_second': self.changes / elapsed if elapsed else 0.0,
+            # Changes which can be handled per second of processing time.
+            'capacity': self.changes / self.busy if self.busy else 0.0,
+        }
@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Find out where the time of the simulator goes: slot timing, event loop lag and a sampling profiler.
+
+SlotMonitor times the slots of the Qt event loop (or any other function)
+into histograms, and a heartbeat which is due every interval seconds
+records how late it runs: the event loop lag, i.e. how long the loop was
+blocked by a slot, by drawing or by anything else. Timing a slot costs two
+clock reads and a histogram update.
+
+SamplingProfiler takes the stacks of all threads every SAMPLE_INTERVAL
+seconds in a thread of its own, so it sees where the threads are, also
+while they wait for an ADS call. It writes the samples as a pstats file
+(python -m pstats, snakeviz; the calls are samples) or as collapsed stacks
+(flamegraph.pl, speedscope). While it is stopped, no thread runs and
+nothing is sampled. PyQt5 is not imported.
+"""
+
+# Standard library
+import collections
+import functools
+import marshal
+import os
+import signal
+import sys
+import threading
+import time
+# Local imports
+from latency import Histogram
+
+# Seconds between two beats of the event loop heartbeat.
+HEARTBEAT_INTERVAL = 0.1
+# Seconds between two samples of the profiler.
+SAMPLE_INTERVAL = 0.005
+# Dump of the profiler when none is given.
+DEFAULT_PROFILE = 'simulator.prof'
+# Extensions of the dumps which are written as collapsed stacks, the others are pstats files.
+COLLAPSED_EXTENSIONS = ('.folded', '.txt')
+
+class SlotMonitor(object):
+    """ Histograms of the durations of the slots and of the event loop lag. """
+
+    def __init__(self, interval=HEARTBEAT_INTERVAL):
+        self.interval = interval
+        # Slot name -> Histogram of its durations, in the order in which the slots were timed first.
+        self.histograms = collections.OrderedDict()
+        self.lag = Histogram()
+        self.next_beat = None # time.perf_counter() at which the heartbeat is due
+
+    def timed(self, name, function):
+        """ Return a function which executes function and adds its duration to the histogram of name. """
+        histogram = self.histograms.setdefault(name, Histogram())
+        @functools.wraps(function)
+        def slot(*args):
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                histogram.add(time.perf_counter() - start)
+        return slot
+
+    def beat(self):
+        """ Executed by the heartbeat every interval seconds: add how late it runs. """
+        now = time.perf_counter()
+        if self.next_beat is not None:
+            self.lag.add(now - self.next_beat)
+        self.next_beat = now + self.interval
+
+    def summary(self):
+        """ Return the summaries of the slots and of the event loop lag ('event_loop_lag'). """
+        summary = collections.OrderedDict((name, histogram.summary()) for name, histogram in self.histograms.items())
+        summary['event_loop_lag'] = self.lag.summary()
+        return summary
+
+def function_key(code):
+    """ Return the pstats key of a code object: (file, first line, name). """
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+class SamplingProfiler(object):
+    """ Sample the stacks of all threads while it runs, count the samples of every distinct stack. """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        # (thread name, ((file, line, name) from the outermost frame to the innermost)) -> samples.
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.elapsed = 0.0 # seconds sampled
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    @property
+    def period(self):
+        """ The measured seconds per sample, which are more than interval when the sampler has to wait for the GIL. """
+        return self.elapsed / self.samples if self.samples else self.interval
+
+    def start(self):
+        """ Start sampling, the samples of a previous run are discarded. """
+        if self.thread is not None:
+            return
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='Profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """ Stop sampling, the samples are kept for write(). """
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+    def toggle(self, path=None):
+        """ Start the profiler, or stop it and write its samples to path (default: DEFAULT_PROFILE).
+
+        Return the path written, None if the profiler has been started.
+        """
+        if not self.running:
+            self.start()
+            return None
+        self.stop()
+        path = path or DEFAULT_PROFILE
+        self.write(path)
+        return path
+
+    def run(self):
+        own = threading.get_ident()
+        start = time.perf_counter()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(function_key(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                self.stacks[(names.get(ident, str(ident)), tuple(stack))] += 1
+            self.samples += 1
+            self.elapsed = time.perf_counter() - start
+
+    def pstats(self):
+        """ Return the samples as the statistics dict of pstats: function -> (cc, nc, tt, ct, callers).
+
+        A sample of a stack counts as a call of every function on it, which
+        takes period seconds; the innermost function spends them itself.
+        """
+        stats = {}
+        period = self.period
+        for (_, stack), count in self.stacks.items():
+            seconds = count * period
+            seen = set()
+            for depth, function in enumerate(stack):
+                entry = stats.setdefault(function, [0, 0, 0.0, 0.0, {}])
+                innermost = depth == len(stack) - 1
+                if function not in seen:
+                    # A recursive function is counted once per sample.
+                    seen.add(function)
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += seconds
+                if innermost:
+                    entry[2] += seconds
+                if depth:
+                    caller = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                    caller[0] += count
+                    caller[1] += count
+                    caller[2] += seconds if innermost else 0.0
+                    caller[3] += seconds
+        return {function: (cc, nc, tt, ct, {caller: tuple(values) for caller, values in callers.items()})
+                for function, (cc, nc, tt, ct, callers) in stats.items()}
+
+    def collapsed(self):
+        """ Return the samples as collapsed stacks: 'thread;outer (file:line);...;inner (file:line) samples'. """
+        lines = []
+        for (thread, stack), count in sorted(self.stacks.items()):
+            frames = ['%s (%s:%d)' % (name, os.path.basename(filename), line) for filename, line, name in stack]
+            lines.append('%s %d' % (';'.join([thread] + frames), count))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """ Write the samples as collapsed stacks (see COLLAPSED_EXTENSIONS) or as a pstats file. """
+        if os.path.splitext(path)[1] in COLLAPSED_EXTENSIONS:
+            with open(path, 'w') as file:
+                file.write(self.collapsed())
+        else:
+            with open(path, 'wb') as file:
+                marshal.dump(self.pstats(), file)
+
+def install_signal_handler(toggle):
+    """ Execute toggle() when the process receives SIGUSR1 (e.g. 'kill -USR1 <pid>'), not on Windows.
+
+    Return False if there is no such signal.
+    """
+    if not hasattr(signal, 'SIGUSR1'):
+        return False
+    signal.signal(signal.SIGUSR1, lambda number, frame: toggle())
+    return True
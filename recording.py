@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Record the PLC output stream to a binary log and replay it without a PLC.
+
+A log starts with a header (magic, length of the symbol list, symbol list
+as JSON) followed by fixed-size records (timestamp, symbol index, value):
+
+    <q  timestamp as FILETIME (100 ns ticks since 1601)
+    <H  index into the symbol list
+    B   value
+
+The file is only ever appended to and can be memory-mapped as a NumPy
+array of RECORD_DTYPE. A record which was cut off by a crash is ignored.
+"""
+
+# Standard library
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+# Additional imports
+import numpy as np
+# Local imports
+from engine import SimulationEngine
+from latency import FILETIME_EPOCH
+from layout import load_layout
+
+MAGIC = b'SIMREC01'
+HEADER = struct.Struct('<8sI')
+RECORD = struct.Struct('<qHB')
+RECORD_DTYPE = np.dtype([('time', '<i8'), ('symbol', '<u2'), ('value', 'u1')])
+
+# FILETIME ticks per second.
+TICKS = 10000000
+# Records which are converted to Python objects at once during the replay.
+CHUNK = 65536
+
+def now_as_filetime():
+    """ Return the current time as FILETIME. """
+    return int((time.time() + FILETIME_EPOCH) * TICKS)
+
+class Recorder(object):
+    """ Append change-sets {symbol: value} to a log file. """
+
+    def __init__(self, path, symbols):
+        self.path = path
+        self.symbols = list(symbols)
+        self.index = {symbol: index for index, symbol in enumerate(self.symbols)}
+        self.lock = threading.Lock()
+        self.records = 0
+        if os.path.exists(path) and os.path.getsize(path):
+            # Append to an existing log of the same symbols.
+            existing, offset = read_header(path)
+            if existing != self.symbols:
+                raise ValueError('%s was recorded with other symbols.' % path)
+            self.file = open(path, 'ab')
+            # Drop a record which was cut off, so that the records stay aligned.
+            size = os.path.getsize(path)
+            self.file.truncate(size - (size - offset) % RECORD.size)
+        else:
+            self.file = open(path, 'wb')
+            data = json.dumps(self.symbols).encode()
+            self.file.write(HEADER.pack(MAGIC, len(data)) + data)
+
+    def record(self, changes, timestamp=None):
+        """ Append the change-set, timestamp is a FILETIME (default: now). """
+        if timestamp is None:
+            timestamp = now_as_filetime()
+        data = b''.join(RECORD.pack(timestamp, self.index[symbol], bool(value))
+                        for symbol, value in changes.items() if symbol in self.index)
+        with self.lock:
+            self.file.write(data)
+            self.records += len(data) // RECORD.size
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def read_header(path):
+    """ Return (symbols, size of the header) of a log file. """
+    with open(path, 'rb') as file:
+        magic, length = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError('%s is not a recording.' % path)
+        return json.loads(file.read(length).decode()), HEADER.size + length
+
+class Recording(object):
+    """ A memory-mapped log file: symbols and records (a NumPy array of RECORD_DTYPE). """
+
+    def __init__(self, path):
+        self.path = path
+        self.symbols, offset = read_header(path)
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        count = (len(self.map) - offset) // RECORD_DTYPE.itemsize
+        self.records = np.frombuffer(self.map, RECORD_DTYPE, count, offset)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        """ Yield (timestamp, {symbol: value}) change-sets in the order of the log.
+
+        A change-set ends where the timestamp changes or a symbol repeats.
+        """
+        changes = {}
+        current = None
+        for start in range(0, len(self.records), CHUNK):
+            for timestamp, symbol, value in self.records[start:start + CHUNK].tolist():
+                name = self.symbols[symbol]
+                if changes and (timestamp != current or name in changes):
+                    yield current, changes
+                    changes = {}
+                current = timestamp
+                changes[name] = bool(value)
+        if changes:
+            yield current, changes
+
+    def close(self):
+        self.records = None
+        self.map.close()
+
+def replay(recording, layout, cycle_time, time_scale=0.0, settle=None, trace=None):
+    """ Feed a recorded output stream into the simulation and return the input trace.
+
+    The simulation is stepped in cycle_time steps, and exactly up to the
+    timestamp of every recorded change-set and of every sensor change. time_scale is the number of
+    simulated seconds per second, 0 runs as fast as possible. After the last
+    change-set the simulation runs for settle seconds (default: the longest
+    travel or ramp time), so that the actuators reach their end positions.
+    The input trace is a list of (simulated time, {symbol: value}), it is
+    also appended to the Recorder trace if one is given.
+    """
+    engine = SimulationEngine(layout)
+    if settle is None:
+        settle = max([0.0] + list(engine.cylinders.travel_time) + list(engine.motors.ramp_time))
+    inputs = engine.inputs()
+    result = [(0.0, dict(inputs))]
+    start = None
+    wall_start = time.perf_counter()
+
+    def record():
+        """ Record the input changes at the current simulated time. """
+        nonlocal inputs
+        current = engine.inputs()
+        changes = {name: value for name, value in current.items() if inputs[name] != value}
+        if changes:
+            result.append((engine.time, changes))
+            if trace is not None:
+                trace.record(changes, start + round(engine.time * TICKS))
+            inputs = current
+
+    def advance(until):
+        """ Step the simulation up to the simulated time until, recording the input changes. """
+        while engine.time < until:
+            event = engine.next_event()
+            if event is None or event > until:
+                event = until
+            # Up to the next sensor change at the latest, so that it is traced at its exact time.
+            engine.step(max(0.0, min(cycle_time, event - engine.time)))
+            record()
+            if time_scale:
+                delay = wall_start + engine.time / time_scale - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+    for timestamp, changes in recording:
+        if start is None:
+            start = timestamp
+            if trace is not None:
+                trace.record(inputs, start)
+        advance((timestamp - start) / TICKS)
+        for name, value in changes.items():
+            if name in engine.outputs:
+                engine.set_output(name, value)
+        # A cylinder leaves its end position at once.
+        record()
+    if start is not None:
+        advance(engine.time + settle)
+    return result
+
+def main(args):
+    """ Entry point of 'simulator.py --replay'. """
+    layout = load_layout(args.layout)
+    recording = Recording(args.replay)
+    trace = None
+    if args.trace:
+        trace = Recorder(args.trace, [name for name, _ in layout.input_signals()])
+    time_scale = 0.0 if args.time_scale is None else args.time_scale
+    start = time.perf_counter()
+    try:
+        result = replay(recording, layout, args.cycle_time, time_scale, trace=trace)
+    finally:
+        if trace is not None:
+            trace.close()
+    elapsed = time.perf_counter() - start
+    print('Replayed %d output changes in %.3f s, %d input changes.' % (
+        len(recording), elapsed, sum(len(changes) for _, changes in result[1:])))
+    if not args.trace:
+        for simulated, changes in result:
+            for name, value in sorted(changes.items()):
+                print('%10.3f %s %d' % (simulated, name, value))
+    recording.close()
@@ -0,0 +1,280 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Run scenario files, each in a worker process with a mock PLC of its own, and report which pass.
+
+A scenario scripts the PLC outputs and lists the sensor changes which the
+PLC has to see, in simulated seconds from the start of the scenario:
+
+    {"name": "Cylinder 1 out and back",
+     "initial": {"Motor 1": "running"},
+     "outputs": [{"time": 0.0, "set": {"MAIN.qCyl1toPlus": true}},
+                 {"time": 2.0, "set": {"MAIN.qCyl1toPlus": false, "MAIN.qCyl1toMinus": true}}],
+     "expect": [{"time": 0.0, "values": {"MAIN.iCyl1minus": false}},
+                {"time": 1.5, "values": {"MAIN.iCyl1plus": true}}],
+     "tolerance": 0.05}
+
+initial puts actuators into an end position, 'minus' or 'plus' for a
+cylinder and 'stopped' or 'running' for a motor; the others start at minus
+and stopped. The logic of the mock PLC sets the outputs at their times and
+records the inputs as it sees them: their values at the start and every
+change. An expected value passes when the input has changed to it (or had
+it at the start, for time 0) within tolerance seconds of its time. With
+"strict": true every change must be expected. A scenario runs for its
+duration, by default until SETTLE_TIME after the last output or expected
+value. It can also override the layout and the SETTING_KEYS, which default
+to the command line.
+
+Every scenario runs a HeadlessSimulator against a mock PLC of its own in a
+worker process. The task of the mock PLC is not started: the worker runs
+its cycles in lockstep with the simulation, every TASK_CYCLE_TIME simulated
+seconds, and the notifications and input writes take their usual way in
+between. So a scenario runs as fast as possible and its result does not
+depend on the load of the machine, which would delay a real-time run. The
+workers (by default one per CPU) are CPU-bound and take one scenario after
+the other. PyQt5 is not imported.
+"""
+
+# Standard library
+import concurrent.futures
+import glob
+import json
+import math
+import multiprocessing
+import os
+import time
+# Additional imports
+import pyads
+# Local imports
+import settings
+from mock_plc import TASK_CYCLE_TIME
+
+# Seconds within which an expected value has to be seen, unless the scenario sets its own tolerance.
+TOLERANCE = 0.05
+# Seconds a scenario runs beyond the tolerance after its last output or expected value.
+SETTLE_TIME = 0.5
+# Settings which a scenario can override, the defaults are taken from the command line.
+SETTING_KEYS = ('layout', 'cycle_time', 'keep_alive', 'notification_mode', 'notification_transmission',
+                'notification_max_delay', 'notification_cycle_time')
+SCENARIO_KEYS = ('name', 'initial', 'outputs', 'expect', 'tolerance', 'strict', 'duration') + SETTING_KEYS
+# End positions of the actuators for initial.
+INITIAL_POSITIONS = {'cylinders': {'minus': 0.0, 'plus': 1.0}, 'motors': {'stopped': 0.0, 'running': 1.0}}
+# Columns of the report.
+COLUMNS = ('Scenario', 'Result', 'Simulated (s)', 'Run (s)', 'Total (s)')
+
+def load_scenario(path, args):
+    """ Return a scenario file as a dict of all SCENARIO_KEYS and its path. Raise ValueError. """
+    with open(path) as file:
+        entry = json.load(file)
+    unknown = set(entry) - set(SCENARIO_KEYS)
+    if unknown:
+        raise ValueError('Unknown scenario settings in %s: %s' % (path, ', '.join(sorted(unknown))))
+    scenario = {key: entry.get(key, getattr(args, key)) for key in SETTING_KEYS}
+    scenario.update({
+        'name': entry.get('name', os.path.splitext(os.path.basename(path))[0]),
+        'path': path,
+        'initial': entry.get('initial', {}),
+        # [(time, {symbol: value}), ...] in time order.
+        'outputs': sorted(((step['time'], step['set']) for step in entry.get('outputs', [])),
+                          key=lambda step: step[0]),
+        # [(time, symbol, value), ...].
+        'expect': [(step['time'], name, bool(value))
+                   for step in entry.get('expect', []) for name, value in step['values'].items()],
+        'tolerance': entry.get('tolerance', TOLERANCE),
+        'strict': entry.get('strict', False),
+    })
+    times = [step[0] for step in scenario['outputs']] + [step[0] for step in scenario['expect']]
+    scenario['duration'] = entry.get('duration', max(times, default=0.0) + scenario['tolerance'] + SETTLE_TIME)
+    return scenario
+
+def load_scenarios(path, args):
+    """ Return the scenarios of a directory (its *.json files in name order) or of a single file. """
+    paths = sorted(glob.glob(os.path.join(path, '*.json'))) if os.path.isdir(path) else [path]
+    if not paths:
+        raise ValueError('No scenario files in ' + path)
+    return [load_scenario(path, args) for path in paths]
+
+class ScriptedLogic(object):
+    """ Logic of the mock PLC which sets the outputs of a scenario at their times and records the inputs.
+
+    time is the simulated time of the task cycle, set by the caller before
+    every cycle. timeline holds (time, symbol, value) of the inputs: their
+    values in the first cycle and every change.
+    """
+
+    def __init__(self, outputs, inputs):
+        self.outputs = outputs
+        self.inputs = inputs
+        self.time = 0.0
+        self.next = 0 # index of the next step of the outputs
+        self.values = {}
+        self.timeline = []
+
+    def __call__(self, plc):
+        now = self.time
+        first = not self.values
+        for name in self.inputs:
+            value = plc.get(name)
+            if first or self.values[name] != value:
+                self.values[name] = value
+                self.timeline.append((now, name, value))
+        while self.next < len(self.outputs) and self.outputs[self.next][0] <= now:
+            for name, value in self.outputs[self.next][1].items():
+                plc.set(name, value)
+            self.next += 1
+
+def set_initial_state(engine, layout, initial):
+    """ Put the actuators named in initial {name: end position} into their end positions. """
+    for kind in ('cylinders', 'motors'):
+        actuators = getattr(engine, kind)
+        for index, entry in enumerate(getattr(layout, kind)):
+            state = initial.get(entry.get('name'))
+            if state is None:
+                continue
+            if state not in INITIAL_POSITIONS[kind]:
+                raise ValueError('Unknown initial state of %s: %s' % (entry.get('name'), state))
+            actuators.position[index] = INITIAL_POSITIONS[kind][state]
+            if kind == 'cylinders':
+                actuators.minus[index] = state == 'minus'
+                actuators.plus[index] = state == 'plus'
+            else:
+                actuators.running[index] = state == 'running'
+    names = set(entry.get('name') for kind in ('cylinders', 'motors') for entry in getattr(layout, kind))
+    unknown = set(initial) - names
+    if unknown:
+        raise ValueError('Unknown actuators: ' + ', '.join(sorted(unknown)))
+
+def check_timeline(scenario, timeline):
+    """ Return the failures of a scenario's timeline as texts, none if it passed. """
+    tolerance = scenario['tolerance']
+    failures = []
+    matched = set()
+    for expected, name, value in scenario['expect']:
+        seen = [(abs(time - expected), position) for position, (time, symbol, state) in enumerate(timeline)
+                if symbol == name and state == value]
+        within = [position for distance, position in seen if distance <= tolerance]
+        if within:
+            matched.update(within)
+        elif seen:
+            position = min(seen)[1]
+            failures.append('%s = %d expected at %.3f s, seen at %.3f s' % (
+                name, value, expected, timeline[position][0]))
+        else:
+            failures.append('%s = %d expected at %.3f s, never seen' % (name, value, expected))
+    if scenario['strict']:
+        for position, (time, name, value) in enumerate(timeline):
+            if time > 0.0 and position not in matched:
+                failures.append('%s = %d at %.3f s not expected' % (name, value, time))
+    return failures
+
+def run_lockstep(simulator, plc, logic, duration, task_cycle=TASK_CYCLE_TIME):
+    """ Run the simulation and the cycles of the PLC alternately for duration simulated seconds. """
+    for cycle in range(int(math.ceil(duration / task_cycle)) + 1):
+        now = cycle * task_cycle
+        # The sensors which changed up to now are written before the PLC cycle reads them.
+        simulator.step(now - simulator.engine.time)
+        logic.time = now
+        # Without its task, the PLC delivers the notifications in the cycle.
+        plc.cycle(now)
+        # The outputs take effect at once, and the sensors which they change are written.
+        simulator.step(0.0)
+
+def run_scenario(scenario):
+    """ Entry point of a worker process: run a scenario against a mock PLC of its own, return the result. """
+    # Imported here, the parent process does not need the simulation.
+    import transport
+    from headless import HeadlessSimulator
+    from layout import NotificationConfig, load_layout
+    # Every worker is a process of its own, so the global settings are its own too.
+    settings.TRANSPORT = 'mock'
+    settings.LAYOUT = scenario['layout']
+    result = {'name': scenario['name'], 'path': scenario['path'], 'passed': False, 'failures': [], 'error': None,
+              'simulated': 0.0, 'run': 0.0}
+    try:
+        layout = load_layout(scenario['layout'])
+        outputs = set(name for name, _ in layout.output_signals())
+        inputs = [name for name, _ in layout.input_signals()]
+        unknown = (set(name for _, step in scenario['outputs'] for name in step) - outputs |
+                   set(name for _, name, _ in scenario['expect']) - set(inputs))
+        if unknown:
+            raise ValueError('Unknown symbols: ' + ', '.join(sorted(unknown)))
+        logic = ScriptedLogic(scenario['outputs'], inputs)
+        plc = transport.mock_plc(logic, start=False)
+        notification = NotificationConfig(scenario['notification_transmission'], scenario['notification_max_delay'],
+                                          scenario['notification_cycle_time'])
+        # As fast as possible, the time is simulated.
+        simulator = HeadlessSimulator(settings.AMS_NET_ID, settings.AMS_NET_PORT, layout, scenario['cycle_time'],
+                                      0.0, scenario['keep_alive'], scenario['notification_mode'], None, None,
+                                      notification, None)
+        set_initial_state(simulator.engine, layout, scenario['initial'])
+        simulator.connect()
+        try:
+            start = time.monotonic()
+            run_lockstep(simulator, plc, logic, scenario['duration'])
+            result['run'] = time.monotonic() - start
+            result['simulated'] = simulator.engine.time
+        finally:
+            simulator.close()
+    except (pyads.pyads_ex.ADSError, RuntimeError, OSError, ValueError) as error:
+        result['error'] = str(error)
+        return result
+    finally:
+        transport.shutdown()
+    result['failures'] = check_timeline(scenario, logic.timeline)
+    result['passed'] = not result['failures']
+    return result
+
+def run_scenarios(scenarios, workers=None):
+    """ Run the scenarios in worker processes (by default one per CPU), return their results in order.
+
+    total is the number of seconds from the start of the runner to the result.
+    """
+    # Spawned, like the stations, so that every worker starts clean.
+    context = multiprocessing.get_context('spawn')
+    results = [None] * len(scenarios)
+    start = time.monotonic()
+    workers = min(workers or os.cpu_count() or 1, len(scenarios))
+    with concurrent.futures.ProcessPoolExecutor(workers, mp_context=context) as executor:
+        futures = {executor.submit(run_scenario, scenario): index for index, scenario in enumerate(scenarios)}
+        for future in concurrent.futures.as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except Exception as error: # e.g. a worker process which died
+                scenario = scenarios[index]
+                result = {'name': scenario['name'], 'path': scenario['path'], 'passed': False, 'failures': [],
+                          'error': 'worker failed: %r' % error, 'simulated': 0.0, 'run': 0.0}
+            result['total'] = time.monotonic() - start
+            results[index] = result
+    return results
+
+def result_row(result):
+    """ Return the cells of a result (see COLUMNS) as strings. """
+    state = 'error' if result['error'] else 'pass' if result['passed'] else 'FAIL'
+    return [result['name'], state, '%.2f' % result['simulated'], '%.2f' % result['run'], '%.2f' % result['total']]
+
+def format_report(results):
+    """ Return the report table, the failures and errors and the summary as text. """
+    rows = [list(COLUMNS)] + [result_row(result) for result in results]
+    widths = [max(len(cell) for cell in column) for column in zip(*rows)]
+    lines = ['  '.join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows]
+    for result in results:
+        if result['error']:
+            lines.append('%s: error: %s' % (result['name'], result['error']))
+        for failure in result['failures']:
+            lines.append('%s: %s' % (result['name'], failure))
+    passed = sum(1 for result in results if result['passed'])
+    errors = sum(1 for result in results if result['error'])
+    lines.append('%d passed, %d failed, %d errors in %.2f s (slowest scenario %.2f s, all of them %.2f s).' % (
+        passed, len(results) - passed - errors, errors, max(result['total'] for result in results),
+        max(result['run'] for result in results), sum(result['run'] for result in results)))
+    return '\n'.join(lines)
+
+def main(args):
+    """ Entry point of 'simulator.py --scenarios DIR'. Return 0 if all scenarios passed, else 1. """
+    scenarios = load_scenarios(args.scenarios, args)
+    results = run_scenarios(scenarios, args.workers)
+    print(format_report(results))
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump(results, file, indent=4)
+    return 0 if all(result['passed'] for result in results) else 1
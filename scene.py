@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" The plant drawn as a QGraphicsScene, only the items whose state changed are updated.
+
+Every actuator is a QGraphicsPixmapItem sharing one QPixmap per image, and
+every PLC signal a QGraphicsSimpleTextItem. The scene keeps what it drew
+last (pixel positions, motor states, signal values) and compares the state
+of the simulation engine against it, so an unchanged item is never touched
+and Qt repaints only the regions of the items which were moved or changed.
+"""
+
+# Additional imports
+import numpy as np
+from PyQt5 import QtCore, QtWidgets
+
+# Default scene coordinates of the actuators, used when the layout has none.
+CYLINDER_X = 50
+MOTOR_X = 380
+FIRST_Y = 50
+ROW_HEIGHT = 150
+# Pixels between the cylinder's minus and plus position.
+CYLINDER_STROKE = 150
+# Pixels the motor moves to the right when it is running.
+MOTOR_SHIFT = 20
+# Indexes of the motor pixmaps.
+MOTOR_OFF, MOTOR_ON, MOTOR_TS = range(3)
+
+def signal_prefix(signal):
+    """ Return the text in front of the value of a PLC input/output: '%IX0.0' is shown as 'I0.0:'. """
+    address = signal['address']
+    return address[1] + address[3:] + ':'
+
+class PlantScene(QtWidgets.QGraphicsScene):
+    """ The cylinders, motors and PLC signals of a layout. """
+
+    def __init__(self, layout, cylinder, motor_pixmaps, font, parent=None):
+        super().__init__(parent)
+        # The items are moved every frame, an index of their positions would only cost time.
+        self.setItemIndexMethod(QtWidgets.QGraphicsScene.NoIndex)
+        self.font = font
+        self.motor_pixmaps = motor_pixmaps # off, on, transition state
+        self.cylinder_items = []
+        self.motor_items = []
+        # Text items of the PLC signals by symbol: [item, text prefix, value drawn].
+        self.signals = {}
+        # Values set since the last frame, several changes of a signal are drawn once.
+        self.pending = {}
+        cylinder_x, cylinder_y, strokes = [], [], []
+        for index, cylinder_layout in enumerate(layout.cylinders):
+            x = cylinder_layout.get('x', CYLINDER_X)
+            y = cylinder_layout.get('y', FIRST_Y + index * ROW_HEIGHT)
+            stroke = cylinder_layout.get('stroke', CYLINDER_STROKE)
+            self.add_title(cylinder_layout['name'], x + 40, y - 30)
+            self.cylinder_items.append(self.add_pixmap(cylinder, x, y))
+            cylinder_x.append(x)
+            cylinder_y.append(y)
+            strokes.append(stroke)
+            self.add_signal(cylinder_layout['inputs']['minus'], x, y + 50)
+            self.add_signal(cylinder_layout['inputs']['plus'], x + stroke, y + 50)
+            self.add_signal(cylinder_layout['outputs']['to_minus'], x, y + 70)
+            self.add_signal(cylinder_layout['outputs']['to_plus'], x + stroke, y + 70)
+        motor_x, motor_y = [], []
+        for index, motor_layout in enumerate(layout.motors):
+            x = motor_layout.get('x', MOTOR_X)
+            y = motor_layout.get('y', FIRST_Y + index * ROW_HEIGHT)
+            self.add_title(motor_layout['name'], x + 10, y - 30)
+            self.motor_items.append(self.add_pixmap(motor_pixmaps[MOTOR_OFF], x, y))
+            motor_x.append(x)
+            motor_y.append(y)
+            self.add_signal(motor_layout['inputs']['running'], x, y + 50)
+            self.add_signal(motor_layout['outputs']['start'], x, y + 70)
+        self.cylinder_x = np.array(cylinder_x, dtype=int)
+        self.cylinder_y = np.array(cylinder_y, dtype=int)
+        self.cylinder_stroke = np.array(strokes, dtype=float)
+        self.motor_x = np.array(motor_x, dtype=int)
+        self.motor_y = np.array(motor_y, dtype=int)
+        # Pixel offsets and motor states drawn last, all items are at offset 0 and off.
+        self.cylinder_offsets = np.zeros(len(cylinder_x), dtype=int)
+        self.motor_offsets = np.zeros(len(motor_x), dtype=int)
+        self.motor_states = np.full(len(motor_x), MOTOR_OFF)
+
+    def add_pixmap(self, pixmap, x, y):
+        """ Add an item showing the (shared) pixmap. """
+        item = self.addPixmap(pixmap)
+        item.setPos(x, y)
+        # Pixmaps are only moved, never scaled, so the fast transformation is exact.
+        item.setTransformationMode(QtCore.Qt.FastTransformation)
+        item.setCacheMode(QtWidgets.QGraphicsItem.DeviceCoordinateCache)
+        return item
+
+    def add_title(self, text, x, y):
+        """ Add the name of an actuator. """
+        item = self.addSimpleText(text, self.font)
+        item.setPos(x, y)
+
+    def add_signal(self, signal, x, y):
+        """ Add the value of a PLC input/output, it is drawn on the first update. """
+        prefix = signal_prefix(signal)
+        item = self.addSimpleText(prefix)
+        item.setPos(x, y)
+        self.signals[signal['symbol']] = [item, prefix, None]
+
+    def move_actuators(self, cylinder_positions, motor_positions):
+        """ Move the items of the actuators whose pixel position changed. """
+        offsets = np.rint(cylinder_positions * self.cylinder_stroke).astype(int)
+        for index in np.flatnonzero(offsets != self.cylinder_offsets).tolist():
+            self.cylinder_items[index].setPos(int(self.cylinder_x[index] + offsets[index]),
+                                              int(self.cylinder_y[index]))
+        self.cylinder_offsets = offsets
+        offsets = np.rint(motor_positions * MOTOR_SHIFT).astype(int)
+        for index in np.flatnonzero(offsets != self.motor_offsets).tolist():
+            self.motor_items[index].setPos(int(self.motor_x[index] + offsets[index]),
+                                           int(self.motor_y[index]))
+        self.motor_offsets = offsets
+
+    def set_motor_states(self, motor_positions):
+        """ Show the pixmap of the motor state (off, on, transition state) where it changed. """
+        states = np.full(len(motor_positions), MOTOR_TS)
+        states[motor_positions == 0.0] = MOTOR_OFF
+        states[motor_positions == 1.0] = MOTOR_ON
+        for index in np.flatnonzero(states != self.motor_states).tolist():
+            self.motor_items[index].setPixmap(self.motor_pixmaps[states[index]])
+        self.motor_states = states
+
+    def set_signal_values(self, values):
+        """ Set the values {symbol: value} of PLC signals, they are drawn by the next update_signals(). """
+        self.pending.update(values)
+
+    def update_signals(self):
+        """ Draw the signal values set since the last frame, only the changed texts are set. """
+        signals = self.signals
+        for symbol, value in self.pending.items():
+            signal = signals.get(symbol)
+            if signal is not None and signal[2] != value:
+                signal[0].setText(signal[1] + str(value))
+                signal[2] = value
+        self.pending = {}
+
+class PlantView(QtWidgets.QGraphicsView):
+    """ A view of a PlantScene which repaints the changed regions only. """
+
+    def __init__(self, scene, parent=None):
+        super().__init__(scene, parent)
+        self.setViewportUpdateMode(QtWidgets.QGraphicsView.SmartViewportUpdate)
+        self.setOptimizationFlags(QtWidgets.QGraphicsView.DontSavePainterState |
+                                  QtWidgets.QGraphicsView.DontAdjustForAntialiasing)
+        self.setCacheMode(QtWidgets.QGraphicsView.CacheBackground)
+        self.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop)
+        self.setFrameShape(QtWidgets.QFrame.NoFrame)
+        self.setBackgroundBrush(self.palette().window())
+        # The scene starts at the origin like the old tab, large plants are scrolled.
+        rect = scene.itemsBoundingRect()
+        self.setSceneRect(QtCore.QRectF(0, 0, rect.right() + MOTOR_SHIFT, rect.bottom()))
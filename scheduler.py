@@ -0,0 +1,159 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" A cycle scheduler which runs a function at absolute deadlines. """
+
+# Standard library
+import collections
+import math
+import threading
+import time
+
+# The shortest supported cycle time in seconds.
+MIN_CYCLE_TIME = 0.001
+# The last part of the wait (in seconds) is spent busy-waiting for precision.
+SPIN_TIME = 0.0002
+
+class JitterStatistics(object):
+    """ Lateness of the cycle starts over the last samples (fixed memory). """
+
+    def __init__(self, size=1000):
+        self.samples = collections.deque(maxlen=size)
+        self.count = 0
+
+    def add(self, lateness):
+        """ Add the lateness (seconds after the deadline) of a cycle start. """
+        self.samples.append(lateness)
+        self.count += 1
+
+    def clear(self):
+        self.samples.clear()
+        self.count = 0
+
+    def summary(self):
+        """ Return min/mean/p99/max of the samples in seconds. """
+        if not self.samples:
+            return {'min': 0.0, 'mean': 0.0, 'p99': 0.0, 'max': 0.0}
+        samples = sorted(self.samples)
+        p99 = samples[min(len(samples) - 1, int(math.ceil(0.99 * len(samples))) - 1)]
+        return {
+            'min': samples[0],
+            'mean': sum(samples) / len(samples),
+            'p99': p99,
+            'max': samples[-1],
+        }
+
+class CycleScheduler(object):
+    """ Call a function every cycle_time seconds.
+
+    The deadlines are absolute (start + n * cycle_time), so the period does
+    not drift with the execution time of the function. A cycle whose
+    function returns after the next deadline is an overrun; the missed
+    deadlines are skipped instead of being executed in a burst.
+
+    next_event, if given, returns the time.perf_counter() of the next event
+    (e.g. a sensor change) or None; the function is also executed at the
+    events between two deadlines, and at once when wake() is called.
+    """
+
+    def __init__(self, cycle_time, function, spin_time=SPIN_TIME, next_event=None):
+        self.check_cycle_time(cycle_time)
+        self.cycle_time = cycle_time
+        self.function = function
+        self.spin_time = spin_time
+        self.next_event = next_event
+        self.jitter = JitterStatistics()
+        self.cycles = 0
+        self.overruns = 0
+        self.events = 0 # executions between the deadlines
+        self.thread = None
+        self.stop_event = threading.Event()
+        # Set by stop() and wake(), ends the current wait.
+        self.wake_event = threading.Event()
+        self.reconfigured = False
+
+    @staticmethod
+    def check_cycle_time(cycle_time):
+        if cycle_time < MIN_CYCLE_TIME:
+            raise ValueError('The cycle time must be at least %g s.' % MIN_CYCLE_TIME)
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """ Run the scheduler in a thread of its own. """
+        if self.running:
+            return
+        self.stop_event.clear()
+        self.wake_event.clear()
+        self.thread = threading.Thread(target=self.run, name='CycleScheduler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """ Stop the scheduler after the current cycle. """
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+            self.thread = None
+
+    def set_cycle_time(self, cycle_time):
+        """ Change the cycle time, the next deadline is rescheduled from now. """
+        self.check_cycle_time(cycle_time)
+        self.cycle_time = cycle_time
+        self.reconfigured = True
+
+    def wake(self):
+        """ Execute the function as soon as possible, e.g. from another thread when new data has arrived. """
+        self.wake_event.set()
+
+    def wait_until(self, deadline):
+        """ Sleep until the deadline, return False if the scheduler was stopped or woken. """
+        delay = deadline - time.perf_counter() - self.spin_time
+        if delay > 0 and self.wake_event.wait(delay):
+            self.wake_event.clear()
+            return False
+        while time.perf_counter() < deadline:
+            pass
+        return not self.stop_event.is_set()
+
+    def wait(self, deadline):
+        """ Sleep until the deadline, executing the function at the events before it. Return False if stopped. """
+        while True:
+            event = self.next_event() if self.next_event is not None else None
+            until = event if event is not None and event < deadline else deadline
+            if self.wait_until(until) and until == deadline:
+                return True
+            if self.stop_event.is_set():
+                return False
+            self.function()
+            self.events += 1
+
+    def run(self):
+        """ Execute the cycles in the calling thread until stop() is called. """
+        self.jitter.clear()
+        deadline = time.perf_counter()
+        while not self.stop_event.is_set():
+            self.jitter.add(time.perf_counter() - deadline)
+            self.function()
+            self.cycles += 1
+            now = time.perf_counter()
+            if self.reconfigured:
+                self.reconfigured = False
+                self.jitter.clear()
+                deadline = now
+            deadline += self.cycle_time
+            if now > deadline:
+                # Overrun: skip the deadlines which have already passed.
+                self.overruns += 1
+                missed = math.ceil((now - deadline) / self.cycle_time)
+                deadline += missed * self.cycle_time
+            if not self.wait(deadline):
+                break
+
+    def statistics(self):
+        """ Return the cycle counters and the jitter statistics in seconds. """
+        statistics = {'cycle_time': self.cycle_time, 'cycles': self.cycles, 'overruns': self.overruns,
+                      'events': self.events}
+        statistics.update(('jitter_' + key, value) for key, value in self.jitter.summary().items())
+        return statistics
@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Settings shared by the user interface and the headless simulator. """
+
+# ADS configuration.
+AMS_NET_ID = '192.168.19.1.1.1'
+AMS_NET_PORT = 851
+# Connection to the PLC: 'ads' (TwinCAT), 'mock' (in-process mock PLC) or 'testserver' (local pyads test server).
+TRANSPORT = 'ads'
+# Logic of the mock PLC as 'module:function', None runs mock_plc.default_logic.
+PLC_LOGIC = None
+
+# Period (in seconds) in which the PLC inputs are written.
+CYCLE_TIME = 0.3
+# Maximum number of frames per second drawn by the user interface, independent of the cycle time.
+FRAME_RATE = 50
+# Seconds after which unchanged PLC inputs are written again, 0 disables the refresh.
+KEEP_ALIVE = 5.0
+
+# PLC output notifications: 'image' (one per PLC cycle for the whole %QB range) or 'symbol' (one per variable).
+NOTIFICATION_MODE = 'image'
+# Default transmission of the PLC output notifications: 'on_change' (checked every NOTIFICATION_CYCLE_TIME
+# seconds, 0 = every PLC cycle) or 'cyclic' (sent every NOTIFICATION_CYCLE_TIME seconds), and the seconds the
+# PLC may collect them before it sends them. A layout can override them, also per output.
+NOTIFICATION_TRANSMISSION = 'on_change'
+NOTIFICATION_MAX_DELAY = 0.0
+NOTIFICATION_CYCLE_TIME = 0.0
+
+# Prometheus export of the latency histograms: a file which is rewritten every
+# METRICS_INTERVAL seconds and/or a port of http://127.0.0.1:<port>/metrics, None disables.
+METRICS_FILE = None
+METRICS_PORT = None
+METRICS_INTERVAL = 5.0
+
+# Path of a log file to which the PLC outputs are recorded, None disables the recording.
+RECORD = None
+
+# Path of a file (e.g. in /dev/shm) into which the inputs, outputs and actuator positions are published for
+# other local processes (see shared_image.py), None disables it.
+SHARED_IMAGE = None
+
+# Path of the dump of the sampling profiler (see profiler.py), which then runs from the start; None starts it
+# only on demand, from the Settings tab or with SIGUSR1, and writes profiler.DEFAULT_PROFILE.
+PROFILE = None
+
+# Lockstep with the PLC (see lockstep.py): the task whose cycle time is the simulated time of a step, and the
+# handshake in which the PLC counts its cycles in LOCKSTEP_COUNTER and the simulator acknowledges them in
+# LOCKSTEP_ACK (UDINT symbols).
+LOCKSTEP_TASK = 1
+LOCKSTEP_COUNTER = 'MAIN.nPlcCycle'
+LOCKSTEP_ACK = 'MAIN.nSimCycle'
+
+# Bytes of the ring buffers of the trend recorder (see trend.py), which keeps the I/O changes and the actuator
+# positions for the Trend tab; when they are full, the oldest rows are overwritten.
+TREND_MEMORY = 64 * 1024 * 1024
+
+# Path of the plant layout file, None uses layouts/default.json.
+LAYOUT = None
+# Path of a stations file (several PLC targets, see stations.py), None simulates a single station.
+STATIONS = None
@@ -0,0 +1,208 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Publish the PLC inputs and outputs and the actuator positions in a memory-mapped file.
+
+Test harnesses and other HMIs on the same machine read the live state of
+the simulation from the file instead of opening connections to the PLC.
+The file has a fixed binary layout (little-endian), determined by the plant
+layout:
+
+    0   8s   magic b'SIMSHM01'
+    8   <Q   sequence, odd while the simulator writes
+    16  <d   simulated time in seconds
+    24  <d   wall-clock time of the write, time.time()
+    32  <I   file offset and <I size of the input image (%IB bytes from the lowest address)
+    40  <I   file offset and <I size of the output image (%QB bytes from the lowest address)
+    48  <I   number of cylinders and <I number of motors
+    56  <I   file offset and <I length of the metadata
+    64       input image, output image, then aligned to 8 bytes: cylinder
+             and motor positions as <f8 (0.0 = minus / stopped, 1.0 = plus /
+             full speed), then the metadata: JSON with the byte offsets of the
+             images in the PLC ('input_offset', 'output_offset'), the
+             (symbol, address) pairs of the inputs and outputs and the names
+             of the cylinders and motors.
+
+Only the sequence and the data behind it change. The sequence works as a
+seqlock: the writer makes it odd, writes the data and makes it even again,
+and a reader copies the data between two reads of an even sequence and
+retries if they differ (the stores to the map are not reordered on x86,
+on which this relies). The reader never blocks the simulator. A path in
+/dev/shm keeps the file in memory on Linux. PyQt5 is not imported.
+"""
+
+# Standard library
+import argparse
+import collections
+import json
+import mmap
+import struct
+import time
+# Additional imports
+import numpy as np
+# Local imports
+from process_image import ProcessImage
+
+MAGIC = b'SIMSHM01'
+HEADER = struct.Struct('<8sQddIIIIIIII')
+SEQUENCE = struct.Struct('<Q')
+SEQUENCE_OFFSET = 8
+# Seconds a reader tries to get a consistent copy before it gives up.
+READ_TIMEOUT = 1.0
+
+# A consistent copy of the shared image.
+Snapshot = collections.namedtuple('Snapshot', 'sequence time wall_time inputs outputs cylinders motors')
+
+class SharedImageWriter(object):
+    """ Create the file of a layout and write the state of a SimulationEngine into it. """
+
+    def __init__(self, path, layout):
+        self.path = path
+        input_image = ProcessImage(layout.input_signals())
+        output_image = ProcessImage(layout.output_signals())
+        input_size, output_size = len(input_image), len(output_image)
+        cylinders, motors = len(layout.cylinders), len(layout.motors)
+        metadata = json.dumps({
+            'input_offset': input_image.offset,
+            'output_offset': output_image.offset,
+            'inputs': layout.input_signals(),
+            'outputs': layout.output_signals(),
+            'cylinders': [cylinder.get('name', '') for cylinder in layout.cylinders],
+            'motors': [motor.get('name', '') for motor in layout.motors],
+        }).encode('utf-8')
+        self.input_start = HEADER.size
+        self.output_start = self.input_start + input_size
+        self.positions_start = -(-(self.output_start + output_size) // 8) * 8
+        metadata_start = self.positions_start + 8 * (cylinders + motors)
+        size = metadata_start + len(metadata)
+        with open(path, 'w+b') as file:
+            file.truncate(size)
+            self.map = mmap.mmap(file.fileno(), size)
+        self.map[:HEADER.size] = HEADER.pack(MAGIC, 0, 0.0, 0.0, self.input_start, input_size,
+                                             self.output_start, output_size, cylinders, motors,
+                                             metadata_start, len(metadata))
+        self.map[metadata_start:size] = metadata
+        self.sequence = 0
+        self.positions = np.frombuffer(self.map, dtype='<f8', count=cylinders + motors, offset=self.positions_start)
+        self.cylinders = cylinders
+        self.inputs = self.packer(layout.inputs, input_image)
+        self.outputs = self.packer(layout.outputs, output_image)
+        self.writes = 0
+
+    @staticmethod
+    def packer(signals, image):
+        """ Return (size, bytes, masks, [(kind, field, indices)]) which packs the values of the signals.
+
+        The values are gathered from the engine's arrays by (kind, field), and
+        one bincount of their masks by byte makes the image.
+        """
+        groups = collections.OrderedDict()
+        for signal in signals:
+            groups.setdefault((signal.kind, signal.field), []).append(signal)
+        ordered = [signal for group in groups.values() for signal in group]
+        byte = np.array([image.bits[signal.symbol][0] for signal in ordered], dtype=np.intp)
+        mask = np.array([image.bits[signal.symbol][1] for signal in ordered], dtype=float)
+        return len(image), byte, mask, [(kind, field, np.array([signal.index for signal in group], dtype=np.intp))
+                                        for (kind, field), group in groups.items()]
+
+    @staticmethod
+    def pack(engine, packer):
+        """ Return the image bytes of the signals of a packer. """
+        size, byte, mask, groups = packer
+        values = np.concatenate([getattr(getattr(engine, kind), field)[indices] for kind, field, indices in groups])
+        return np.bincount(byte, weights=values * mask, minlength=size).astype(np.uint8).tobytes()
+
+    def publish(self, engine):
+        """ Write the inputs, outputs and positions of the engine, readers see all of them or none. """
+        inputs = self.pack(engine, self.inputs)
+        outputs = self.pack(engine, self.outputs)
+        self.sequence += 1 # odd: being written
+        SEQUENCE.pack_into(self.map, SEQUENCE_OFFSET, self.sequence)
+        struct.pack_into('<dd', self.map, SEQUENCE_OFFSET + 8, engine.time, time.time())
+        self.map[self.input_start:self.input_start + len(inputs)] = inputs
+        self.map[self.output_start:self.output_start + len(outputs)] = outputs
+        self.positions[:self.cylinders] = engine.cylinders.position
+        self.positions[self.cylinders:] = engine.motors.position
+        self.sequence += 1
+        SEQUENCE.pack_into(self.map, SEQUENCE_OFFSET, self.sequence)
+        self.writes += 1
+
+    def close(self):
+        """ Unmap the file, which is kept for readers which still have it open. """
+        # The views into the map must be gone before it can be closed.
+        self.positions = None
+        self.map.close()
+
+class SharedImageReader(object):
+    """ Read consistent snapshots of a file written by SharedImageWriter, without blocking the writer. """
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, _, _, _, self.input_start, input_size, self.output_start, output_size, self.cylinders,
+         self.motors, metadata_start, metadata_length) = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError('Not a shared image: ' + path)
+        self.input_end = self.input_start + input_size
+        self.output_end = self.output_start + output_size
+        self.positions_start = -(-self.output_end // 8) * 8
+        self.metadata = json.loads(self.map[metadata_start:metadata_start + metadata_length].decode('utf-8'))
+        # Views into the map, without copying (and without consistency, see read()).
+        self.positions = np.frombuffer(self.map, dtype='<f8', count=self.cylinders + self.motors,
+                                       offset=self.positions_start)
+        self.input_image = ProcessImage(self.metadata['inputs'])
+        self.output_image = ProcessImage(self.metadata['outputs'])
+        self.retries = 0 # reads repeated because the simulator was writing
+
+    def read(self):
+        """ Return a consistent Snapshot, raise RuntimeError if none could be copied within READ_TIMEOUT. """
+        deadline = time.monotonic() + READ_TIMEOUT
+        while True:
+            sequence = SEQUENCE.unpack_from(self.map, SEQUENCE_OFFSET)[0]
+            if sequence % 2 == 0:
+                simulated, wall_time = struct.unpack_from('<dd', self.map, SEQUENCE_OFFSET + 8)
+                inputs = self.map[self.input_start:self.input_end]
+                outputs = self.map[self.output_start:self.output_end]
+                positions = self.positions.copy()
+                if SEQUENCE.unpack_from(self.map, SEQUENCE_OFFSET)[0] == sequence:
+                    return Snapshot(sequence, simulated, wall_time, inputs, outputs,
+                                    positions[:self.cylinders], positions[self.cylinders:])
+            self.retries += 1
+            if time.monotonic() >= deadline:
+                raise RuntimeError('The shared image is being written all the time.')
+            # Lets the writer finish, which may be waiting for the interpreter of this process on the same core.
+            time.sleep(0)
+
+    def values(self, snapshot):
+        """ Return the inputs and outputs of a snapshot as {symbol: value}. """
+        self.input_image.data[:] = snapshot.inputs
+        self.output_image.data[:] = snapshot.outputs
+        return dict(self.input_image.to_dict(), **self.output_image.to_dict())
+
+    def close(self):
+        self.positions = None
+        self.map.close()
+
+def main(argv=None):
+    """ Print the signals of a shared image whenever they change. """
+    parser = argparse.ArgumentParser(description='Print the signals of a shared image whenever they change.')
+    parser.add_argument('path', help='file written by simulator.py --shared-image')
+    parser.add_argument('--interval', type=float, default=0.01, help='seconds between two reads (default: %(default)s)')
+    args = parser.parse_args(argv)
+    reader = SharedImageReader(args.path)
+    previous = {}
+    try:
+        while True:
+            snapshot = reader.read()
+            values = reader.values(snapshot)
+            changes = {name: value for name, value in values.items() if previous.get(name) != value}
+            if changes:
+                print('%10.3f %s' % (snapshot.time, ' '.join('%s=%d' % item for item in sorted(changes.items()))))
+            previous = values
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+
+if __name__ == '__main__':
+    main()
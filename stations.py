@@ -0,0 +1,207 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Simulate several PLC targets (stations) at once, each in a process of its own.
+
+A stations file lists the stations, each with its own AMS address and
+layout; every other setting defaults to the command line:
+
+    {"stations": [
+        {"name": "Station 1", "ams_net_id": "192.168.19.1.1.1", "layout": "layouts/default.json"},
+        {"name": "Station 2", "ams_net_id": "192.168.19.2.1.1", "ams_net_port": 852, "cycle_time": 0.05}
+    ]}
+
+Every station runs a HeadlessSimulator (simulation, I/O and notifications)
+in a worker process, so a busy station cannot starve the others, and sends
+its statistics every REPORT_INTERVAL seconds to the parent process, which
+prints them (headless) or shows them in the overview window.
+PyQt5 is not imported.
+"""
+
+# Standard library
+import json
+import multiprocessing
+import queue
+import threading
+import time
+# Additional imports
+import pyads
+# Local imports
+import settings
+
+# Seconds between two reports of a station.
+REPORT_INTERVAL = 1.0
+# Seconds in which a station notices that it has to stop.
+STOP_POLL_INTERVAL = 0.1
+# Seconds a station process gets to close its connection before it is terminated.
+STOP_TIMEOUT = 5.0
+# Settings which a station can override, the defaults are taken from the command line.
+STATION_KEYS = ('ams_net_id', 'ams_net_port', 'layout', 'transport', 'plc_logic', 'cycle_time', 'keep_alive',
+                'notification_mode', 'notification_transmission', 'notification_max_delay',
+                'notification_cycle_time', 'metrics_file', 'record', 'shared_image')
+# Columns of the station table.
+COLUMNS = ('Station', 'AMS Net Id', 'State', 'Cycles', 'Cycle (ms)', 'Overruns', 'Jitter p99 (ms)',
+           'Out->act mean (ms)', 'Out->act p99 (ms)', 'Sensor->write mean (ms)')
+
+def load_stations(path, args):
+    """ Return the stations of a stations file as dicts of all STATION_KEYS and the name. """
+    with open(path) as file:
+        entries = json.load(file)['stations']
+    stations = []
+    names = set()
+    for number, entry in enumerate(entries, 1):
+        unknown = set(entry) - set(STATION_KEYS) - {'name'}
+        if unknown:
+            raise ValueError('Unknown station settings: ' + ', '.join(sorted(unknown)))
+        station = {key: entry.get(key, getattr(args, key)) for key in STATION_KEYS}
+        # A file per station, the files of the command line would be shared.
+        station['metrics_file'] = entry.get('metrics_file')
+        station['record'] = entry.get('record')
+        station['shared_image'] = entry.get('shared_image')
+        station['name'] = entry.get('name', 'Station %d' % number)
+        if station['name'] in names:
+            raise ValueError('Duplicate station name: ' + station['name'])
+        names.add(station['name'])
+        stations.append(station)
+    return stations
+
+def run_station(station, reports, stop_event, duration=None, time_scale=1.0):
+    """ Entry point of a station process: run the simulation and put (name, report) into reports. """
+    # Imported here, the parent process does not need the simulation.
+    from headless import HeadlessSimulator
+    from layout import NotificationConfig, load_layout
+    # Every station is a process of its own, so the global settings are its own too.
+    settings.AMS_NET_ID = station['ams_net_id']
+    settings.AMS_NET_PORT = station['ams_net_port']
+    settings.LAYOUT = station['layout']
+    settings.TRANSPORT = station['transport']
+    settings.PLC_LOGIC = station['plc_logic']
+    name = station['name']
+    notification = NotificationConfig(station['notification_transmission'], station['notification_max_delay'],
+                                      station['notification_cycle_time'])
+    try:
+        simulator = HeadlessSimulator(station['ams_net_id'], station['ams_net_port'], load_layout(station['layout']),
+                                      station['cycle_time'], time_scale, station['keep_alive'],
+                                      station['notification_mode'], station['metrics_file'], station['record'],
+                                      notification, station['shared_image'])
+        simulator.connect()
+    except (pyads.pyads_ex.ADSError, RuntimeError, OSError, ValueError) as error:
+        reports.put((name, {'state': 'error: %s' % error}))
+        return
+
+    finished = threading.Event()
+
+    def report():
+        """ Send the statistics periodically, stop the simulation when the parent asks for it. """
+        # stop_event is only polled: a process which ends while waiting on it would leave set() blocked.
+        next_report = time.monotonic() + REPORT_INTERVAL
+        while not finished.wait(STOP_POLL_INTERVAL):
+            if stop_event.is_set():
+                simulator.stop()
+                return
+            if time.monotonic() >= next_report:
+                # 'disconnected' while the station waits to reconnect.
+                state = 'running' if simulator.manager.state == 'connected' else simulator.manager.state
+                reports.put((name, dict(simulator.statistics(), state=state)))
+                next_report += REPORT_INTERVAL
+
+    threading.Thread(target=report, name='Report', daemon=True).start()
+    try:
+        simulator.run(duration)
+    except KeyboardInterrupt:
+        pass # the parent stops the station
+    finally:
+        finished.set()
+        simulator.close()
+        if station['metrics_file']:
+            simulator.latency.write_prometheus(station['metrics_file'])
+    reports.put((name, dict(simulator.statistics(), state='finished')))
+
+class StationPool(object):
+    """ The processes of the stations and their latest reports. """
+
+    def __init__(self, stations, duration=None, time_scale=1.0):
+        self.stations = stations
+        # Spawned, so that the processes start clean instead of with a copy of the threads of Qt and pyads.
+        context = multiprocessing.get_context('spawn')
+        self.reports = context.Queue()
+        self.stop_event = context.Event()
+        self.processes = [context.Process(target=run_station, name=station['name'],
+                                          args=(station, self.reports, self.stop_event, duration, time_scale))
+                          for station in stations]
+        # Station name -> latest report.
+        self.latest = {station['name']: {'state': 'starting'} for station in stations}
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+
+    def poll(self, timeout=0.0):
+        """ Take over the reports which have arrived, waiting up to timeout seconds for the first one. """
+        try:
+            while True:
+                name, report = self.reports.get(timeout=timeout) if timeout else self.reports.get_nowait()
+                self.latest[name] = report
+                timeout = 0.0
+        except queue.Empty:
+            pass
+
+    def alive(self):
+        """ Return True while a station process is running. """
+        return any(process.is_alive() for process in self.processes)
+
+    def stop(self):
+        """ Ask the stations to stop, terminate those which do not stop within STOP_TIMEOUT. """
+        self.stop_event.set()
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for process in self.processes:
+            # The reports must be taken, a process does not end while its queue is full.
+            while process.is_alive() and time.monotonic() < deadline:
+                self.poll(0.1)
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        self.poll()
+
+    def rows(self):
+        """ Return the cells of the station table (see COLUMNS) as strings. """
+        return [report_row(station, self.latest[station['name']]) for station in self.stations]
+
+def report_row(station, report):
+    """ Return the cells of a station's report. """
+    row = [station['name'], '%s:%s' % (station['ams_net_id'], station['ams_net_port']), report['state']]
+    if 'cycles' not in report:
+        return row + [''] * (len(COLUMNS) - len(row))
+    cycle = report['cycle'] or {}
+    latency = report['latency']
+    row += [
+        '%d' % report['cycles'],
+        '%.1f' % (station['cycle_time'] * 1000),
+        '%d' % cycle.get('overruns', 0),
+        '%.3f' % (cycle.get('jitter_p99', 0.0) * 1000),
+        '%.2f' % (latency['output_to_actuation']['mean'] * 1000),
+        '%.2f' % (latency['output_to_actuation']['p99'] * 1000),
+        '%.2f' % (latency['sensor_to_write']['mean'] * 1000),
+    ]
+    return row
+
+def format_table(rows):
+    """ Return the station table as text with aligned columns. """
+    widths = [max(len(cell) for cell in column) for column in zip(COLUMNS, *rows)]
+    return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(row, widths)) for row in [COLUMNS] + rows)
+
+def main(args):
+    """ Entry point of 'simulator.py --stations FILE --headless'. """
+    stations = load_stations(args.stations, args)
+    time_scale = 1.0 if args.time_scale is None else args.time_scale
+    pool = StationPool(stations, args.duration, time_scale)
+    pool.start()
+    try:
+        while pool.alive():
+            time.sleep(REPORT_INTERVAL)
+            pool.poll()
+            print(format_table(pool.rows()) + '\n')
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
+    print(format_table(pool.rows()))
@@ -0,0 +1,166 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Toggle the PLC outputs of the mock PLC at a given rate and measure what reaches the simulation.
+
+'simulator.py --stress [RATE ...]' runs the headless simulator against the
+mock PLC for --duration seconds per rate (output changes per second, by
+default a sweep which ends at the first saturated rate). The logic of the
+PLC toggles the outputs round robin, and the notifications use the mode and
+the transmission settings of the command line and the layout. For every
+rate it reports the changes which the PLC made (produced), those which no
+notification sample saw because the output changed again before the next
+check (coalesced), the samples which the router queue could not take
+(dropped) and the changes which the simulation received (delivered).
+A rate is saturated when samples are dropped, when the p99 latency from
+the PLC timestamp to the callback exceeds SATURATION_LATENCY plus the max
+delay and the cycle time of the notifications (the router falls behind) or
+when the p99 latency from the callback to the actuation exceeds
+SATURATION_LATENCY (the simulation falls behind). The saturation point lies
+between the last rate which was not saturated and the first one which was.
+PyQt5 is not imported.
+"""
+
+# Standard library
+import time
+# Local imports
+import settings
+import transport
+from headless import HeadlessSimulator
+from layout import load_layout
+
+# Output changes per second of the default sweep.
+RATES = (100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000)
+# Seconds per rate without --duration.
+DURATION = 2.0
+# Seconds the notifications get to arrive, before and after a run.
+SETTLE_TIMEOUT = 2.0
+# Seconds of latency (beyond the max delay and the cycle time of the notifications) at which a rate is saturated.
+SATURATION_LATENCY = 0.1
+# Columns of the result table.
+COLUMNS = ('Rate (1/s)', 'Produced', 'Coalesced', 'Samples', 'Dropped', 'Delivered', 'Delivered (1/s)',
+           'PLC->callback p99 (ms)', 'Out->act p99 (ms)', 'Saturated')
+
+class OutputToggler(object):
+    """ Logic of the mock PLC which toggles the outputs round robin, rate changes per second. """
+
+    def __init__(self, outputs, rate):
+        self.outputs = outputs
+        self.rate = rate
+        self.index = 0
+        self.due = 0.0 # changes due, the fraction is carried over to the next task cycle
+        self.last = None # time.monotonic() of the last task cycle
+
+    def __call__(self, plc):
+        now = time.monotonic()
+        if self.last is not None:
+            # Measured, so that the rate holds when the task cycle is late.
+            self.due += (now - self.last) * self.rate
+        self.last = now
+        while self.due >= 1.0:
+            name = self.outputs[self.index % len(self.outputs)]
+            plc.set(name, not plc.get(name))
+            self.index += 1
+            self.due -= 1.0
+
+def idle_logic(plc):
+    """ Logic of the mock PLC which leaves the outputs alone. """
+
+def wait_until(condition, timeout=SETTLE_TIMEOUT):
+    """ Wait up to timeout seconds for condition() to become true. """
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def measure(layout, rate, duration, args):
+    """ Run the simulator for duration seconds while the PLC toggles the outputs at rate. Return the result. """
+    # A fresh mock PLC per rate, so that the queues and counters start empty.
+    transport.shutdown()
+    simulator = HeadlessSimulator(args.ams_net_id, args.ams_net_port, layout, args.cycle_time, 1.0,
+                                  args.keep_alive, args.notification_mode, None, None)
+    simulator.connect()
+    plc = transport.mock_plc()
+    subscriber = simulator.output_subscriber
+    try:
+        with plc.lock:
+            plc.logic = idle_logic
+        # The first sample of every notification holds the initial outputs, it is not counted.
+        wait_until(lambda: subscriber.notifications >= len(subscriber.handles))
+        with plc.lock:
+            before = plc.statistics()
+            delivered = subscriber.changes
+            plc.logic = OutputToggler([name for name, _ in layout.output_signals()], rate)
+        simulator.run(duration)
+        with plc.lock:
+            plc.logic = idle_logic
+        # Whatever is still collected or queued arrives late, but it arrives.
+        wait_until(lambda: not plc.batches and not plc.router.qsize())
+        simulator.step(0.0)
+    finally:
+        simulator.close()
+        transport.shutdown()
+    after = plc.statistics()
+    produced = after['output_changes'] - before['output_changes']
+    sampled = after['sampled_changes'] - before['sampled_changes']
+    delivered = subscriber.changes - delivered
+    latency = simulator.latency.summary()
+    notification = simulator.notification
+    dropped = after['dropped'] - before['dropped']
+    routed = latency['plc_to_callback']['p99']
+    actuated = latency['output_to_actuation']['p99']
+    return {
+        'rate': rate,
+        'produced': produced,
+        'coalesced': produced - sampled,
+        'samples': after['samples'] - before['samples'],
+        'dropped': dropped,
+        'delivered': delivered,
+        'delivered_per_second': delivered / duration,
+        'callback_p99': routed,
+        'actuation_p99': actuated,
+        'saturated': (bool(dropped) or routed > SATURATION_LATENCY + notification.max_delay + notification.cycle_time
+                      or actuated > SATURATION_LATENCY),
+    }
+
+def result_row(result):
+    """ Return the cells of a result (see COLUMNS) as strings. """
+    return ['%d' % result['rate'], '%d' % result['produced'], '%d' % result['coalesced'], '%d' % result['samples'],
+            '%d' % result['dropped'], '%d' % result['delivered'], '%.0f' % result['delivered_per_second'],
+            '%.2f' % (result['callback_p99'] * 1000), '%.2f' % (result['actuation_p99'] * 1000),
+            'yes' if result['saturated'] else 'no']
+
+def saturation_point(results):
+    """ Return (last rate which was not saturated, first rate which was), each None if there is none. """
+    below = None
+    for result in results:
+        if result['saturated']:
+            return below, result['rate']
+        below = result['rate']
+    return below, None
+
+def main(args):
+    """ Entry point of 'simulator.py --stress'. """
+    settings.TRANSPORT = 'mock'
+    layout = load_layout(args.layout)
+    rates = args.stress or RATES
+    duration = DURATION if args.duration is None else args.duration
+    print('Notifications: %s, %s, max delay %.3f s, cycle time %.3f s; %.1f s per rate.' % (
+        args.notification_mode, settings.NOTIFICATION_TRANSMISSION, settings.NOTIFICATION_MAX_DELAY,
+        settings.NOTIFICATION_CYCLE_TIME, duration))
+    print('  '.join(COLUMNS))
+    results = []
+    try:
+        for rate in rates:
+            results.append(measure(layout, rate, duration, args))
+            print('  '.join(cell.rjust(len(column)) for cell, column in zip(result_row(results[-1]), COLUMNS)))
+            # The default sweep ends at the first saturated rate.
+            if not args.stress and results[-1]['saturated']:
+                break
+    except KeyboardInterrupt:
+        pass
+    below, above = saturation_point(results)
+    if above is None:
+        print('Not saturated up to %s output changes/s.' % ('%d' % below if below is not None else '-'))
+    elif below is None:
+        print('Saturated at %d output changes/s already.' % above)
+    else:
+        print('Saturation point between %d and %d output changes/s.' % (below, above))
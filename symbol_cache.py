@@ -0,0 +1,215 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Standard library
+import collections
+import json
+import os
+import threading
+# Additional imports
+import pyads
+
+# ADS index groups of the symbol services.
+ADSIGRP_SYM_VALBYHND = 0xF005 # value by handle, offset means handle
+ADSIGRP_SYM_VERSION = 0xF008 # symbol version, changes when the PLC is re-downloaded
+ADSIGRP_SYM_TABLE = 0x4020 # PLC variables, offset means byte offset
+ADSIGRP_SYM_UPLOADINFO2 = 0xF00F # counts and sizes of the symbols and data types of the symbol table
+
+# The upload info: symbols, bytes of the symbols, data types, bytes of the data types (then dynamic symbols).
+UPLOAD_INFO_TYPE = pyads.PLCTYPE_UDINT * 6
+UPLOAD_INFO_FIELDS = 4
+
+# An entry of the symbol table, as returned by get_all_symbols() of the PLCs which are not pyads.
+Symbol = collections.namedtuple('Symbol', 'name index_group index_offset')
+
+# Directory where the uploaded symbol tables are stored.
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'simulator')
+
+class SymbolCache(object):
+    """ Resolve the PLC symbols once and reuse them for reads, writes and notifications.
+
+    Symbols are addressed by the index group/offset of the uploaded symbol
+    table, which is stored on disk by the PLC's symbol version. The symbol
+    version is only a counter of the downloads, so the file also holds the
+    upload info of the table and is used only while the PLC reports the same
+    one. Symbols which are not in the table are resolved to a handle once.
+    Everything is invalidated when the symbol version changes (the PLC is
+    re-downloaded).
+    """
+
+    def __init__(self, connection, ams_net_id, ams_net_port, cache_dir=CACHE_DIR):
+        self.connection = connection
+        self.ams_net_id = ams_net_id
+        self.ams_net_port = ams_net_port
+        self.cache_dir = cache_dir
+        self.version = None
+        self.table = {} # name -> (index group, index offset)
+        self.handles = {} # name -> handle
+        self.notifications = [] # notification handles created through the cache
+        self.watch_handles = None
+        self.stale = True
+        # Functions executed (in the ADS thread) when the PLC has been re-downloaded.
+        self.invalidated = []
+        self.lock = threading.RLock()
+
+    def path(self):
+        """ Return the path of the symbol table file, None if the version is unknown or there is no cache_dir. """
+        if self.version is None or self.cache_dir is None:
+            return None
+        filename = '%s_%s_v%d.json' % (self.ams_net_id, self.ams_net_port, self.version)
+        return os.path.join(self.cache_dir, filename)
+
+    def read_version(self):
+        """ Read the symbol version of the PLC program. """
+        try:
+            return self.connection.read(ADSIGRP_SYM_VERSION, 0, pyads.PLCTYPE_BYTE)
+        except pyads.pyads_ex.ADSError:
+            return None
+
+    def read_upload_info(self):
+        """ Read the counts and sizes of the symbol table, which identify it together with the symbol version. """
+        try:
+            return list(self.connection.read(ADSIGRP_SYM_UPLOADINFO2, 0, UPLOAD_INFO_TYPE))[:UPLOAD_INFO_FIELDS]
+        except pyads.pyads_ex.ADSError:
+            return None
+
+    def load(self):
+        """ Load the symbol table from disk, or upload it from the PLC. """
+        with self.lock:
+            self.version = self.read_version()
+            path = self.path()
+            # Without the upload info the file cannot be told from that of another program.
+            info = self.read_upload_info() if path is not None else None
+            table = self.read_file(path, info) if info is not None else None
+            if table is None:
+                table = self.upload()
+                if info is not None and table:
+                    self.write_file(path, info, table)
+            self.table = table
+            self.stale = False
+
+    @staticmethod
+    def read_file(path, info):
+        """ Return the symbol table stored at path, None if there is none, it is damaged or of another table. """
+        try:
+            with open(path) as file:
+                stored = json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # E.g. truncated by a crash, it is uploaded and written again.
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        if not isinstance(stored, dict) or stored.get('info') != info:
+            return None
+        return {name: tuple(address) for name, address in stored['symbols'].items()}
+
+    def write_file(self, path, info, table):
+        """ Store the symbol table with its upload info, a failed write only costs an upload next time. """
+        # Write a temporary file first, so that a reader never sees a partial file.
+        temporary = path + '.tmp'
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(temporary, 'w') as file:
+                json.dump({'info': info, 'symbols': table}, file)
+            os.replace(temporary, path)
+        except OSError:
+            pass
+
+    def upload(self):
+        """ Upload the symbol table from the PLC. """
+        try:
+            symbols = self.connection.get_all_symbols()
+        except pyads.pyads_ex.ADSError:
+            return {}
+        return {symbol.name: (symbol.index_group, symbol.index_offset)
+                for symbol in symbols if symbol.name}
+
+    def address(self, name):
+        """ Return the (index group, index offset) of the symbol. """
+        with self.lock:
+            if self.stale:
+                self.load()
+            if name in self.table:
+                return self.table[name]
+            if name not in self.handles:
+                self.handles[name] = self.connection.get_handle(name)
+            return ADSIGRP_SYM_VALBYHND, self.handles[name]
+
+    def read(self, name, plc_datatype):
+        """ Read the value of the symbol. """
+        index_group, index_offset = self.address(name)
+        return self.connection.read(index_group, index_offset, plc_datatype)
+
+    def write(self, name, value, plc_datatype):
+        """ Write the value of the symbol. """
+        index_group, index_offset = self.address(name)
+        self.connection.write(index_group, index_offset, value, plc_datatype)
+
+    def add_notification(self, name, attr, callback):
+        """ Add a device notification, the callback receives the symbol name. """
+        def wrapper(notification, data):
+            return callback(notification, name)
+        handles = self.connection.add_device_notification(self.address(name), attr, wrapper)
+        self.notifications.append(handles)
+        return handles
+
+    def del_notification(self, handles):
+        """ Delete a device notification created with add_notification. """
+        if handles in self.notifications:
+            self.notifications.remove(handles)
+        try:
+            # The handle belongs to the cache, so it is not released here.
+            self.connection.del_device_notification(handles[0], None)
+        except pyads.pyads_ex.ADSError:
+            pass # already gone, e.g. after a re-download
+
+    def watch(self):
+        """ Invalidate the cache automatically when the PLC is re-downloaded. """
+        if self.watch_handles is not None:
+            return
+        with self.lock:
+            if self.stale:
+                self.load()
+        @self.connection.notification(pyads.PLCTYPE_BYTE)
+        def callback(handle, name, timestamp, value):
+            """ Executed when the symbol version changes. """
+            if value != self.version:
+                self.invalidate()
+        attr = pyads.NotificationAttrib(1)
+        self.watch_handles = self.connection.add_device_notification(
+            (ADSIGRP_SYM_VERSION, 0), attr, callback)
+
+    def invalidate(self):
+        """ Forget the symbol table and handles, they are no longer valid.
+
+        Notifications added through the cache must be re-added by the
+        functions in self.invalidated.
+        """
+        with self.lock:
+            self.table = {}
+            self.handles = {}
+            self.stale = True
+        for function in self.invalidated:
+            function()
+
+    def release(self, delete=True):
+        """ Delete the notifications and release the handles, with delete=False they are only forgotten. """
+        with self.lock:
+            if delete:
+                if self.watch_handles is not None:
+                    self.del_notification(self.watch_handles)
+                for handles in list(self.notifications):
+                    self.del_notification(handles)
+                for handle in self.handles.values():
+                    try:
+                        self.connection.release_handle(handle)
+                    except pyads.pyads_ex.ADSError:
+                        pass
+            self.watch_handles = None
+            self.notifications = []
+            self.handles = {}
+            self.stale = True
@@ -0,0 +1,161 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Connections to the PLC: TwinCAT (pyads), an in-process mock PLC or a local pyads test server.
+
+Every transport returns an object with the interface of pyads.Connection
+(open, close, read_state, read, write, add_device_notification, ...), so
+the rest of the simulator does not know which one it talks to.
+
+'ads'         the TwinCAT PLC at the configured AMS Net Id and port
+'mock'        mock_plc.MockPLC in this process, running scriptable PLC logic
+'testserver'  pyads.testserver.AdsTestServer on localhost, the ADS requests
+              go through the pyads network stack but nothing runs the PLC
+"""
+
+# Standard library
+import struct
+import threading
+import time
+# Additional imports
+import pyads
+# Local imports
+import settings
+from layout import load_layout
+from process_image import ADSIGRP_IOIMAGE_RWIB, ADSIGRP_IOIMAGE_RWOB, AnalogImage, ProcessImage
+from symbol_cache import ADSIGRP_SYM_TABLE, ADSIGRP_SYM_VERSION, CACHE_DIR, Symbol
+
+TRANSPORTS = ('ads', 'mock', 'testserver')
+
+# Address of the local test server.
+TESTSERVER_NET_ID = '127.0.0.1.1.1'
+TESTSERVER_IP = '127.0.0.1'
+
+# The mock PLC and the test server are shared by all connections of the process.
+_lock = threading.Lock()
+_mock_plc = None
+_testserver = None
+
+def create_connection(ams_net_id=None, ams_net_port=None, transport=None):
+    """ Return a (not yet opened) connection of the transport, by default settings.TRANSPORT. """
+    transport = transport or settings.TRANSPORT
+    if transport == 'ads':
+        return pyads.Connection(ams_net_id or settings.AMS_NET_ID, ams_net_port or settings.AMS_NET_PORT)
+    if transport == 'mock':
+        # Imported here, the mock PLC is not needed for the other transports.
+        from mock_plc import MockConnection
+        return MockConnection(mock_plc())
+    if transport == 'testserver':
+        return TestServerConnection(testserver().symbols)
+    raise ValueError('Unknown transport: ' + transport)
+
+def symbol_cache_dir(transport=None):
+    """ Return the directory of the symbol table files, None if the tables of the transport are not stored. """
+    return CACHE_DIR if (transport or settings.TRANSPORT) == 'ads' else None
+
+def mock_plc(logic=None, start=True):
+    """ Return the mock PLC of the process, created on the first call with logic or settings.PLC_LOGIC.
+
+    With start=False its task is not started, the caller runs the cycles.
+    """
+    global _mock_plc
+    from mock_plc import MockPLC, load_logic
+    with _lock:
+        if _mock_plc is None:
+            _mock_plc = MockPLC(load_layout(settings.LAYOUT), logic or load_logic(settings.PLC_LOGIC))
+            if start:
+                _mock_plc.start()
+        return _mock_plc
+
+def testserver():
+    """ Return the test server of the process, it is started on the first call. """
+    global _testserver
+    with _lock:
+        if _testserver is None:
+            _testserver = TestServer(load_layout(settings.LAYOUT))
+            _testserver.start()
+        return _testserver
+
+def shutdown():
+    """ Stop the mock PLC and the test server of the process, e.g. before the layout is changed. """
+    global _mock_plc, _testserver
+    with _lock:
+        if _mock_plc is not None:
+            _mock_plc.stop()
+            _mock_plc = None
+        if _testserver is not None:
+            _testserver.stop()
+            _testserver = None
+
+class TestServer(object):
+    """ A pyads test server which knows the process images and the symbols of a layout. """
+
+    def __init__(self, layout):
+        # Imported here, the test server is not needed for the other transports.
+        from pyads.testserver import AdsTestServer, AdvancedHandler, PLCVariable
+
+        class ImageHandler(AdvancedHandler):
+            """ Test server handler whose process images accept writes of any byte range. """
+
+            def __init__(self, images):
+                super().__init__()
+                self.images = images # index group -> index offset of the image variable
+
+            def handle_request(self, request):
+                header = request.ams_header
+                if struct.unpack('<H', header.command_id)[0] == pyads.constants.ADSCOMMAND_WRITE:
+                    index_group, index_offset, length = struct.unpack('<III', header.data[:12])
+                    if index_group in self.images and index_offset != self.images[index_group]:
+                        # Merge the written bytes into the whole image.
+                        offset = self.images[index_group]
+                        value = bytearray(self.get_variable_by_indices(index_group, offset).value)
+                        start = index_offset - offset
+                        value[start:start + length] = header.data[12:12 + length]
+                        data = struct.pack('<III', index_group, offset, len(value)) + bytes(value)
+                        request = request._replace(ams_header=header._replace(data=data))
+                return super().handle_request(request)
+
+        images = {}
+        variables = []
+        for index_group, signals in ((ADSIGRP_IOIMAGE_RWIB, layout.input_signals()),
+                                     (ADSIGRP_IOIMAGE_RWOB, layout.output_signals())):
+            image = ProcessImage(signals)
+            images[index_group] = image.offset
+            variables.append(PLCVariable('IOIMAGE_%X' % index_group, bytes(len(image)), pyads.constants.ADST_UINT8,
+                                         'BYTE', index_group=index_group, index_offset=image.offset))
+        # The symbol version never changes.
+        variables.append(PLCVariable('SYM_VERSION', bytes(1), pyads.constants.ADST_UINT8, 'BYTE',
+                                     index_group=ADSIGRP_SYM_VERSION, index_offset=0))
+        # The test server uploads symbols without names, so the symbol table is kept here.
+        self.symbols = []
+        for offset, (name, _) in enumerate(layout.input_signals() + layout.output_signals()):
+            variables.append(PLCVariable(name, bytes(1), pyads.constants.ADST_BIT, 'BOOL',
+                                         index_group=ADSIGRP_SYM_TABLE, index_offset=offset))
+            self.symbols.append(Symbol(name, ADSIGRP_SYM_TABLE, offset))
+        if layout.analog:
+            # The struct of the analog values, after the BOOL symbols.
+            offset = len(self.symbols)
+            variables.append(PLCVariable(layout.analog_symbol, bytes(len(AnalogImage(layout.analog))),
+                                         pyads.constants.ADST_BIGTYPE, 'ST_Analog',
+                                         index_group=ADSIGRP_SYM_TABLE, index_offset=offset))
+            self.symbols.append(Symbol(layout.analog_symbol, ADSIGRP_SYM_TABLE, offset))
+        self.handler = ImageHandler(images)
+        for variable in variables:
+            self.handler.add_variable(variable)
+        self.server = AdsTestServer(handler=self.handler, logging=False)
+
+    def start(self):
+        self.server.start()
+        time.sleep(0.5) # give the server time to listen
+
+    def stop(self):
+        self.server.stop()
+
+class TestServerConnection(pyads.Connection):
+    """ A pyads connection to the local test server. """
+
+    def __init__(self, symbols):
+        super().__init__(TESTSERVER_NET_ID, pyads.PORT_TC3PLC1, TESTSERVER_IP)
+        self.symbols = symbols
+
+    def get_all_symbols(self):
+        return list(self.symbols)
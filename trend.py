@@ -0,0 +1,270 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Record every I/O change and actuator position in ring buffers of a fixed size, decimated for plotting.
+
+TrendRecorder preallocates its buffers within a memory budget
+(settings.TREND_MEMORY bytes) and never allocates again: when a buffer is
+full, its oldest rows are overwritten. It keeps two buffers of rows
+(simulated time, values): a row of all PLC inputs and outputs whenever one
+of them changes, and a row of the positions of all cylinders and motors
+whenever one of them moves. A value holds until the next row.
+
+decimate() reduces a time window to the smallest and the largest value of
+every trace in each of a number of columns (one per pixel), so that a short
+pulse stays visible at any zoom. Every buffer summarizes its rows in blocks
+of BLOCK rows, these blocks in blocks of BLOCK blocks and so on, and a
+window is decimated from the level on which it has at most BLOCK entries
+per column: the cost depends on the number of columns, not on the hours
+recorded. A summary counts in the column of its first row, so a column may
+show a few values of the one after it.
+
+export() writes the rows of a window as CSV (a line per row of either
+buffer, with all values) or as a NumPy .npz file. PyQt5 is not imported.
+"""
+
+# Standard library
+import collections
+import csv
+import os
+import time
+# Additional imports
+import numpy as np
+# Local imports
+import settings
+
+# Entries of a level which are summarized by one entry of the level above.
+BLOCK = 16
+# Share of the memory budget for the I/O changes, the rest holds the positions.
+SIGNAL_SHARE = 0.25
+# Extensions of the exports which are written as CSV, the others are .npz files.
+CSV_EXTENSIONS = ('.csv', '.txt')
+
+# The rows of a buffer within a window: times and values as arrays.
+Rows = collections.namedtuple('Rows', 'time values')
+
+class Level(object):
+    """ A ring of entries (time, low, high, last), on the first level the rows themselves (low = high = last). """
+
+    def __init__(self, capacity, width, dtype, rows=False):
+        self.time = np.zeros(capacity)
+        self.low = np.zeros((capacity, width), dtype)
+        if rows:
+            self.high = self.last = self.low
+        else:
+            self.high = np.zeros((capacity, width), dtype)
+            self.last = np.zeros((capacity, width), dtype)
+        self.rows = rows
+        self.head = 0 # index of the next entry
+        self.count = 0 # entries kept
+
+    def __len__(self):
+        return self.count
+
+    def nbytes(self):
+        arrays = (self.time, self.low) if self.rows else (self.time, self.low, self.high, self.last)
+        return sum(array.nbytes for array in arrays)
+
+    def append(self, time, low, high, last):
+        index = self.head
+        self.time[index] = time
+        self.low[index] = low
+        if not self.rows:
+            self.high[index] = high
+            self.last[index] = last
+        self.head = (index + 1) % len(self.time)
+        self.count = min(self.count + 1, len(self.time))
+
+    def segments(self):
+        """ Return the index ranges of the entries from the oldest to the newest. """
+        if self.count < len(self.time):
+            return [(0, self.count)]
+        return [(self.head, len(self.time)), (0, self.head)]
+
+    def between(self, start, end):
+        """ Return the index ranges of the entries from start to end seconds and of the one before them. """
+        ranges = []
+        for first, stop in self.segments():
+            times = self.time[first:stop]
+            # The entry before the window holds the value at its start.
+            lower = max(int(np.searchsorted(times, start)) - 1, 0)
+            upper = int(np.searchsorted(times, end, 'right'))
+            if upper > lower:
+                ranges.append((first + lower, first + upper))
+        return ranges
+
+class TrendBuffer(object):
+    """ Rows of width values of a dtype in a ring, summarized on further levels, within budget bytes. """
+
+    def __init__(self, width, dtype, budget):
+        self.width = width
+        itemsize = np.dtype(dtype).itemsize
+        # A row costs its own bytes and, on all levels above, 1 / (BLOCK - 1) of the bytes of a summary.
+        row = 8 + width * itemsize
+        summary = 8 + 3 * width * itemsize
+        capacity = max(BLOCK, int(budget / (row + summary / (BLOCK - 1))))
+        self.levels = [Level(capacity, width, dtype, rows=True)]
+        while capacity // BLOCK >= 2:
+            capacity //= BLOCK
+            self.levels.append(Level(capacity, width, dtype))
+        # The entry of every level above the first which is being summarized: [entries, time, low, high, last].
+        self.partial = [None] + [[0, 0.0, np.zeros(width, dtype), np.zeros(width, dtype), np.zeros(width, dtype)]
+                                 for _ in self.levels[1:]]
+
+    def nbytes(self):
+        return sum(level.nbytes() for level in self.levels)
+
+    def append(self, time, values):
+        """ Append a row, the oldest one is overwritten when the buffer is full. """
+        self.levels[0].append(time, values, values, values)
+        low = high = last = values
+        for level, partial in zip(self.levels[1:], self.partial[1:]):
+            if partial[0] == 0:
+                partial[1] = time
+                partial[2][:] = low
+                partial[3][:] = high
+            else:
+                np.minimum(partial[2], low, out=partial[2])
+                np.maximum(partial[3], high, out=partial[3])
+            partial[4][:] = last
+            partial[0] += 1
+            if partial[0] < BLOCK:
+                return
+            level.append(*partial[1:])
+            partial[0] = 0
+            time, low, high, last = partial[1:]
+
+    def rows(self, start, end):
+        """ Return the Rows from start to end seconds, and the row before them with the values at start. """
+        level = self.levels[0]
+        ranges = level.between(start, end)
+        return Rows(np.concatenate([level.time[first:stop] for first, stop in ranges] or [np.zeros(0)]),
+                    np.concatenate([level.low[first:stop] for first, stop in ranges]
+                                   or [np.zeros((0, self.width), level.low.dtype)]))
+
+    def entries(self, number, start, end):
+        """ Return (time, low, high, last) of the entries of a level from start to end seconds, with the one before.
+
+        The entries which are still being summarized are included, so that the newest rows are never missing.
+        """
+        level = self.levels[number]
+        ranges = level.between(start, end)
+        arrays = [[array[first:stop] for first, stop in ranges]
+                  for array in (level.time, level.low, level.high, level.last)]
+        for partial in reversed(self.partial[1:number + 1]):
+            if partial[0] and partial[1] <= end:
+                arrays[0].append(np.array([partial[1]]))
+                for array, values in zip(arrays[1:], partial[2:]):
+                    array.append(values[np.newaxis])
+        if not arrays[0]:
+            return None
+        return [np.concatenate(array) for array in arrays]
+
+    def decimate(self, start, end, columns):
+        """ Return (low, high), arrays of columns x width: the extremes in every column of the window.
+
+        The columns are of equal duration, NaN where there are no values yet.
+        """
+        low = np.full((columns, self.width), np.nan)
+        high = np.full((columns, self.width), np.nan)
+        # The coarsest level on which a column has at most BLOCK entries.
+        count = sum(stop - first for first, stop in self.levels[0].between(start, end))
+        number = 0
+        while number + 1 < len(self.levels) and count > columns * BLOCK:
+            count //= BLOCK
+            number += 1
+        entries = self.entries(number, start, end)
+        if entries is None:
+            return low, high
+        times, lows, highs, lasts = entries
+        edges = np.linspace(start, end, columns + 1)
+        bounds = np.searchsorted(times, edges)
+        # The value which holds at the start of every column, that of the entry before it.
+        before = bounds[:-1] - 1
+        held = before >= 0
+        low[held] = lasts[before[held]]
+        high[held] = lasts[before[held]]
+        filled = np.flatnonzero(np.diff(bounds))
+        if len(filled):
+            # Every filled column reduces its entries, the last one ends at the end of the window.
+            stop = bounds[-1]
+            starts = bounds[filled]
+            low[filled] = np.fmin(low[filled], np.minimum.reduceat(lows[:stop], starts))
+            high[filled] = np.fmax(high[filled], np.maximum.reduceat(highs[:stop], starts))
+        return low, high
+
+class TrendRecorder(object):
+    """ The history of the PLC inputs and outputs and of the actuator positions of a layout. """
+
+    def __init__(self, layout, budget=settings.TREND_MEMORY):
+        signals = layout.inputs + layout.outputs
+        self.signals = [signal.symbol for signal in signals]
+        self.actuators = (['%s (cylinder)' % (cylinder.get('name') or 'Cylinder %d' % number)
+                           for number, cylinder in enumerate(layout.cylinders, 1)] +
+                          ['%s (motor)' % (motor.get('name') or 'Motor %d' % number)
+                           for number, motor in enumerate(layout.motors, 1)])
+        # The values are gathered from the engine's arrays by (kind, field) and put back into the signal order.
+        groups = collections.OrderedDict()
+        for position, signal in enumerate(signals):
+            groups.setdefault((signal.kind, signal.field), []).append((position, signal.index))
+        self.groups = [(kind, field, np.array([index for _, index in members], dtype=np.intp))
+                       for (kind, field), members in groups.items()]
+        self.order = np.argsort([position for members in groups.values() for position, _ in members])
+        self.io = TrendBuffer(len(self.signals), np.uint8, budget * SIGNAL_SHARE)
+        self.positions = TrendBuffer(len(self.actuators), np.float32, budget * (1.0 - SIGNAL_SHARE))
+        self.values = None # the row recorded last
+        self.position = None
+        self.origin = None # time.time() at the simulated time 0
+        self.start = None # simulated time of the first row
+        self.time = None # simulated time of the last record()
+
+    def nbytes(self):
+        return self.io.nbytes() + self.positions.nbytes()
+
+    def record(self, engine):
+        """ Append the I/O and the positions of the engine if they changed since the last call. """
+        if self.origin is None:
+            self.origin = time.time() - engine.time
+            self.start = engine.time
+        self.time = engine.time
+        values = np.concatenate([getattr(getattr(engine, kind), field)[indices]
+                                 for kind, field, indices in self.groups])[self.order].astype(np.uint8)
+        if self.values is None or not np.array_equal(values, self.values):
+            self.io.append(engine.time, values)
+            self.values = values
+        position = np.concatenate((engine.cylinders.position, engine.motors.position)).astype(np.float32)
+        if self.position is None or not np.array_equal(position, self.position):
+            self.positions.append(engine.time, position)
+            self.position = position
+
+    def decimate(self, start, end, columns):
+        """ Return the (low, high) arrays of the I/O and of the positions, see TrendBuffer.decimate(). """
+        return self.io.decimate(start, end, columns), self.positions.decimate(start, end, columns)
+
+    def export(self, path, start, end):
+        """ Write the rows from start to end simulated seconds as CSV (see CSV_EXTENSIONS) or as a .npz file.
+
+        The first line of the CSV holds the values at start, the .npz file
+        has the row before start which holds them. Return the number of lines or rows written.
+        """
+        io = self.io.rows(start, end)
+        positions = self.positions.rows(start, end)
+        origin = self.origin or 0.0
+        if os.path.splitext(path)[1] not in CSV_EXTENSIONS:
+            np.savez(path, origin=origin, signals=self.signals, actuators=self.actuators,
+                     signal_time=io.time, signal_values=io.values,
+                     position_time=positions.time, position_values=positions.values)
+            return len(io.time) + len(positions.time)
+        # A line per time of either buffer, the other one holds its last row.
+        times = np.union1d(io.time[io.time > start], positions.time[positions.time > start])
+        times = np.concatenate(([start], times[times <= end]))
+        columns = []
+        for rows, pattern in ((io, '%d'), (positions, '%.4f')):
+            indices = np.searchsorted(rows.time, times, 'right') - 1
+            columns.append([[pattern % value for value in rows.values[index]] if index >= 0
+                            else [''] * rows.values.shape[1] for index in indices.tolist()])
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['time', 'wall_time'] + self.signals + self.actuators)
+            for now, signals, actuators in zip(times.tolist(), *columns):
+                writer.writerow(['%.6f' % now, '%.6f' % (origin + now)] + signals + actuators)
+        return len(times)
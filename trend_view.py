@@ -0,0 +1,202 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" The history of a TrendRecorder as lanes of traces, decimated to the width of the plot.
+
+TrendPlot draws a lane per selected trace, the PLC signals as digital
+traces and the actuator positions between 0 and 1. Every redraw takes the
+extremes of the window per pixel column from the recorder, so it costs the
+same for seconds and for hours of history. TrendView adds the controls: the
+duration of the window, a scroll bar through the history (at its right end
+the window follows the simulation), the selection of the traces and the
+export of the window.
+"""
+
+# Standard library
+import math
+import time
+# Additional imports
+import numpy as np
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+# Durations of the window: (text, seconds).
+SPANS = (('10 s', 10.0), ('1 min', 60.0), ('10 min', 600.0), ('1 h', 3600.0), ('8 h', 28800.0))
+# Steps of the scroll bar per second of history.
+SCROLL_RESOLUTION = 10
+# Pixels of a lane, at most, and of the time axis.
+LANE_HEIGHT = 40
+AXIS_HEIGHT = 20
+# Labels of the time axis.
+TICKS = 4
+
+def polygon(x, y):
+    """ Return a QPolygonF of the points (x, y), filled from the arrays without a Python loop. """
+    points = QtGui.QPolygonF([QtCore.QPointF()] * len(x))
+    pointer = points.data()
+    pointer.setsize(len(x) * 2 * 8)
+    coordinates = np.frombuffer(pointer, dtype=np.float64).reshape(len(x), 2)
+    coordinates[:, 0] = x
+    coordinates[:, 1] = y
+    return points
+
+class TrendPlot(QtWidgets.QWidget):
+    """ Lanes of the traces of a TrendRecorder within the window from start to end simulated seconds. """
+
+    def __init__(self, recorder, parent=None):
+        super().__init__(parent)
+        self.recorder = recorder
+        # Selected traces: ('io' or 'positions', column of the buffer, name).
+        self.traces = []
+        self.start = 0.0
+        self.end = 1.0
+        self.font = QtGui.QFont('Arial', 7)
+        self.setAutoFillBackground(True)
+        palette = self.palette()
+        palette.setColor(QtGui.QPalette.Window, QtCore.Qt.white)
+        self.setPalette(palette)
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.setFont(self.font)
+        width = self.width()
+        columns = max(1, width)
+        height = self.height() - AXIS_HEIGHT
+        if self.traces and self.recorder.origin is not None:
+            (io_low, io_high), (position_low, position_high) = self.recorder.decimate(self.start, self.end, columns)
+            lane = min(LANE_HEIGHT, height / len(self.traces))
+            x = np.arange(columns) + 0.5
+            for number, (buffer, column, name) in enumerate(self.traces):
+                top = number * lane
+                if buffer == 'io':
+                    low, high = io_low[:, column], io_high[:, column]
+                    color = QtGui.QColor(0, 0, 160)
+                else:
+                    low, high = position_low[:, column], position_high[:, column]
+                    color = QtGui.QColor(0, 120, 0)
+                painter.setPen(QtGui.QColor(220, 220, 220))
+                painter.drawLine(QtCore.QPointF(0, top + lane), QtCore.QPointF(width, top + lane))
+                painter.setPen(QtGui.QPen(color, 1))
+                self.draw_trace(painter, x, low, high, top + 2, lane - 4)
+                painter.setPen(QtCore.Qt.darkGray)
+                painter.drawText(QtCore.QPointF(2, top + 9), name)
+        self.draw_axis(painter, width, height)
+
+    @staticmethod
+    def draw_trace(painter, x, low, high, top, height):
+        """ Draw the extremes of every column as a vertical line, joined into a polyline per run of values. """
+        # Values from 0 to 1, drawn upwards.
+        y_low = top + height * (1.0 - np.clip(low, 0.0, 1.0))
+        y_high = top + height * (1.0 - np.clip(high, 0.0, 1.0))
+        valid = ~np.isnan(low)
+        # The runs of columns with values, the columns before the first row have none.
+        edges = np.flatnonzero(np.diff(np.concatenate(([False], valid, [False])).astype(np.int8)))
+        for first, stop in zip(edges[::2].tolist(), edges[1::2].tolist()):
+            points = np.empty((stop - first) * 2)
+            points[0::2] = y_low[first:stop]
+            points[1::2] = y_high[first:stop]
+            painter.drawPolyline(polygon(np.repeat(x[first:stop], 2), points))
+
+    def draw_axis(self, painter, width, height):
+        """ Draw the wall-clock times of the window below the lanes. """
+        painter.setPen(QtCore.Qt.black)
+        painter.drawLine(QtCore.QPointF(0, height), QtCore.QPointF(width, height))
+        origin = self.recorder.origin
+        if origin is None:
+            return
+        metrics = painter.fontMetrics()
+        for tick in range(TICKS + 1):
+            now = self.start + (self.end - self.start) * tick / TICKS
+            text = time.strftime('%H:%M:%S', time.localtime(origin + now))
+            if self.end - self.start < 60.0:
+                text += '.%d' % (math.modf(origin + now)[0] * 10)
+            x = width * tick / TICKS
+            x = min(max(x - metrics.width(text) / 2, 0), width - metrics.width(text))
+            painter.drawText(QtCore.QPointF(x, height + AXIS_HEIGHT - 6), text)
+
+class TrendView(QtWidgets.QWidget):
+    """ A TrendPlot with its window, the selection of the traces and the export. """
+
+    def __init__(self, recorder, parent=None):
+        super().__init__(parent)
+        self.recorder = recorder
+        self.span = QtWidgets.QComboBox(self)
+        for text, seconds in SPANS:
+            self.span.addItem(text, seconds)
+        self.span.setCurrentIndex(1)
+        self.span.currentIndexChanged.connect(self.refresh)
+        self.scrollbar = QtWidgets.QScrollBar(QtCore.Qt.Horizontal, self)
+        self.scrollbar.valueChanged.connect(self.scrolled)
+        self.button_export = QtWidgets.QPushButton('Export', self)
+        self.button_export.clicked.connect(self.export)
+        self.plot = TrendPlot(recorder, self)
+        self.traces = QtWidgets.QListWidget(self)
+        self.traces.setMaximumHeight(110)
+        names = [('io', column, name) for column, name in enumerate(recorder.signals)]
+        names += [('positions', column, name) for column, name in enumerate(recorder.actuators)]
+        for trace in names:
+            item = QtWidgets.QListWidgetItem(trace[2], self.traces)
+            item.setData(QtCore.Qt.UserRole, trace[:2])
+            item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
+            item.setCheckState(QtCore.Qt.Checked)
+        self.traces.itemChanged.connect(self.select_traces)
+        self.lbl_status = QtWidgets.QLabel(self)
+        controls = QtWidgets.QHBoxLayout()
+        controls.addWidget(self.span)
+        controls.addWidget(self.scrollbar, 1)
+        controls.addWidget(self.button_export)
+        box = QtWidgets.QVBoxLayout(self)
+        box.setContentsMargins(0, 0, 0, 0)
+        box.addLayout(controls)
+        box.addWidget(self.plot, 1)
+        box.addWidget(self.traces)
+        box.addWidget(self.lbl_status)
+        # The window follows the simulation while the scroll bar is at its right end.
+        self.following = True
+        self.select_traces()
+
+    def select_traces(self, item=None):
+        """ Plot the checked traces. """
+        self.plot.traces = []
+        for row in range(self.traces.count()):
+            item = self.traces.item(row)
+            if item.checkState() == QtCore.Qt.Checked:
+                buffer, column = item.data(QtCore.Qt.UserRole)
+                self.plot.traces.append((buffer, column, item.text()))
+        self.plot.update()
+
+    def scrolled(self, value):
+        """ Executed when the scroll bar moves: show the history at its position. """
+        self.following = value >= self.scrollbar.maximum()
+        self.refresh()
+
+    def refresh(self):
+        """ Update the range of the scroll bar and the window, and redraw. """
+        recorder = self.recorder
+        if recorder.origin is None:
+            return
+        span = self.span.currentData()
+        history = max(0.0, recorder.time - recorder.start - span)
+        # Not emitting valueChanged, which would call refresh() again.
+        blocked = self.scrollbar.blockSignals(True)
+        self.scrollbar.setMaximum(int(history * SCROLL_RESOLUTION))
+        self.scrollbar.setPageStep(int(span * SCROLL_RESOLUTION))
+        if self.following:
+            self.scrollbar.setValue(self.scrollbar.maximum())
+        self.scrollbar.blockSignals(blocked)
+        self.plot.start = recorder.start + self.scrollbar.value() / SCROLL_RESOLUTION
+        self.plot.end = self.plot.start + span
+        self.lbl_status.setText('%d I/O rows, %d position rows kept in %.1f MB' % (
+            len(recorder.io.levels[0]), len(recorder.positions.levels[0]), recorder.nbytes() / 2 ** 20))
+        self.plot.update()
+
+    def export(self):
+        """ Write the window to a CSV or .npz file chosen by the user. """
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, 'Export trend', 'trend.csv',
+                                                        'CSV (*.csv);;NumPy (*.npz)')
+        if not path:
+            return
+        try:
+            rows = self.recorder.export(path, self.plot.start, self.plot.end)
+        except OSError as error:
+            self.lbl_status.setText(str(error))
+        else:
+            self.lbl_status.setText('%d rows written to %s' % (rows, path))